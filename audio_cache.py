@@ -0,0 +1,174 @@
+import collections
+import hashlib
+import json
+import mmap
+import os
+import threading
+
+# --- Content-addressed cache of synthesized audio ---
+class AudioCache:
+    """
+    Caches synthesized audio keyed on everything that changes the sound: text, voice,
+    speed, pitch and audio format. An in-memory LRU holds up to `max_bytes`; when
+    `disk_dir` is set, entries are also written there and read back through mmap,
+    so they survive restarts without being copied into memory until played.
+
+    The disk tier is kept under `max_disk_bytes`: a disk hit refreshes the clip's
+    mtime, and once the directory grows past the budget the least recently used
+    clips (oldest mtime) are deleted until it is back under DISK_LOW_WATER of it.
+    The directory is rescanned for that, so processes sharing it stay within one budget.
+
+    Args:
+        max_bytes (int): Memory budget for cached audio.
+        disk_dir (str, optional): Directory for the on-disk tier (created if missing).
+        max_entry_bytes (int): Larger clips are never cached (long answers rarely repeat).
+        max_disk_bytes (int): Budget for the on-disk tier.
+    """
+    DISK_LOW_WATER = 0.9 # Trimming frees some headroom so it does not run on every store
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, disk_dir: str = None,
+                 max_entry_bytes: int = 512 * 1024, max_disk_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._entries = collections.OrderedDict() # key -> bytes, least recently used first
+        self._size = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_size = 0 # Bytes in disk_dir as of the last scan, plus what this process wrote since
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "stores": 0,
+                      "disk_evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._trim_disk() # Also applies a budget lowered since the last run
+
+    @staticmethod
+    def make_key(text: str, voice_id: str, speed: float, pitch: float, audio_format: str) -> str:
+        params = json.dumps([text, voice_id, speed, pitch, audio_format], ensure_ascii=False)
+        return hashlib.sha256(params.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ".audio")
+
+    def get(self, key: str):
+        """Returns the cached audio (bytes or a read-only memoryview) or None."""
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return audio
+
+        audio = self._read_disk(key) if self.disk_dir else None
+        with self._lock:
+            if audio is None:
+                self.stats["misses"] += 1
+            else:
+                self.stats["disk_hits"] += 1
+        return audio
+
+    def _read_disk(self, key: str):
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return None
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        try:
+            os.utime(path) # Recently played: trimmed last
+        except OSError:
+            pass
+        return memoryview(mapped) # The mapping stays valid after the file is closed
+
+    def put(self, key: str, audio: bytes):
+        """Stores a complete clip, evicting least recently used entries to stay in budget."""
+        if not audio or len(audio) > self.max_entry_bytes:
+            return
+        audio = bytes(audio)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = audio
+            self._size += len(audio)
+            self.stats["stores"] += 1
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.stats["evictions"] += 1
+        if self.disk_dir:
+            self._write_disk(key, audio)
+
+    def _write_disk(self, key: str, audio: bytes):
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(audio)
+            os.replace(temp_path, path) # Readers never see a half-written clip
+        except OSError as e:
+            print(f"[TTS Cache] Could not write {path}: {e}")
+            return
+        with self._disk_lock:
+            self._disk_size += len(audio)
+            over_budget = self._disk_size > self.max_disk_bytes
+        if over_budget:
+            self._trim_disk()
+
+    def _scan_disk(self) -> list:
+        """(mtime, size, path) of every clip in disk_dir."""
+        clips = []
+        for shard in os.scandir(self.disk_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".audio"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue # Deleted meanwhile (another process trimming)
+                    clips.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return clips
+
+    def _trim_disk(self):
+        """Deletes least recently used clips while disk_dir is over its budget."""
+        with self._disk_lock:
+            try:
+                clips = self._scan_disk()
+            except OSError as e:
+                print(f"[TTS Cache] Could not scan {self.disk_dir}: {e}")
+                return
+            total = sum(size for _, size, _ in clips)
+            if total > self.max_disk_bytes:
+                target = self.max_disk_bytes * self.DISK_LOW_WATER
+                clips.sort()
+                for _, size, path in clips:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path) # Clips being played stay mapped until they are done
+                    except FileNotFoundError:
+                        pass
+                    except OSError:
+                        continue # e.g. still mapped, on Windows
+                    total -= size
+                    self.stats["disk_evictions"] += 1
+            self._disk_size = total
+
+    def summary(self) -> str:
+        with self._lock:
+            stats = dict(self.stats)
+            entries, size = len(self._entries), self._size
+        text = (f"hits={stats['hits']} disk_hits={stats['disk_hits']} misses={stats['misses']} "
+                f"evictions={stats['evictions']} stores={stats['stores']} "
+                f"entries={entries} bytes={size}/{self.max_bytes}")
+        if self.disk_dir:
+            text += f" disk_bytes={self._disk_size}/{self.max_disk_bytes} disk_evictions={stats['disk_evictions']}"
+        return text
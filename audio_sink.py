@@ -0,0 +1,349 @@
+import asyncio
+import subprocess
+import threading
+import time
+
+# --- Bounded byte ring buffer between the TTS writer and the audio device ---
+class RingBuffer:
+    """
+    Fixed-capacity byte FIFO. Writers block while it is full, the reader never blocks
+    (it is called from the audio device callback). clear() drops everything at once,
+    which is how playback is cut on interruption. Reads take whole multiples of `align`
+    bytes (one sample), so a write of odd length never shifts the samples after it.
+    """
+    def __init__(self, capacity: int, align: int = 1):
+        self.capacity = capacity - capacity % align
+        self.align = align
+        self._buf = bytearray(self.capacity)
+        self._read_pos = 0
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return self._size
+
+    def free_space(self) -> int:
+        return self.capacity - self._size
+
+    def write(self, data, should_abort=None, timeout: float = 0.1) -> int:
+        """
+        Copies `data` in, blocking while the buffer is full.
+        Returns the number of bytes written (fewer if should_abort() became true).
+        should_abort is checked again after every wait, so a writer woken by clear()
+        does not go on to write the rest of a chunk that was meant to be dropped.
+        """
+        view = memoryview(data)
+        written = 0
+        with self._cond:
+            while written < len(view):
+                waited = False
+                while self._size == self.capacity:
+                    if should_abort is not None and should_abort():
+                        return written
+                    self._cond.wait(timeout)
+                    waited = True
+                if waited and should_abort is not None and should_abort():
+                    return written
+                n = min(len(view) - written, self.capacity - self._size)
+                start = (self._read_pos + self._size) % self.capacity
+                first = min(n, self.capacity - start)
+                self._buf[start:start + first] = view[written:written + first]
+                if n > first:
+                    self._buf[0:n - first] = view[written + first:written + n]
+                self._size += n
+                written += n
+        return written
+
+    def read_into(self, out: memoryview) -> int:
+        """
+        Copies up to len(out) bytes into `out` without blocking, in whole multiples of
+        `align` (a trailing partial sample stays buffered for the next read). Returns bytes copied.
+        """
+        with self._cond:
+            n = min(len(out), self._size)
+            n -= n % self.align
+            first = min(n, self.capacity - self._read_pos)
+            out[:first] = self._buf[self._read_pos:self._read_pos + first]
+            if n > first:
+                out[first:n] = self._buf[0:n - first]
+            self._read_pos = (self._read_pos + n) % self.capacity
+            self._size -= n
+            if n:
+                self._cond.notify_all() # Wake writers waiting for space
+        return n
+
+    def clear(self) -> int:
+        """Discards all buffered bytes. Returns how many were dropped."""
+        with self._cond:
+            dropped = self._size
+            self._read_pos = 0
+            self._size = 0
+            self._cond.notify_all()
+        return dropped
+
+
+def decode_mp3(mp3_bytes: bytes, sample_rate: int) -> bytes:
+    """One-shot MP3 -> 16-bit mono PCM decode, for clips prepared ahead of time."""
+    command = ["ffmpeg", "-loglevel", "quiet", "-f", "mp3", "-i", "pipe:0",
+               "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"]
+    result = subprocess.run(command, input=bytes(mp3_bytes), stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, check=True)
+    return result.stdout
+
+
+# --- Persistent MP3 -> PCM decoder feeding the sink ---
+class Mp3Decoder:
+    """
+    One long-lived ffmpeg process that turns MP3 bytes into raw PCM for the sink,
+    so no decoder has to be started per sentence.
+    """
+    def __init__(self, on_pcm, sample_rate: int):
+        self._on_pcm = on_pcm
+        self.sample_rate = sample_rate
+        self._process = None
+        self._lock = threading.Lock()
+
+    def _spawn(self):
+        command = [
+            "ffmpeg", "-loglevel", "quiet", "-fflags", "nobuffer",
+            "-f", "mp3", "-i", "pipe:0",
+            "-f", "s16le", "-ac", "1", "-ar", str(self.sample_rate), "pipe:1",
+        ]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, bufsize=0)
+        reader = threading.Thread(target=self._pump_output, args=(process,),
+                                  name="TTS_Decoder_Thread", daemon=True)
+        reader.start()
+        return process
+
+    def _pump_output(self, process):
+        while True:
+            pcm = process.stdout.read(4096)
+            if not pcm:
+                break
+            with self._lock:
+                current = process is self._process
+            if current: # Output of a decoder replaced by reset() belongs to a cancelled turn
+                self._on_pcm(pcm)
+
+    def start(self):
+        with self._lock:
+            if self._process is None:
+                self._process = self._spawn()
+
+    def feed(self, mp3_bytes: bytes):
+        with self._lock:
+            process = self._process
+        if process is None:
+            return
+        try:
+            process.stdin.write(mp3_bytes)
+        except (BrokenPipeError, ValueError):
+            pass
+
+    def reset(self):
+        """
+        Drops whatever the decoder still holds. The audio device is not touched;
+        only the decoder is replaced, off the playback path.
+        """
+        with self._lock:
+            old, self._process = self._process, None
+        if old is not None:
+            old.kill()
+            threading.Thread(target=old.wait, daemon=True).start()
+        self.start()
+
+    def close(self):
+        with self._lock:
+            old, self._process = self._process, None
+        if old is not None:
+            try:
+                old.stdin.close()
+            except (BrokenPipeError, ValueError):
+                pass
+            old.kill()
+            old.wait()
+
+
+# --- Long-lived audio output ---
+class AudioSink:
+    """
+    A single audio output stream that stays open for the whole session.
+    PCM is written into a ring buffer and pulled by the device callback, so
+    playback continues seamlessly across segments and turns, and flush() silences
+    the speaker on the next callback.
+
+    Args:
+        audio_format (str): "pcm" for raw 16-bit mono PCM, or "mp3" to decode through
+            a persistent ffmpeg process first.
+        sample_rate (int): Output rate in Hz (PCM from the provider must match it).
+        buffer_seconds (float): Ring buffer capacity; writers block beyond it.
+        should_abort (callable, optional): Checked while a writer waits for space, so a
+            pending interruption is never stuck behind a full buffer.
+        on_drained (callable, optional): Called from the device callback each time the
+            buffer runs empty after playing audio.
+        on_played (callable, optional): Called from the device callback with every buffer
+            handed to the device, silence included (the echo canceller's reference).
+    """
+    BYTES_PER_SAMPLE = 2 # 16-bit mono
+    FRAMES_PER_CALLBACK = 512
+
+    def __init__(self, audio_format: str = "mp3", sample_rate: int = 24000,
+                 buffer_seconds: float = 2.0, should_abort=None, on_drained=None, on_played=None):
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self.ring = RingBuffer(int(sample_rate * self.BYTES_PER_SAMPLE * buffer_seconds),
+                               align=self.BYTES_PER_SAMPLE)
+        self.decoder = Mp3Decoder(self._write_pcm, sample_rate) if audio_format == "mp3" else None
+        self._pyaudio = None
+        self._stream = None
+        self._pa_continue = 0
+        self._closed = threading.Event()
+        self._should_abort = should_abort
+        self._on_drained = on_drained
+        self._on_played = on_played
+        self._was_playing = False
+        self._last_write_time = 0.0
+        self._flush_generation = 0 # Bumped by flush(); writes begun before it are dropped
+
+    def open(self):
+        import pyaudio # Imported here so the buffering code works without an audio device
+
+        self._pyaudio = pyaudio.PyAudio()
+        self._pa_continue = pyaudio.paContinue
+        self._stream = self._pyaudio.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.sample_rate,
+            output=True,
+            frames_per_buffer=self.FRAMES_PER_CALLBACK,
+            stream_callback=self._on_device_callback,
+        )
+        self._stream.start_stream()
+        if self.decoder is not None:
+            self.decoder.start()
+
+    def _pull(self, out: bytearray) -> int:
+        """Takes the next frame of PCM from the ring, reporting the transition to empty."""
+        n = self.ring.read_into(memoryview(out))
+        playing = n == len(out)
+        if self._was_playing and not playing and self._on_drained is not None:
+            self._on_drained()
+        self._was_playing = playing
+        return n
+
+    def _on_device_callback(self, in_data, frame_count, time_info, status):
+        out = bytearray(frame_count * self.BYTES_PER_SAMPLE) # Silence unless audio is buffered
+        self._pull(out)
+        out = bytes(out)
+        if self._on_played is not None:
+            self._on_played(out)
+        return out, self._pa_continue
+
+    def _abort_write(self) -> bool:
+        return self._closed.is_set() or (self._should_abort is not None and self._should_abort())
+
+    def _write_pcm(self, pcm: bytes):
+        self._last_write_time = time.monotonic()
+        generation = self._flush_generation
+        self.ring.write(pcm, should_abort=lambda: generation != self._flush_generation
+                        or self._abort_write())
+
+    def write(self, audio: bytes):
+        """Queues encoded audio (in the sink's format) for playback; blocks while the buffer is full."""
+        self._last_write_time = time.monotonic()
+        if self.decoder is not None:
+            self.decoder.feed(audio)
+        else:
+            self._write_pcm(audio)
+
+    def write_pcm(self, pcm: bytes):
+        """Queues already-decoded PCM, bypassing the decoder (used for pre-rendered clips)."""
+        self._write_pcm(pcm)
+
+    def output_latency(self) -> float:
+        """Seconds between a buffer leaving the ring and being heard (device buffering)."""
+        if self._stream is None:
+            return 0.0
+        return self._stream.get_output_latency()
+
+    def flush(self) -> int:
+        """
+        Stops playback immediately by dropping everything not yet played. The decoder is
+        replaced before the ring is cleared, and the generation bump makes any writer still
+        blocked on a full ring give up instead of refilling it with the cancelled turn's audio.
+        """
+        self._flush_generation += 1
+        if self.decoder is not None:
+            self.decoder.reset()
+        return self.ring.clear()
+
+    def is_idle(self, grace: float = 0.2) -> bool:
+        """True once the buffer has drained and nothing new has arrived for `grace` seconds."""
+        return len(self.ring) == 0 and time.monotonic() - self._last_write_time > grace
+
+    def close(self):
+        self._closed.set()
+        self.ring.clear()
+        if self.decoder is not None:
+            self.decoder.close()
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pyaudio is not None:
+            self._pyaudio.terminate()
+            self._pyaudio = None
+
+
+# --- Real-time paced output to a network peer instead of a sound card ---
+class StreamAudioSink(AudioSink):
+    """
+    AudioSink that plays into a connection rather than a device: a coroutine on the
+    session server's event loop pulls one frame from the ring every `frame_ms` and
+    hands it to send_fn(pcm). Pacing at real time keeps unplayed audio in the ring,
+    so flush() still cuts the bot off instantly on barge-in.
+
+    Args:
+        send_fn (callable): Coroutine function taking a PCM frame (bytes).
+        loop (asyncio.AbstractEventLoop): Loop the pacing coroutine runs on.
+        frame_ms (int): Frame duration sent per tick.
+        Other arguments are as for AudioSink.
+    """
+    def __init__(self, send_fn, loop, frame_ms: int = 20, **kwargs):
+        super().__init__(**kwargs)
+        self._send_fn = send_fn
+        self._loop = loop
+        self.frame_bytes = int(self.sample_rate * frame_ms / 1000) * self.BYTES_PER_SAMPLE
+        self._pacer = None
+        self.bytes_sent = 0
+
+    def open(self):
+        if self.decoder is not None:
+            self.decoder.start()
+        self._pacer = asyncio.run_coroutine_threadsafe(self._pace(), self._loop)
+
+    async def _pace(self):
+        frame_s = self.frame_bytes / (self.sample_rate * self.BYTES_PER_SAMPLE)
+        deadline = self._loop.time()
+        out = bytearray(self.frame_bytes)
+        while not self._closed.is_set():
+            n = self._pull(out)
+            if n:
+                await self._send_fn(bytes(out[:n]))
+                self.bytes_sent += n
+            deadline += frame_s
+            delay = deadline - self._loop.time()
+            if delay < -frame_s:
+                deadline = self._loop.time() # Fell behind (slow peer); don't burst to catch up
+                delay = 0
+            await asyncio.sleep(max(delay, 0))
+
+    def output_latency(self) -> float:
+        return self.frame_bytes / (self.sample_rate * self.BYTES_PER_SAMPLE)
+
+    def close(self):
+        super().close()
+        if self._pacer is not None:
+            self._pacer.cancel()
+            self._pacer = None
@@ -0,0 +1,124 @@
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Pre-rendered acknowledgement clips ---
+class BackchannelBank:
+    """
+    A small set of short acknowledgements ("Okay.", "Let me see.") synthesized once at
+    startup and kept as decoded PCM, so one can start playing the instant it is needed
+    while the real answer is still being generated.
+    """
+    PHRASES = ("Okay.", "Sure.", "Mm-hmm.", "Let me see.", "Right.")
+
+    def __init__(self, phrases=None):
+        self.phrases = tuple(phrases) if phrases else self.PHRASES
+        self.clips = [] # (phrase, pcm bytes)
+        self._rotation = None
+        self._lock = threading.Lock()
+
+    def prepare(self, render_fn, max_workers: int = 4):
+        """
+        Renders every phrase with render_fn(phrase) -> PCM bytes (in parallel).
+        Phrases that fail to render are skipped.
+        """
+        def render(phrase):
+            try:
+                return phrase, render_fn(phrase)
+            except Exception as e:
+                print(f"[Backchannel] Could not prepare '{phrase}': {e}")
+                return phrase, None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            rendered = list(executor.map(render, self.phrases))
+        with self._lock:
+            self.clips = [(phrase, pcm) for phrase, pcm in rendered if pcm]
+            self._rotation = itertools.cycle(self.clips) if self.clips else None
+        print(f"[Backchannel] {len(self.clips)} clip(s) ready.")
+
+    def next_clip(self):
+        """Returns the next (phrase, pcm) in rotation, or None if nothing was prepared."""
+        with self._lock:
+            return next(self._rotation) if self._rotation is not None else None
+
+
+# --- Plays a clip only if the real answer is late ---
+class BackchannelScheduler:
+    """
+    Arms a timer when a turn starts. If no real audio for the turn has been queued
+    when it fires, one clip is written to the sink; real audio then follows it in the
+    same buffer, so the hand-over is seamless. If real audio comes first, the timer
+    is simply cancelled.
+
+    While a clip plays, speaking_event (the bot_speaking_event) is set, so a barge-in
+    interrupts it like any other bot audio: the turn's cancel callback flushes the sink.
+    """
+    def __init__(self, bank: BackchannelBank, write_pcm, delay_ms: int, speaking_event=None):
+        self.bank = bank
+        self._write_pcm = write_pcm
+        self.delay_ms = delay_ms
+        self._speaking_event = speaking_event
+        self._lock = threading.Lock() # Decides between the clip and the first real audio
+        self._clip_written = threading.Event() # Clear while a clip is being written to the sink
+        self._clip_written.set()
+        self._timer = None
+        self._turn = None
+        self._real_audio_started = False
+        self.played = 0
+        self.skipped = 0
+
+    def arm(self, turn):
+        with self._lock:
+            self._cancel_timer()
+            self._turn = turn
+            self._real_audio_started = False
+            if self.bank.clips:
+                self._timer = threading.Timer(self.delay_ms / 1000, self._fire, args=(turn,))
+                self._timer.daemon = True
+                self._timer.start()
+
+    def on_real_audio(self, turn):
+        """
+        Called before the first real audio of `turn` is written to the sink. Returns once
+        a clip already being written is in the buffer, so the answer lands after it.
+        """
+        with self._lock:
+            if self._turn is turn and not self._real_audio_started:
+                self._real_audio_started = True
+                if self._timer is not None:
+                    self._cancel_timer()
+                    self.skipped += 1
+        self._clip_written.wait() # Not under the lock; a flush aborts the clip's write anyway
+
+    def cancel(self):
+        with self._lock:
+            self._cancel_timer()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _fire(self, turn):
+        with self._lock:
+            self._timer = None
+            if self._turn is not turn or self._real_audio_started:
+                return
+            if turn is not None and not turn.active:
+                return
+            clip = self.bank.next_clip()
+            if clip is None:
+                return
+            self._clip_written.clear()
+        try:
+            phrase, pcm = clip
+            print(f"[Backchannel] Answer not ready after {self.delay_ms}ms, playing '{phrase}'")
+            if self._speaking_event is not None:
+                self._speaking_event.set() # Cleared by the sink's on_drained once the clip has played
+            self._write_pcm(pcm)
+            self.played += 1
+        finally:
+            self._clip_written.set()
+
+    def summary(self) -> str:
+        return f"{self.played} clip(s) played, {self.skipped} turn(s) answered before the clip was needed"
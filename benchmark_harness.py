@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from google import genai
+from google.genai import types
+
+from audio_cache import AudioCache
+from audio_sink import StreamAudioSink
+from event_runtime import AwaitableEvent, HandoffQueue
+from fakes import FakeDeepgramClient, FakeServices, LatencyModel, SilentAudioSource
+from http_pool import PooledHTTPClient
+from llm_component import LLMProcessor
+from metrics import MetricsRecorder, distribution
+from stt_component import STTListener
+from tts_component import TTSPlayer
+from turn_control import TurnController
+
+GAP_THRESHOLD_S = 0.05 # Silences longer than this inside a response count as inter-sentence gaps
+
+
+# --- What the benchmark measures besides the turn timelines ---
+class BenchmarkRecorder(MetricsRecorder):
+    """Keeps every completed timeline, and the process CPU time when each turn ended."""
+    def __init__(self):
+        super().__init__()
+        self.timelines = {}
+        self.cpu_at_end = {}
+
+    def complete(self, timeline, outcome: str):
+        self.cpu_at_end.setdefault(timeline.turn_id, time.process_time())
+        self.timelines.setdefault(timeline.turn_id, timeline)
+        super().complete(timeline, outcome)
+
+
+class AudioOutputRecorder:
+    """Audio "speaker" of the benchmark: notes when each paced frame left the sink, per turn."""
+    def __init__(self, turn_controller: TurnController):
+        self.turn_controller = turn_controller
+        self.frames = {} # turn_id -> [perf_counter of each frame]
+
+    async def on_audio(self, pcm: bytes):
+        turn = self.turn_controller.current
+        self.frames.setdefault(turn.turn_id if turn else None, []).append(time.perf_counter())
+
+
+# --- The simulated caller ---
+class ScriptedCaller:
+    """
+    Speaks the script's user lines through the fake Deepgram connection: one interim
+    result per word, then a final result after the endpointing delay. A turn with
+    `barge_in_ms` has the next line start that long after the bot's first audio,
+    otherwise the caller waits for the bot to finish and pauses `pause_ms`.
+    """
+    def __init__(self, script: dict, deepgram: FakeDeepgramClient, turn_controller: TurnController,
+                 bot_speaking_event: AwaitableEvent, word_ms: float = 180, endpointing_ms: float = 300,
+                 turn_timeout_s: float = 30.0):
+        self.turns = script["turns"]
+        self.deepgram = deepgram
+        self.turn_controller = turn_controller
+        self.bot_speaking_event = bot_speaking_event
+        self.word_s = word_ms / 1000
+        self.endpointing_s = endpointing_ms / 1000
+        self.turn_timeout_s = turn_timeout_s
+        self.cpu_at_final = {} # turn_id -> process CPU time when the final transcript was sent
+        self.timeouts = 0
+
+    async def _wait_for(self, condition) -> bool:
+        deadline = time.monotonic() + self.turn_timeout_s
+        while not condition():
+            if time.monotonic() > deadline:
+                self.timeouts += 1
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    async def _say(self, text: str, turn_id: int):
+        connection = self.deepgram.connection
+        words = text.split()
+        for count in range(1, len(words) + 1):
+            connection.emit_transcript(" ".join(words[:count]))
+            await asyncio.sleep(self.word_s)
+        await asyncio.sleep(self.endpointing_s)
+        self.cpu_at_final[turn_id] = time.process_time()
+        connection.emit_transcript(text, is_final=True, speech_final=True)
+
+    async def run(self):
+        await self._wait_for(lambda: self.deepgram.connection is not None)
+        await self.deepgram.connection.started.wait()
+        await asyncio.sleep(0.5)
+        previous_turn = None
+        for index, spec in enumerate(self.turns):
+            await self._say(spec["user"], index + 1)
+            await self._wait_for(lambda: self.turn_controller.current is not previous_turn)
+            turn = previous_turn = self.turn_controller.current
+            if "barge_in_ms" in spec and index + 1 < len(self.turns):
+                await self._wait_for(lambda: "first_audio_out" in turn.timeline.marks or not turn.active)
+                await asyncio.sleep(spec["barge_in_ms"] / 1000)
+            else:
+                await self._wait_for(lambda: not turn.active and not self.bot_speaking_event.is_set())
+                await asyncio.sleep(spec.get("pause_ms", 600) / 1000)
+
+
+# --- One run of a script through the real pipeline ---
+async def run_script(script: dict, services: FakeServices, args, caller_factory=None, recorder=None) -> dict:
+    """
+    caller_factory(deepgram, turn_controller, bot_speaking_event) replaces the ScriptedCaller
+    (e.g. replay_session.RecordedCaller); if the caller has an `audio_source_factory`, it
+    feeds the microphone side too. `recorder` (a SessionRecorder) records the run.
+    """
+    os.environ.setdefault("UNREAL_SPEECH_API_KEY", "benchmark") # Checked by synthesize_speech_v8
+    loop = asyncio.get_running_loop()
+
+    stt_to_llm_queue = HandoffQueue(maxsize=1)
+    llm_to_tts_queue = HandoffQueue(maxsize=15)
+    user_speaking_event = AwaitableEvent()
+    bot_speaking_event = AwaitableEvent()
+    interrupt_bot_event = AwaitableEvent()
+    exit_event = AwaitableEvent()
+    metrics = BenchmarkRecorder()
+    turn_controller = TurnController(interrupt_event=interrupt_bot_event, metrics=metrics)
+
+    deepgram = FakeDeepgramClient(LatencyModel(args.stt_latency_ms, args.stt_jitter_ms, args.seed))
+    if caller_factory is not None:
+        caller = caller_factory(deepgram, turn_controller, bot_speaking_event)
+    else:
+        caller = ScriptedCaller(script, deepgram, turn_controller, bot_speaking_event,
+                                word_ms=args.word_ms, endpointing_ms=args.endpointing_ms)
+    stt_listener = STTListener(stt_to_llm_queue, user_speaking_event, interrupt_bot_event,
+                               bot_speaking_event, exit_event, deepgram_client=deepgram,
+                               audio_source_factory=getattr(caller, "audio_source_factory", SilentAudioSource),
+                               turn_controller=turn_controller, recorder=recorder)
+    gemini = genai.Client(api_key="benchmark", http_options=types.HttpOptions(base_url=services.gemini_url))
+    llm_processor = LLMProcessor(stt_to_llm_queue, llm_to_tts_queue, exit_event,
+                                 turn_controller=turn_controller, client=gemini, recorder=recorder)
+
+    audio_output = AudioOutputRecorder(turn_controller)
+    http_client = PooledHTTPClient(services.tts_url, pool_size=TTSPlayer.PREFETCH_DEPTH + 1)
+    await asyncio.to_thread(http_client.warm)
+    tts_player = TTSPlayer(llm_to_tts_queue, interrupt_bot_event, bot_speaking_event, exit_event,
+                           turn_controller=turn_controller,
+                           audio_sink_factory=lambda **kwargs: StreamAudioSink(audio_output.on_audio, loop, **kwargs),
+                           http_client=http_client, audio_cache=AudioCache(), recorder=recorder)
+    # The stand-in always streams PCM
+    tts_player.AUDIO_FORMAT = "pcm"
+    llm_processor.llm_router.policy.enabled = tts_player.tts_router.policy.enabled = args.hedging
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    pipeline = asyncio.gather(stt_listener.listen_and_transcribe(),
+                              llm_processor.process_llm_requests(),
+                              asyncio.to_thread(tts_player.play_tts))
+    try:
+        await caller.run()
+    finally:
+        exit_event.set()
+        stt_to_llm_queue.close()
+        llm_to_tts_queue.close()
+        await pipeline
+        http_client.close()
+    cpu_total, wall_total = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+    frame_s = tts_player.audio_sink.output_latency() # Duration of one paced frame
+    turns = []
+    for turn_id, timeline in sorted(metrics.timelines.items()):
+        marks = timeline.marks
+        speech_final = marks.get("speech_final")
+        frames = audio_output.frames.get(turn_id, [])
+        gaps = [(later - earlier - frame_s) * 1000 for earlier, later in zip(frames, frames[1:])
+                if later - earlier - frame_s > GAP_THRESHOLD_S]
+        cpu_start_turn = caller.cpu_at_final.get(turn_id)
+        turns.append({
+            "turn": turn_id,
+            "outcome": timeline.outcome,
+            "marks_ms": timeline.relative_ms(),
+            "time_to_first_audio_ms": round((frames[0] - speech_final) * 1000, 2) if frames and speech_final else None,
+            "gaps_ms": [round(gap, 2) for gap in gaps],
+            "cpu_ms": round((metrics.cpu_at_end[turn_id] - cpu_start_turn) * 1000, 2) if cpu_start_turn else None,
+        })
+    return {"turns": turns, "cpu_s": round(cpu_total, 3), "wall_s": round(wall_total, 3),
+            "caller_timeouts": caller.timeouts,
+            "hedging": {"llm": vars(llm_processor.llm_router.stats), "tts": vars(tts_player.tts_router.stats)}}
+
+
+def summarize(runs: list) -> dict:
+    turns = [turn for run in runs for turn in run["turns"]]
+    summary = {"turns": len(turns),
+               "outcomes": {outcome: sum(1 for t in turns if t["outcome"] == outcome)
+                            for outcome in sorted({t["outcome"] for t in turns})},
+               "time_to_first_audio_ms": distribution(t["time_to_first_audio_ms"] for t in turns),
+               "inter_sentence_gap_ms": distribution(gap for t in turns for gap in t["gaps_ms"]),
+               "cpu_ms_per_turn": distribution(t["cpu_ms"] for t in turns),
+               "stages_ms": {}}
+    for name, start, end in MetricsRecorder.STAGES:
+        values = [t["marks_ms"][end] - t["marks_ms"][start] for t in turns
+                  if start in t["marks_ms"] and end in t["marks_ms"]]
+        summary["stages_ms"][name] = distribution(values)
+    return summary
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run conversation scripts through the real pipeline "
+                                                 "against local Deepgram, Gemini and Unreal Speech stand-ins.")
+    parser.add_argument("--script", default=os.path.join("benchmark_scripts", "conversation.json"))
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stt-latency-ms", type=float, default=80)
+    parser.add_argument("--stt-jitter-ms", type=float, default=20)
+    parser.add_argument("--llm-ttft-ms", type=float, default=350)
+    parser.add_argument("--llm-jitter-ms", type=float, default=80)
+    parser.add_argument("--llm-chunk-ms", type=float, default=40)
+    parser.add_argument("--tts-ttfb-ms", type=float, default=200)
+    parser.add_argument("--tts-jitter-ms", type=float, default=60)
+    parser.add_argument("--llm-stall-rate", type=float, default=0.0, help="Fraction of Gemini requests that stall")
+    parser.add_argument("--llm-stall-ms", type=float, default=3000)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--tts-stall-rate", type=float, default=0.0, help="Fraction of TTS requests that stall")
+    parser.add_argument("--tts-stall-ms", type=float, default=3000)
+    parser.add_argument("--tts-error-rate", type=float, default=0.0)
+    parser.add_argument("--no-hedging", dest="hedging", action="store_false",
+                        help="Disable hedged requests (failover on errors still applies)")
+    parser.add_argument("--word-ms", type=float, default=180, help="Caller speaking rate")
+    parser.add_argument("--endpointing-ms", type=float, default=300, help="Silence before speech_final")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    with open(args.script, encoding="utf-8") as f:
+        script = json.load(f)
+    runs = []
+    with FakeServices(args.script, args) as services:
+        for _ in range(args.repeat):
+            runs.append(asyncio.run(run_script(script, services, args)))
+
+    results = {"script": script.get("name", args.script), "time": time.time(),
+               "config": vars(args), "summary": summarize(runs), "runs": runs}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    summary = results["summary"]
+    print(f"\n[Benchmark] {summary['turns']} turn(s) {summary['outcomes']}, results in {args.output}")
+    for key in ("time_to_first_audio_ms", "inter_sentence_gap_ms", "cpu_ms_per_turn"):
+        print(f"[Benchmark] {key}: {summary[key]}")
+    for name, stats in summary["stages_ms"].items():
+        if stats:
+            print(f"[Benchmark] {name}: p50={stats['p50']} p95={stats['p95']} p99={stats['p99']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+import asyncio
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+
+from metrics import LatencyHistogram
+
+# --- Priorities of outbound API calls, most urgent first ---
+INTERACTIVE = 0 # A caller is waiting on it now: a turn's request, its first segment, a (re)connect
+PREFETCH = 1 # Needed soon: later segments of a response, fetched while earlier ones play
+SPECULATIVE = 2 # May be thrown away: generation on a stable interim transcript
+BACKGROUND = 3 # Nobody is waiting: history summaries, backchannel clips
+PRIORITY_NAMES = {INTERACTIVE: "interactive", PREFETCH: "prefetch", SPECULATIVE: "speculative",
+                  BACKGROUND: "background"}
+
+
+class CallCancelled(Exception):
+    """A queued call was given up on before it was sent (cancelled, or answered by a hedge)."""
+
+
+# Fraction of each provider quota this process may use (set by session_supervisor.py for its workers)
+QUOTA_SHARE = float(os.getenv("VOICE_QUOTA_SHARE", "1"))
+
+
+def limit_from_env(name: str, default: str):
+    """This process's share of a numeric quota from the environment; "0" or "" means unlimited (None)."""
+    value = os.getenv(name, default)
+    return float(value) * QUOTA_SHARE if value and float(value) > 0 else None
+
+
+# --- Request rate of one provider ---
+class TokenBucket:
+    """
+    Refills at `rate` tokens per second up to `burst`; each call takes one. Not
+    thread-safe on its own (CallScheduler uses it under its lock).
+    """
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, now: float) -> bool:
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def delay_s(self, now: float) -> float:
+        """Seconds until the next token."""
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def empty(self, now: float):
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class _Waiter:
+    __slots__ = ("priority", "wake", "queued_at", "granted", "abandoned")
+
+    def __init__(self, priority: int, wake):
+        self.priority = priority
+        self.wake = wake
+        self.queued_at = time.perf_counter()
+        self.granted = False
+        self.abandoned = False
+
+
+class CallGrant:
+    """Permission for one call; release() it (once the response is closed) to free the slot."""
+    def __init__(self, scheduler: "CallScheduler", wait_ms: float):
+        self.scheduler = scheduler
+        self.wait_ms = wait_ms
+        self.released = False
+
+    def release(self):
+        self.scheduler._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class SchedulerStats:
+    def __init__(self):
+        self.waits = {priority: LatencyHistogram() for priority in PRIORITY_NAMES}
+        self.throttled = 0 # 429 answers reported by callers
+        self.abandoned = 0 # Calls given up on while queued
+        self.peak_in_flight = 0
+        self.peak_queued = 0
+
+    def summary(self) -> str:
+        parts = []
+        for priority, histogram in self.waits.items():
+            quantiles = histogram.quantiles()
+            if quantiles:
+                parts.append(f"{PRIORITY_NAMES[priority]} {histogram.count} "
+                             f"(wait p50={quantiles[0.5]:.0f} p95={quantiles[0.95]:.0f}ms)")
+        return (f"{', '.join(parts) or 'no calls'}; {self.throttled} throttled (429), "
+                f"{self.abandoned} abandoned in queue, peak {self.peak_in_flight} in flight / "
+                f"{self.peak_queued} queued")
+
+
+# --- Admission control for the calls to one provider ---
+class CallScheduler:
+    """
+    Paces the calls to one provider so they stay within its quotas. A call needs a token
+    from a bucket refilled at `rate_per_s` (bursts of up to `burst`) and one of
+    `max_in_flight` slots, held until its response is closed; None means unlimited.
+    Waiting calls are admitted most urgent priority first (arrival order within one),
+    so a turn's first segment overtakes queued prefetches and speculative requests of
+    every session sharing the scheduler. After a 429, throttled() stops admissions for
+    the provider's Retry-After. Usable from threads (acquire) and from any number of
+    asyncio loops (acquire_async) at once. With `metrics`, each queue wait is exported
+    as a "<provider>_<priority>_queue_wait_ms" histogram.
+    """
+    THROTTLE_PAUSE_S = 1.0 # Pause after a 429 without a Retry-After
+
+    def __init__(self, name: str, rate_per_s: float = None, burst: float = None,
+                 max_in_flight: int = None, metrics=None):
+        self.name = name
+        self.bucket = TokenBucket(rate_per_s, burst) if rate_per_s else None
+        self.max_in_flight = max(1, int(max_in_flight)) if max_in_flight else None
+        self.metrics = metrics # MetricsRecorder, or None
+        self.stats = SchedulerStats()
+        self.in_flight = 0
+        self.queued = 0
+        self._waiting = [] # Heap of (priority, arrival, waiter)
+        self._arrivals = itertools.count()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        slug = re.sub(r"\W+", "_", name).strip("_").lower()
+        self._metric_names = {priority: f"{slug}_{label}_queue_wait_ms"
+                              for priority, label in PRIORITY_NAMES.items()}
+
+    @property
+    def limited(self) -> bool:
+        return self.bucket is not None or self.max_in_flight is not None
+
+    def _enqueue(self, waiter: _Waiter):
+        heapq.heappush(self._waiting, (waiter.priority, next(self._arrivals), waiter))
+        self.queued += 1
+        self.stats.peak_queued = max(self.stats.peak_queued, self.queued)
+
+    def _admit(self, caller: _Waiter = None):
+        """
+        Grants waiting calls in priority order while the limits allow (under the lock).
+        Returns the seconds after which it is worth trying again, or None if only a
+        release() (or nobody waiting) can change anything. Waiting for a token (or out
+        a 429) is timed by the head of the queue, so it is woken to re-arm its timer.
+        """
+        while self._waiting:
+            _, _, waiter = self._waiting[0]
+            if waiter.abandoned:
+                heapq.heappop(self._waiting)
+                continue
+            now = time.monotonic()
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                return None
+            if now < self._paused_until:
+                delay_s = self._paused_until - now
+            elif self.bucket is not None and not self.bucket.take(now):
+                delay_s = self.bucket.delay_s(now)
+            else:
+                delay_s = None
+            if delay_s is not None:
+                if waiter is not caller:
+                    waiter.wake()
+                return delay_s
+            heapq.heappop(self._waiting)
+            self.queued -= 1
+            self.in_flight += 1
+            self.stats.peak_in_flight = max(self.stats.peak_in_flight, self.in_flight)
+            waiter.granted = True
+            waiter.wake()
+        return None
+
+    def _grant(self, waiter: _Waiter) -> CallGrant:
+        wait_ms = (time.perf_counter() - waiter.queued_at) * 1000
+        self.stats.waits[waiter.priority].observe(wait_ms)
+        if self.metrics is not None:
+            self.metrics.observe(self._metric_names[waiter.priority], wait_ms)
+        return CallGrant(self, wait_ms)
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Takes a waiter out of the queue; False if it was granted in the meantime."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            waiter.abandoned = True
+            self.queued -= 1
+            self.stats.abandoned += 1
+            self._admit() # It may have been holding up the head of the queue
+            return True
+
+    def acquire(self, priority: int = INTERACTIVE, cancelled=None) -> CallGrant:
+        """
+        Blocks until the call may be sent. Once `cancelled` (an AwaitableEvent) is set
+        while waiting, the call leaves the queue and CallCancelled is raised. The listener
+        put on `cancelled` is taken off again either way, as the event may outlive many calls.
+        """
+        event = threading.Event() # Set when the waiter is granted or should check again
+        waiter = _Waiter(priority, event.set)
+        if cancelled is not None:
+            cancelled.add_listener(event.set)
+        try:
+            with self._lock:
+                self._enqueue(waiter)
+                retry_s = self._admit(waiter)
+            while not waiter.granted:
+                if cancelled is not None and cancelled.is_set() and self._abandon(waiter):
+                    raise CallCancelled(f"{self.name} call cancelled while queued")
+                event.wait(retry_s)
+                event.clear()
+                with self._lock:
+                    retry_s = self._admit(waiter)
+        finally:
+            if cancelled is not None:
+                cancelled.remove_listener(event.set)
+        return self._grant(waiter)
+
+    async def acquire_async(self, priority: int = INTERACTIVE) -> CallGrant:
+        """acquire() for coroutines; cancelling the task takes the call out of the queue."""
+        loop = asyncio.get_running_loop()
+        wakeup = [loop.create_future()] # Resolved when the waiter is granted or should check again
+
+        def wake():
+            # Called under the lock, possibly from another thread or loop
+            try:
+                loop.call_soon_threadsafe(lambda: wakeup[0].done() or wakeup[0].set_result(None))
+            except RuntimeError:
+                pass # Loop closed; the call was abandoned with it
+
+        waiter = _Waiter(priority, wake)
+        with self._lock:
+            self._enqueue(waiter)
+            retry_s = self._admit(waiter)
+        try:
+            while not waiter.granted:
+                await asyncio.wait(wakeup, timeout=retry_s) # Unlike wait_for, never swallows a cancel
+                if wakeup[0].done():
+                    wakeup[0] = loop.create_future()
+                with self._lock:
+                    retry_s = self._admit(waiter)
+        except asyncio.CancelledError:
+            if not self._abandon(waiter):
+                self._release(self._grant(waiter))
+            raise
+        return self._grant(waiter)
+
+    def _release(self, grant: CallGrant):
+        with self._lock:
+            if grant.released:
+                return
+            grant.released = True
+            self.in_flight -= 1
+            self._admit()
+
+    def throttled(self, retry_after_s: float = None):
+        """The provider answered 429: nothing more is sent to it for `retry_after_s`."""
+        pause_s = retry_after_s if retry_after_s is not None else self.THROTTLE_PAUSE_S
+        with self._lock:
+            self.stats.throttled += 1
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + pause_s)
+            if self.bucket is not None:
+                self.bucket.empty(now)
+            self._admit() # The head of the queue re-arms its timer for the pause
+
+    def summary(self) -> str:
+        limits = []
+        if self.bucket is not None:
+            limits.append(f"{self.bucket.rate:g}/s")
+        if self.max_in_flight is not None:
+            limits.append(f"{self.max_in_flight} in flight")
+        return f"quota {', '.join(limits) or 'unlimited'}: {self.stats.summary()}"
+
+
+def retry_after_s(headers) -> float:
+    """Seconds from a Retry-After header given in seconds (None if absent or a date)."""
+    value = headers.get("Retry-After") if headers is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,152 @@
+import asyncio
+import collections
+
+from google.genai import types
+
+from call_scheduler import BACKGROUND
+
+# --- What the model sees of the conversation so far ---
+class ConversationContext:
+    """
+    Keeps the prompt sent per turn within a token budget on long calls.
+
+    Recent exchanges are sent verbatim, newest first, until `max_history_tokens` is
+    reached. Once the stored exchanges exceed the budget, the oldest ones are folded
+    into a rolling summary by a background Gemini request; until it finishes, turns
+    simply send fewer old exchanges, so compaction never delays a response.
+
+    Token counts are estimated locally (~4 characters per token) so building a
+    prompt costs no network round trip; Gemini's reported prompt_token_count is
+    recorded next to the estimate for every turn. With a `scheduler` (the model's
+    CallScheduler), summary requests queue behind every turn's request.
+    """
+    CHARS_PER_TOKEN = 4
+    SUMMARY_INSTRUCTIONS = (
+        "You maintain a running summary of a spoken conversation between a user and an assistant. "
+        "Merge the existing summary with the new exchanges into one short paragraph of plain text. "
+        "Keep names, facts, numbers, decisions and open questions; drop greetings and filler."
+    )
+
+    def __init__(self, client, model: str, max_history_tokens: int = 2000,
+                 keep_recent_exchanges: int = 3, max_summary_tokens: int = 300, scheduler=None):
+        self.client = client
+        self.model = model
+        self.scheduler = scheduler
+        self.max_history_tokens = max_history_tokens
+        self.keep_recent_exchanges = keep_recent_exchanges
+        self.max_summary_tokens = max_summary_tokens
+        self.exchanges = collections.deque() # (user_text, model_text, estimated_tokens), oldest first
+        self.summary = ""
+        self._compaction = None # Running asyncio task, if any
+        self.compactions = 0
+        self.turn_tokens = collections.deque(maxlen=1000) # (estimated, reported, ttft_ms) per turn
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        return len(text) // cls.CHARS_PER_TOKEN + 1
+
+    @property
+    def history_tokens(self) -> int:
+        return sum(tokens for _, _, tokens in self.exchanges)
+
+    def caller_text(self) -> str:
+        """What the caller has said in the call so far (the summary stands in for compacted turns)."""
+        return "\n".join([self.summary] + [user_text for user_text, _, _ in self.exchanges])
+
+    def add_exchange(self, user_text: str, model_text: str):
+        tokens = self.estimate_tokens(user_text) + self.estimate_tokens(model_text)
+        self.exchanges.append((user_text, model_text, tokens))
+        self._maybe_compact()
+
+    def build_contents(self, prompt: str) -> tuple:
+        """
+        Returns (contents, estimated_tokens) for a request answering `prompt`:
+        the summary, then as many recent exchanges as fit in the budget, then the prompt.
+        """
+        budget = self.max_history_tokens
+        summary_tokens = self.estimate_tokens(self.summary) if self.summary else 0
+        budget -= summary_tokens
+        recent = []
+        for user_text, model_text, tokens in reversed(self.exchanges):
+            if tokens > budget and recent:
+                break
+            recent.append((user_text, model_text))
+            budget -= tokens
+
+        contents = []
+        if self.summary:
+            contents.append(types.Content(role="user", parts=[types.Part(
+                text=f"Summary of our conversation so far: {self.summary}")]))
+            contents.append(types.Content(role="model", parts=[types.Part(text="Understood.")]))
+        for user_text, model_text in reversed(recent):
+            contents.append(types.Content(role="user", parts=[types.Part(text=user_text)]))
+            contents.append(types.Content(role="model", parts=[types.Part(text=model_text)]))
+        contents.append(types.Content(role="user", parts=[types.Part(text=prompt)]))
+        estimated = self.max_history_tokens - budget + self.estimate_tokens(prompt)
+        return contents, estimated
+
+    def record_turn(self, estimated_tokens: int, reported_tokens: int = None, ttft_ms: float = None):
+        self.turn_tokens.append((estimated_tokens, reported_tokens, ttft_ms))
+
+    # --- Background compaction ---
+    def _maybe_compact(self):
+        if self._compaction is not None and not self._compaction.done():
+            return
+        if (self.history_tokens <= self.max_history_tokens or
+                len(self.exchanges) <= self.keep_recent_exchanges):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return # Only compacted when running on the LLM's event loop
+        self._compaction = loop.create_task(self._compact())
+
+    async def _compact(self):
+        folded = list(self.exchanges)[:len(self.exchanges) - self.keep_recent_exchanges]
+        transcript = "\n".join(f"User: {user_text}\nAssistant: {model_text}"
+                               for user_text, model_text, _ in folded)
+        request = (f"Existing summary: {self.summary or '(none)'}\n\nNew exchanges:\n{transcript}")
+        config = types.GenerateContentConfig(system_instruction=self.SUMMARY_INSTRUCTIONS,
+                                             max_output_tokens=self.max_summary_tokens)
+        grant = await self.scheduler.acquire_async(BACKGROUND) if self.scheduler is not None else None
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=self.model, contents=request, config=config)
+            summary = (response.text or "").strip()
+        except Exception as e:
+            print(f"[LLM Context] Summary request failed, keeping the full history for now: {e}")
+            return
+        finally:
+            if grant is not None:
+                grant.release()
+        if not summary:
+            return
+        # Exchanges are only ever appended, so the folded ones are still at the front
+        for _ in folded:
+            self.exchanges.popleft()
+        self.summary = summary
+        self.compactions += 1
+        print(f"[LLM Context] Folded {len(folded)} exchange(s) into the summary "
+              f"(~{self.estimate_tokens(summary)} tokens); {len(self.exchanges)} kept verbatim.")
+        self._maybe_compact()
+
+    def close(self):
+        if self._compaction is not None:
+            self._compaction.cancel()
+
+    def summary_text(self) -> str:
+        if not self.turn_tokens:
+            return "no turns"
+        estimated = [e for e, _, _ in self.turn_tokens]
+        reported = [r for _, r, _ in self.turn_tokens if r is not None]
+        ttfts = [t for _, _, t in self.turn_tokens if t is not None]
+        text = (f"{len(estimated)} turn(s), prompt tokens est. avg={sum(estimated) / len(estimated):.0f} "
+                f"max={max(estimated)}")
+        if reported:
+            text += f", reported avg={sum(reported) / len(reported):.0f} last={reported[-1]}"
+        if ttfts:
+            half = len(ttfts) // 2 or 1
+            first, last = ttfts[:half], ttfts[-half:]
+            text += (f", TTFT first half avg={sum(first) / len(first):.0f}ms "
+                     f"last half avg={sum(last) / len(last):.0f}ms")
+        return text + f", {self.compactions} compaction(s)"
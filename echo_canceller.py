@@ -0,0 +1,257 @@
+import collections
+import sys
+import threading
+import wave
+
+try:
+    import numpy as np
+except ImportError: # Echo suppression is skipped if NumPy is missing
+    np = None
+
+# --- What the speaker is playing, resampled to the mic rate ---
+class PlaybackReference:
+    """
+    Receives every buffer the audio sink hands to the device (feed() runs in the device
+    callback, so it only appends bytes) and gives the mic side the same signal at the
+    mic rate, one frame at a time. The backlog is held near `target_lag_ms` so the
+    reference leads the echo by a little less than the speaker-to-mic delay.
+    """
+    def __init__(self, playback_rate: int = 24000, mic_rate: int = 16000,
+                 target_lag_ms: int = 20, max_lag_ms: int = 60):
+        if np is None:
+            raise RuntimeError("NumPy is required for echo suppression")
+        self.step = playback_rate / mic_rate
+        self.target_lag = mic_rate * target_lag_ms // 1000
+        self.max_lag = mic_rate * max_lag_ms // 1000
+        self._raw = collections.deque()
+        self._lock = threading.Lock()
+        self._source = np.zeros(0, dtype=np.float32) # Playback-rate samples not yet resampled
+        self._position = 0.0 # Fractional read position in _source
+        self._resampled = np.zeros(0, dtype=np.float32)
+
+    def feed(self, pcm: bytes):
+        with self._lock:
+            self._raw.append(bytes(pcm))
+
+    def _resample_pending(self):
+        with self._lock:
+            raw, self._raw = b"".join(self._raw), collections.deque()
+        if raw:
+            samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+            self._source = np.concatenate([self._source, samples])
+        count = int((len(self._source) - 1 - self._position) // self.step) + 1 if len(self._source) > 1 else 0
+        if count <= 0:
+            return
+        positions = self._position + self.step * np.arange(count)
+        resampled = np.interp(positions, np.arange(len(self._source)), self._source).astype(np.float32)
+        self._resampled = np.concatenate([self._resampled, resampled])
+        consumed = int(positions[-1] + self.step)
+        consumed = min(consumed, len(self._source) - 1)
+        self._position = positions[-1] + self.step - consumed
+        self._source = self._source[consumed:]
+
+    def take(self, count: int):
+        """The next `count` reference samples aligned with the mic frame just captured."""
+        self._resample_pending()
+        if len(self._resampled) > self.max_lag + count:
+            self._resampled = self._resampled[len(self._resampled) - self.target_lag - count:]
+        if len(self._resampled) < count: # Sink not running yet: nothing is being played
+            self._resampled = np.concatenate([np.zeros(count - len(self._resampled), np.float32),
+                                              self._resampled])
+        out, self._resampled = self._resampled[:count], self._resampled[count:]
+        return out
+
+
+# --- Adaptive echo cancellation on mic frames ---
+class EchoCanceller:
+    """
+    Partitioned-block frequency-domain NLMS filter: learns the speaker-to-mic echo path
+    from the playback reference and subtracts the predicted echo from each mic frame.
+    `partitions * block` samples of echo tail are modelled (160 ms by default), all
+    partitions updated at once with NumPy. Adaptation pauses during double talk
+    (Geigel detector) so the caller's voice does not disturb the filter. What echo the
+    filter has not yet learned is attenuated by up to `suppression_db` while only the
+    bot is talking, so it does not read as speech to the VAD.
+
+    process() takes and returns 16-bit mono PCM bytes at the mic rate.
+    """
+    def __init__(self, mic_rate: int = 16000, playback_rate: int = 24000, block: int = 160,
+                 partitions: int = 16, step_size: float = 0.3, suppression_db: float = 20.0,
+                 reference: PlaybackReference = None):
+        if np is None:
+            raise RuntimeError("NumPy is required for echo suppression")
+        self.block = block
+        self.partitions = partitions
+        self.step_size = step_size
+        self.min_gain = 10 ** (-suppression_db / 20)
+        self.reference = reference if reference is not None else PlaybackReference(playback_rate, mic_rate)
+        bins = block + 1
+        self._weights = np.zeros((partitions, bins), dtype=np.complex64)
+        self._ref_spectra = np.zeros((partitions, bins), dtype=np.complex64)
+        self._ref_power = np.full(bins, 1e-6, dtype=np.float32)
+        self._prev_ref = np.zeros(block, dtype=np.float32)
+        self._ref_history = np.zeros(partitions * block, dtype=np.float32) # For the double-talk check
+        self._pending = b""
+        self._leak = 1.0 # Smoothed residual/mic energy ratio while only the bot talks
+        self._diverging = 0 # Consecutive blocks where the filter made things worse
+        self._noise_energy = None # Room noise per block, so suppression never goes below it
+        self.resets = 0
+        self.mic_energy = 0.0
+        self.residual_energy = 0.0 # Over blocks where only the bot was talking
+
+    def process(self, data: bytes) -> bytes:
+        data = self._pending + bytes(data)
+        usable = len(data) - len(data) % (self.block * 2)
+        self._pending = data[usable:]
+        if not usable:
+            return b""
+        mic = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32) / 32768.0
+        reference = self.reference.take(len(mic))
+        out = np.empty_like(mic)
+        for start in range(0, len(mic), self.block):
+            end = start + self.block
+            out[start:end] = self._process_block(mic[start:end], reference[start:end])
+        return (np.clip(out, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+    def _process_block(self, mic, reference):
+        block = self.block
+        spectrum = np.fft.rfft(np.concatenate([self._prev_ref, reference]))
+        self._prev_ref = reference
+        self._ref_spectra = np.roll(self._ref_spectra, 1, axis=0)
+        self._ref_spectra[0] = spectrum
+        self._ref_history = np.concatenate([self._ref_history[block:], reference])
+
+        echo = np.fft.irfft((self._ref_spectra * self._weights).sum(axis=0))[block:]
+        error = mic - echo
+        playing = float(np.max(np.abs(self._ref_history))) > 1e-3
+        if not playing:
+            mic_energy = float(np.dot(mic, mic))
+            if self._noise_energy is None or mic_energy < self._noise_energy:
+                self._noise_energy = mic_energy
+            else:
+                self._noise_energy += 0.05 * (mic_energy - self._noise_energy)
+            return error
+
+        mic_energy = float(np.dot(mic, mic))
+        error_energy = float(np.dot(error, error))
+        self._diverging = self._diverging + 1 if error_energy > 4 * mic_energy else 0
+        if self._diverging >= 10: # Worse than no filter for 100 ms: learn the path again
+            self._weights[:] = 0
+            self._leak = 1.0
+            self._diverging = 0
+            self.resets += 1
+            error, error_energy = mic, mic_energy
+        # Geigel: a mic level near the loudest recent playback means the caller is talking too
+        double_talk = float(np.max(np.abs(mic))) > 0.6 * float(np.max(np.abs(self._ref_history)))
+        if not double_talk:
+            self._leak = 0.9 * self._leak + 0.1 * min(1.0, error_energy / (mic_energy + 1e-9))
+            self._ref_power = 0.9 * self._ref_power + 0.1 * (np.abs(spectrum) ** 2)
+            error_spectrum = np.fft.rfft(np.concatenate([np.zeros(block, np.float32), error]))
+            # Regularized against the average power so near-empty bins of voiced speech do not blow up
+            power = self._ref_power + 0.05 * float(self._ref_power.mean()) + 1e-6
+            gradient = np.conj(self._ref_spectra) * error_spectrum / (power * self.partitions)
+            # Constrain each partition to `block` taps (overlap-save)
+            taps = np.fft.irfft(gradient, axis=1)
+            taps[:, block:] = 0
+            self._weights += self.step_size * np.fft.rfft(taps, axis=1).astype(np.complex64)
+
+        # Residual suppression: quiet the output when it is no louder than the expected leak
+        gain = min(1.0, max(self.min_gain, 1.0 - 2.0 * self._leak * mic_energy / (error_energy + 1e-9)))
+        if self._noise_energy is not None: # Keep the room noise the VAD has calibrated on
+            gain = max(gain, min(1.0, (self._noise_energy / (error_energy + 1e-12)) ** 0.5))
+        error = error * gain
+        if not double_talk:
+            self.mic_energy += mic_energy
+            self.residual_energy += error_energy * gain * gain
+        return error
+
+    @property
+    def erle_db(self) -> float:
+        """Echo return loss enhancement while only the bot was talking (higher is better)."""
+        if self.residual_energy <= 0 or self.mic_energy <= 0:
+            return 0.0
+        return float(10 * np.log10(self.mic_energy / self.residual_energy))
+
+    def summary(self) -> str:
+        return f"ERLE {self.erle_db:.1f}dB, {self.resets} filter reset(s)"
+
+
+# --- Offline check: barge-ins detected on the raw mix vs. after echo suppression ---
+def count_onsets(mic_pcm: bytes, playback_pcm: bytes, mic_rate: int, playback_rate: int,
+                 cancel: bool, frame_ms: int = 20):
+    """Plays `playback_pcm` as the reference in step with `mic_pcm`; returns (onsets, canceller)."""
+    from vad import VoiceActivityDetector
+
+    canceller = EchoCanceller(mic_rate, playback_rate) if cancel else None
+    detector = VoiceActivityDetector(mic_rate)
+    mic_frame = mic_rate * frame_ms // 1000 * 2
+    playback_frame = playback_rate * frame_ms // 1000 * 2
+    onsets = []
+    for index, start in enumerate(range(0, len(mic_pcm) - mic_frame + 1, mic_frame)):
+        frame = mic_pcm[start:start + mic_frame]
+        if canceller is not None:
+            reference = playback_pcm[index * playback_frame:(index + 1) * playback_frame]
+            canceller.reference.feed(reference.ljust(playback_frame, b"\0"))
+            frame = canceller.process(frame)
+        onsets.extend(ms for name, ms in detector.process(frame, strict=True) if name == "speech_start")
+    return onsets, canceller
+
+
+def _read_wav(path: str):
+    with wave.open(path, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16-bit mono PCM")
+        return wav.readframes(wav.getnframes()), wav.getframerate()
+
+
+def _report(mic_pcm, playback_pcm, mic_rate, playback_rate):
+    raw_onsets, _ = count_onsets(mic_pcm, playback_pcm, mic_rate, playback_rate, cancel=False)
+    clean_onsets, canceller = count_onsets(mic_pcm, playback_pcm, mic_rate, playback_rate, cancel=True)
+    print(f"[Echo] barge-ins on raw mic: {len(raw_onsets)} at {raw_onsets}ms")
+    print(f"[Echo] barge-ins after suppression: {len(clean_onsets)} at {clean_onsets}ms, {canceller.summary()}")
+    return raw_onsets, clean_onsets, canceller
+
+
+def _run_self_check(mic_rate: int = 16000, playback_rate: int = 24000):
+    from vad import _synthetic_speech
+
+    rng = np.random.default_rng(11)
+    seconds = 9.0
+    bot = np.zeros(int(seconds * playback_rate))
+    # Quiet room for 1 s, then three bot utterances; the third is interrupted at 7 s
+    for start_s, end_s in ((1.0, 3.0), (3.6, 5.2), (5.8, 9.0)):
+        start, end = int(start_s * playback_rate), int(end_s * playback_rate)
+        bot[start:end] = _synthetic_speech(end_s - start_s, playback_rate, rng)[:end - start]
+    bot_at_mic_rate = np.interp(np.arange(int(seconds * mic_rate)) * playback_rate / mic_rate,
+                                np.arange(len(bot)), bot)
+    # Room: 40 ms to the mic, -10 dB, with a short diffuse tail
+    delay = int(0.04 * mic_rate)
+    path = np.zeros(delay + int(0.03 * mic_rate))
+    path[delay] = 0.3
+    tail = len(path) - delay - 1
+    path[delay + 1:] = 0.05 * np.exp(-np.arange(tail) / 40.0) * rng.standard_normal(tail)
+    echo = np.convolve(bot_at_mic_rate, path)[:len(bot_at_mic_rate)]
+    caller = np.zeros_like(echo)
+    onset = int(7.0 * mic_rate) # The caller really barges in at 7 s
+    caller[onset:onset + mic_rate] = 1.2 * _synthetic_speech(1.0, mic_rate, rng)
+    mic = echo + caller + 0.002 * rng.standard_normal(len(echo))
+
+    to_pcm = lambda signal: (np.clip(signal, -1, 1) * 32767).astype("<i2").tobytes()
+    raw, clean, canceller = _report(to_pcm(mic), to_pcm(bot), mic_rate, playback_rate)
+    false_raw = [ms for ms in raw if ms < 7000]
+    false_clean = [ms for ms in clean if ms < 7000]
+    print(f"[Echo self-check] false interrupts: {len(false_raw)} before, {len(false_clean)} after")
+    assert len(false_clean) < max(1, len(false_raw)), "echo suppression did not reduce false interrupts"
+    assert any(7000 <= ms <= 7200 for ms in clean), "the real barge-in must still be detected"
+    print("[Echo self-check] OK")
+
+
+if __name__ == "__main__":
+    # python echo_canceller.py                      -> synthetic self-check
+    # python echo_canceller.py playback.wav mic.wav -> compare barge-ins on a recorded mix
+    if len(sys.argv) == 3:
+        playback_pcm, playback_rate = _read_wav(sys.argv[1])
+        mic_pcm, mic_rate = _read_wav(sys.argv[2])
+        _report(mic_pcm, playback_pcm, mic_rate, playback_rate)
+    else:
+        _run_self_check()
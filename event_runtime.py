@@ -0,0 +1,314 @@
+import asyncio
+import collections
+import queue
+import threading
+import time
+
+class QueueClosed(Exception):
+    """Raised by HandoffQueue getters (and putters) once the queue has been closed."""
+
+
+def _wake(loop, future):
+    """Resolves an async waiter's future from any thread."""
+    def _resolve():
+        if not future.done():
+            future.set_result(None)
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        _resolve()
+    elif not loop.is_closed():
+        loop.call_soon_threadsafe(_resolve)
+
+
+# --- Handoff latency bookkeeping ---
+class HandoffStats:
+    """
+    Measures how long an item waits between put() and the consumer that was already
+    waiting for it waking up. Items that queue behind a busy consumer are only counted.
+    """
+    def __init__(self, max_samples: int = 1000):
+        self._lock = threading.Lock()
+        self.samples_ms = collections.deque(maxlen=max_samples)
+        self.backlogged = 0
+
+    def record(self, latency_ms: float):
+        with self._lock:
+            self.samples_ms.append(latency_ms)
+
+    def record_backlog(self):
+        with self._lock:
+            self.backlogged += 1
+
+    def summary(self) -> str:
+        with self._lock:
+            samples = sorted(self.samples_ms)
+            backlogged = self.backlogged
+        if not samples:
+            return f"no idle handoffs, {backlogged} backlogged item(s)"
+        p50 = samples[len(samples) // 2]
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return (f"{len(samples)} idle handoff(s): p50={p50:.3f}ms p95={p95:.3f}ms "
+                f"max={samples[-1]:.3f}ms, {backlogged} backlogged item(s)")
+
+
+# --- A queue that both threads and coroutines can wait on without polling ---
+class HandoffQueue:
+    """
+    FIFO with the queue.Queue interface (put/put_nowait/get/get_nowait/task_done) plus
+    awaitable put_async()/get_async(). A put wakes a waiting consumer directly, whether
+    it is a blocked thread or a coroutine on any event loop, so no side has to poll
+    with timeouts. close() wakes every waiter with QueueClosed for shutdown.
+    """
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self._items = collections.deque() # (put_time, waiter_was_ready, item)
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._blocked_getters = 0
+        self._async_getters = collections.deque() # (loop, future)
+        self._async_putters = collections.deque()
+        self._closed = False
+        self.stats = HandoffStats()
+
+    # --- State ---
+    def qsize(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def full(self) -> bool:
+        with self._lock:
+            return self._is_full()
+
+    def _is_full(self) -> bool:
+        return 0 < self.maxsize <= len(self._items)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    # --- Internals (called with the lock held) ---
+    def _wake_one(self, waiters: collections.deque):
+        while waiters:
+            loop, future = waiters.popleft()
+            if not future.done():
+                _wake(loop, future)
+                return
+
+    def _wake_all(self, waiters: collections.deque):
+        while waiters:
+            loop, future = waiters.popleft()
+            _wake(loop, future)
+
+    def _push(self, item):
+        consumer_waiting = self._blocked_getters > 0 or any(
+            not future.done() for _, future in self._async_getters)
+        self._items.append((time.perf_counter(), consumer_waiting, item))
+        self._not_empty.notify()
+        self._wake_one(self._async_getters)
+
+    def _pop(self):
+        put_time, consumer_waiting, item = self._items.popleft()
+        if consumer_waiting:
+            self.stats.record((time.perf_counter() - put_time) * 1000)
+        else:
+            self.stats.record_backlog()
+        self._not_full.notify()
+        self._wake_one(self._async_putters)
+        return item
+
+    # --- Producer side ---
+    def put_nowait(self, item):
+        with self._lock:
+            if self._closed:
+                raise QueueClosed()
+            if self._is_full():
+                raise queue.Full
+            self._push(item)
+
+    def put(self, item, block: bool = True, timeout: float = None):
+        if not block:
+            return self.put_nowait(item)
+        with self._lock:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self._is_full() and not self._closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Full
+                self._not_full.wait(remaining)
+            if self._closed:
+                raise QueueClosed()
+            self._push(item)
+
+    async def put_async(self, item):
+        """Waits (without blocking the event loop) until there is room, then enqueues."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise QueueClosed()
+                if not self._is_full():
+                    self._push(item)
+                    return
+                future = loop.create_future()
+                self._async_putters.append((loop, future))
+            await self._wait_for_wakeup(future, self._async_putters)
+
+    # --- Consumer side ---
+    def get_nowait(self):
+        with self._lock:
+            if self._items:
+                return self._pop()
+            if self._closed:
+                raise QueueClosed()
+            raise queue.Empty
+
+    def get(self, block: bool = True, timeout: float = None):
+        if not block:
+            return self.get_nowait()
+        with self._lock:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._items:
+                if self._closed:
+                    raise QueueClosed()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._blocked_getters += 1
+                try:
+                    self._not_empty.wait(remaining)
+                finally:
+                    self._blocked_getters -= 1
+            return self._pop()
+
+    async def get_async(self):
+        """Waits (without blocking the event loop) for the next item."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._items:
+                    return self._pop()
+                if self._closed:
+                    raise QueueClosed()
+                future = loop.create_future()
+                self._async_getters.append((loop, future))
+            await self._wait_for_wakeup(future, self._async_getters)
+
+    async def _wait_for_wakeup(self, future, waiters: collections.deque):
+        try:
+            await future
+        except asyncio.CancelledError:
+            # A wakeup consumed by a cancelled waiter is passed on to the next one
+            if future.done() and not future.cancelled():
+                with self._lock:
+                    self._wake_one(waiters)
+            raise
+
+    def task_done(self):
+        """Kept for queue.Queue compatibility; completion is not tracked."""
+
+    def drain(self) -> list:
+        """Removes and returns everything currently queued."""
+        with self._lock:
+            items = [entry[2] for entry in self._items]
+            self._items.clear()
+            self._not_full.notify_all()
+            self._wake_all(self._async_putters)
+        return items
+
+    def close(self):
+        """Wakes every waiting producer and consumer; further gets raise QueueClosed once empty."""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+            self._wake_all(self._async_getters)
+            self._wake_all(self._async_putters)
+
+
+# --- A threading.Event that coroutines and callbacks can also wait on ---
+class AwaitableEvent(threading.Event):
+    """
+    Drop-in threading.Event whose set() also resumes coroutines awaiting wait_async()
+    and runs registered listeners, so nobody has to poll is_set().
+    """
+    def __init__(self):
+        super().__init__()
+        self._extra_lock = threading.Lock()
+        self._async_waiters = []
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Registers callback() to run in the setting thread every time the event is set."""
+        with self._extra_lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Unregisters a callback added with add_listener (no-op if it is not registered)."""
+        with self._extra_lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def set(self):
+        super().set()
+        with self._extra_lock:
+            waiters, self._async_waiters = self._async_waiters, []
+            listeners = list(self._listeners)
+        for loop, future in waiters:
+            _wake(loop, future)
+        for callback in listeners:
+            callback()
+
+    async def wait_async(self):
+        loop = asyncio.get_running_loop()
+        while not self.is_set():
+            future = loop.create_future()
+            with self._extra_lock:
+                if self.is_set():
+                    break
+                self._async_waiters.append((loop, future))
+            await future
+        return True
+
+
+# --- How late the event loop runs its callbacks ---
+class LoopLagMonitor:
+    """
+    Sleeps `interval` seconds at a time on the loop and records how much later than
+    requested it woke up. Sustained lag means coroutines (or GIL contention from the
+    loop's threads) delay everything else on the loop, including audio forwarding.
+    `lag_ms` is a moving average; `max_lag_ms` is the worst since the last reset_max().
+    """
+    def __init__(self, interval: float = 0.1, smoothing: float = 0.2):
+        self.interval = interval
+        self.smoothing = smoothing
+        self.lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            due = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (loop.time() - due) * 1000)
+            self.lag_ms += self.smoothing * (lag_ms - self.lag_ms)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+    def reset_max(self) -> float:
+        worst, self.max_lag_ms = self.max_lag_ms, 0.0
+        return worst
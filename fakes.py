@@ -0,0 +1,600 @@
+import argparse
+import array
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import re
+import struct
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+# --- Latency with jitter, shared by every stand-in ---
+class LatencyModel:
+    """
+    Normally distributed delay (clipped at zero), reproducible for a given seed. A
+    `stall_rate` fraction of samples are `stall_ms` longer, standing in for the
+    occasional stuck request that hedging is meant to cover.
+    """
+    def __init__(self, mean_ms: float, jitter_ms: float = 0.0, seed: int = None,
+                 stall_rate: float = 0.0, stall_ms: float = 0.0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self.stall_rate = stall_rate
+        self.stall_ms = stall_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_s(self) -> float:
+        with self._lock:
+            delay_ms = self._rng.gauss(self.mean_ms, self.jitter_ms) if self.jitter_ms else self.mean_ms
+            if self.stall_rate and self._rng.random() < self.stall_rate:
+                delay_ms += self.stall_ms
+        return max(0.0, delay_ms) / 1000
+
+
+class FailureModel:
+    """Decides, reproducibly, which requests get an error response."""
+    def __init__(self, rate: float = 0.0, seed: int = None):
+        self.rate = rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return bool(self.rate) and self._rng.random() < self.rate
+
+
+class QuotaModel:
+    """
+    A provider's quotas: `rate_per_s` requests per second (token bucket of `burst`) and
+    `max_concurrency` responses open at once; None means unlimited. Requests over
+    either limit are answered 429 with a Retry-After, as the real APIs do.
+    """
+    def __init__(self, rate_per_s: float = None, burst: float = None, max_concurrency: int = None):
+        self.rate_per_s = rate_per_s
+        self.burst = burst if burst is not None else max(1.0, rate_per_s or 1.0)
+        self.max_concurrency = max_concurrency
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._open = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def admit(self) -> float:
+        """Reserves room for one request: returns None if admitted, else the Retry-After seconds."""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate_per_s:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_s)
+                self._updated = now
+            if self.max_concurrency is not None and self._open >= self.max_concurrency:
+                self.rejected += 1
+                return 1.0
+            if self.rate_per_s:
+                if self._tokens < 1:
+                    self.rejected += 1
+                    return (1 - self._tokens) / self.rate_per_s
+                self._tokens -= 1
+            self._open += 1
+            return None
+
+    def release(self):
+        with self._lock:
+            self._open -= 1
+
+
+def _send_throttled(handler: BaseHTTPRequestHandler, retry_after: float, body: dict):
+    data = json.dumps(body).encode("utf-8")
+    handler.send_response(429)
+    handler.send_header("Retry-After", f"{max(1, math.ceil(retry_after))}")
+    handler.send_header("Content-Type", "application/json")
+    handler.send_header("Content-Length", str(len(data)))
+    handler.end_headers()
+    handler.wfile.write(data)
+
+
+def normalize_key(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+def _write_chunk(wfile, data: bytes):
+    """One HTTP/1.1 chunked transfer-encoding chunk (an empty one ends the body)."""
+    wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+    wfile.flush()
+
+
+# --- Gemini streamGenerateContent stand-in ---
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    """
+    Answers `...:streamGenerateContent?alt=sse` with server-sent events shaped like
+    Gemini's. The reply is looked up by the last user message in the script's
+    responses (normalized), and streamed a few words per event after `ttft` latency.
+    """
+    protocol_version = "HTTP/1.1"
+    responses = {}
+    default_response = "This is a scripted answer from the benchmark stand-in. It has two sentences."
+    ttft = LatencyModel(350, 80)
+    inter_chunk = LatencyModel(40, 15)
+    failures = FailureModel()
+    quota = QuotaModel()
+    words_per_chunk = 4
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if ":streamGenerateContent" not in self.path:
+            self.send_error(404)
+            return
+        user_text = ""
+        for content in body.get("contents", []):
+            if content.get("role", "user") == "user":
+                user_text = " ".join(part.get("text", "") for part in content.get("parts", []))
+        reply = self.responses.get(normalize_key(user_text), self.default_response)
+
+        retry_after = self.quota.admit()
+        if retry_after is not None:
+            _send_throttled(self, retry_after, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED",
+                                                          "message": "Resource has been exhausted."}})
+            return
+        try:
+            self._stream_reply(reply)
+        finally:
+            self.quota.release()
+
+    def _stream_reply(self, reply: str):
+        time.sleep(self.ttft.sample_s())
+        if self.failures.should_fail():
+            self.send_error(503, "Injected failure")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = reply.split(" ")
+        try:
+            for start in range(0, len(words), self.words_per_chunk):
+                text = " ".join(words[start:start + self.words_per_chunk])
+                if start + self.words_per_chunk < len(words):
+                    text += " "
+                event = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+                _write_chunk(self.wfile, f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8"))
+                time.sleep(self.inter_chunk.sample_s())
+            _write_chunk(self.wfile, b"")
+        except (BrokenPipeError, ConnectionResetError):
+            pass # The client cancelled the generation (barge-in)
+
+
+# --- Unreal Speech /stream stand-in ---
+class FakeUnrealSpeechHandler(BaseHTTPRequestHandler):
+    """
+    Streams 24 kHz 16-bit mono PCM (a quiet tone) whose duration follows the text
+    length, after `ttfb` latency and at `realtime_factor` times real time. Always
+    answers with PCM, so the client must use AUDIO_FORMAT = "pcm".
+    """
+    protocol_version = "HTTP/1.1"
+    ttfb = LatencyModel(200, 60)
+    failures = FailureModel()
+    quota = QuotaModel()
+    ms_per_char = 65.0 # ~15 characters per second of speech
+    realtime_factor = 4.0
+    sample_rate = 24000
+    chunk_bytes = 4096
+    _tone = b"".join(struct.pack("<h", int(800 * math.sin(2 * math.pi * 220 * i / 24000)))
+                     for i in range(24000))
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/stream"):
+            self.send_error(404)
+            return
+        text = payload.get("Text", "")
+        total = int(len(text) * self.ms_per_char / 1000 * self.sample_rate) * 2
+        audio = (self._tone * (total // len(self._tone) + 1))[:total]
+
+        retry_after = self.quota.admit()
+        if retry_after is not None:
+            _send_throttled(self, retry_after, {"message": "Too many requests"})
+            return
+        try:
+            self._stream_audio(audio)
+        finally:
+            self.quota.release()
+
+    def _stream_audio(self, audio: bytes):
+        time.sleep(self.ttfb.sample_s())
+        if self.failures.should_fail():
+            self.send_error(503, "Injected failure")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/pcm")
+        self.send_header("Content-Length", str(len(audio)))
+        self.end_headers()
+        seconds_per_chunk = self.chunk_bytes / (self.sample_rate * 2) / self.realtime_factor
+        try:
+            for start in range(0, len(audio), self.chunk_bytes):
+                self.wfile.write(audio[start:start + self.chunk_bytes])
+                self.wfile.flush()
+                time.sleep(seconds_per_chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass # Segment cancelled
+
+
+# --- Deepgram live connection stand-in (in-process) ---
+class FakeLiveConnection:
+    """
+    Mimics deepgram.listen.asynclive.v("1"): STTListener registers its handlers with
+    on(), and the benchmark driver calls emit_transcript() to deliver scripted results.
+    Results are delivered in order after `latency`, like transcripts over a socket.
+    """
+    def __init__(self, latency: LatencyModel = None):
+        self.latency = latency if latency is not None else LatencyModel(0)
+        self._handlers = {}
+        self._deliveries = None
+        self._delivery_task = None
+        self.options = None
+        self.bytes_received = 0
+        self.started = asyncio.Event()
+
+    def on(self, event, handler):
+        self._handlers[event] = handler
+
+    async def start(self, options):
+        self.options = options
+        self._deliveries = asyncio.Queue()
+        self._delivery_task = asyncio.get_running_loop().create_task(self._deliver())
+        self.started.set()
+        return True
+
+    async def send(self, data):
+        self.bytes_received += len(data)
+
+    async def finish(self):
+        if self._delivery_task is not None:
+            self._delivery_task.cancel()
+        return True
+
+    def emit_transcript(self, text: str, is_final: bool = False, speech_final: bool = False):
+        """Queues one transcript result; returns immediately."""
+        result = SimpleNamespace(channel=SimpleNamespace(alternatives=[SimpleNamespace(transcript=text)]),
+                                 is_final=is_final, speech_final=speech_final)
+        due = time.monotonic() + self.latency.sample_s()
+        self._deliveries.put_nowait((due, result))
+
+    async def _deliver(self):
+        # Imported here so the HTTP stand-ins can run without the Deepgram SDK installed
+        from deepgram import LiveTranscriptionEvents
+
+        while True:
+            due, result = await self._deliveries.get()
+            await asyncio.sleep(max(0.0, due - time.monotonic())) # FIFO: later results never overtake
+            handler = self._handlers.get(LiveTranscriptionEvents.Transcript)
+            if handler is not None:
+                await handler(self, result)
+
+
+class FakeDeepgramClient:
+    """Passed to STTListener as deepgram_client; hands out one FakeLiveConnection."""
+    def __init__(self, latency: LatencyModel = None):
+        self.latency = latency
+        self.connection = None
+        self.listen = SimpleNamespace(asynclive=SimpleNamespace(v=self._connect))
+
+    def _connect(self, version: str) -> FakeLiveConnection:
+        self.connection = FakeLiveConnection(self.latency)
+        return self.connection
+
+
+# --- Deepgram live endpoint stand-in (websocket, for agents in other processes) ---
+class FakeDeepgramLiveServer:
+    """
+    Serves Deepgram's live transcription websocket for out-of-process agents (the
+    session server workers driven by load_test.py). Audio frames with a peak above
+    `speech_peak` count as speech: each `word_ms` of speech yields an interim result
+    with one more word of the next script line, and `endpointing_ms` without speech
+    yields the whole line as the speech_final result (a Finalize message, sent by the
+    agent's local VAD, finalizes at once). Like Deepgram, silence yields an empty final
+    result every `silence_result_s` of audio.
+
+    With `drop_after_s`, every connection fails that long after it opened, to exercise
+    STT reconnects: "close" aborts the socket, "stall" keeps it open but stops
+    answering. A line left unfinished by a failed connection is the next connection's.
+    Runs its own event loop on a daemon thread.
+    """
+    def __init__(self, lines: list, word_ms: float = 180, endpointing_ms: float = 300, speech_peak: int = 1000,
+                 silence_result_s: float = 0.5, drop_after_s: float = None, drop_mode: str = "close"):
+        self.lines = lines or ["Hi, what can you help me with today?"]
+        self.word_ms = word_ms
+        self.endpointing_s = endpointing_ms / 1000
+        self.speech_peak = speech_peak
+        self.silence_result_s = silence_result_s
+        self.drop_after_s = drop_after_s
+        self.drop_mode = drop_mode
+        self._next_line = itertools.count()
+        self._unfinished = [] # Lines whose connection failed mid-utterance
+        self.port = None
+        self.connections = 0
+        self.drops = 0
+
+    def _take_line(self) -> list:
+        return self._unfinished.pop(0) if self._unfinished else \
+            self.lines[next(self._next_line) % len(self.lines)].split()
+
+    def start(self, port: int = 0, host: str = "127.0.0.1") -> int:
+        started = threading.Event()
+
+        async def run():
+            import websockets # Only needed with --stt; the SDK that talks to it depends on it anyway
+            server = await websockets.serve(self._handle, host, port)
+            self.port = next(iter(server.sockets)).getsockname()[1]
+            started.set()
+            await asyncio.Future()
+
+        threading.Thread(target=lambda: asyncio.run(run()), name="FakeDeepgram_Server", daemon=True).start()
+        if not started.wait(timeout=10):
+            raise RuntimeError("fake Deepgram server did not start")
+        return self.port
+
+    @staticmethod
+    def _result(text: str, start_s: float, duration_s: float, is_final: bool, speech_final: bool,
+                from_finalize: bool = False) -> str:
+        return json.dumps({
+            "type": "Results", "channel_index": [0, 1], "duration": round(duration_s, 3), "start": round(start_s, 3),
+            "is_final": is_final, "speech_final": speech_final, "from_finalize": from_finalize,
+            "channel": {"alternatives": [{"transcript": text, "confidence": 0.99, "words": []}]},
+            "metadata": {"request_id": "fake", "model_uuid": "fake",
+                         "model_info": {"name": "fake", "version": "0", "arch": "fake"}},
+        })
+
+    async def _handle(self, websocket, *path):
+        loop = asyncio.get_running_loop()
+        self.connections += 1
+        state = {"words": self._take_line(), "sent": 0, "speech_ms": 0.0, "last_speech": None,
+                 "audio_s": 0.0, "utterance_start": 0.0, "last_result_s": 0.0, "stalled": False}
+
+        async def finalize(speech_final: bool):
+            if state["last_speech"] is None:
+                return
+            start = state["utterance_start"]
+            await websocket.send(self._result(" ".join(state["words"]), start, state["audio_s"] - start,
+                                              is_final=True, speech_final=speech_final,
+                                              from_finalize=not speech_final))
+            state.update(words=self._take_line(), sent=0, speech_ms=0.0, last_speech=None,
+                         last_result_s=state["audio_s"])
+
+        async def endpointing():
+            while True:
+                await asyncio.sleep(0.02)
+                if state["stalled"]:
+                    return
+                if state["last_speech"] is not None and loop.time() - state["last_speech"] > self.endpointing_s:
+                    await finalize(speech_final=True)
+
+        def release_line():
+            if not state["stalled"] and (state["sent"] or state["last_speech"] is not None):
+                self._unfinished.append(state["words"])
+
+        async def drop():
+            await asyncio.sleep(self.drop_after_s)
+            self.drops += 1
+            if self.drop_mode == "stall":
+                release_line() # Before the client gives up on this connection and opens the next
+                state["stalled"] = True
+            else:
+                websocket.transport.abort()
+
+        endpointer = asyncio.create_task(endpointing())
+        dropper = asyncio.create_task(drop()) if self.drop_after_s else None
+        try:
+            async for message in websocket:
+                if state["stalled"]:
+                    continue
+                if isinstance(message, str):
+                    kind = json.loads(message).get("type")
+                    if kind == "Finalize":
+                        await finalize(speech_final=False)
+                    elif kind == "CloseStream":
+                        break
+                    continue # KeepAlive
+                samples = array.array("h", message[:len(message) // 2 * 2])
+                frame_ms = len(samples) / 16 # 16 kHz mono
+                state["audio_s"] += frame_ms / 1000
+                if not samples or max(max(samples), -min(samples)) < self.speech_peak:
+                    if state["last_speech"] is None and state["audio_s"] - state["last_result_s"] >= self.silence_result_s:
+                        await websocket.send(self._result("", state["last_result_s"],
+                                                          state["audio_s"] - state["last_result_s"],
+                                                          is_final=True, speech_final=False))
+                        state["last_result_s"] = state["audio_s"]
+                    continue
+                if state["last_speech"] is None:
+                    state["utterance_start"] = state["audio_s"]
+                state["last_speech"] = loop.time()
+                state["speech_ms"] += frame_ms
+                heard = min(len(state["words"]), 1 + int(state["speech_ms"] // self.word_ms))
+                if heard > state["sent"]:
+                    state["sent"] = heard
+                    start = state["utterance_start"]
+                    await websocket.send(self._result(" ".join(state["words"][:heard]), start,
+                                                      state["audio_s"] - start, is_final=False, speech_final=False))
+        except Exception:
+            pass # Connection dropped
+        finally:
+            endpointer.cancel()
+            if dropper is not None:
+                dropper.cancel()
+            release_line()
+
+
+class SilentAudioSource:
+    """Passed as STTListener's audio_source_factory: there is no microphone in a benchmark."""
+    def __init__(self, push_callback):
+        self.push_callback = push_callback
+
+    def start(self):
+        pass
+
+    def finish(self):
+        pass
+
+
+# --- Starting the stand-ins from a driver (benchmark_harness.py, load_test.py) ---
+class FakeServices:
+    """
+    Starts fakes.py as a subprocess (so its CPU time is not counted) and stops it on exit.
+    With `stt`, it also serves a Deepgram live endpoint (for out-of-process agents, e.g. load_test.py).
+    """
+    def __init__(self, script_path: str, args, stt: bool = False):
+        self.command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fakes.py"),
+                        "--script", script_path,
+                        "--llm-ttft-ms", str(args.llm_ttft_ms), "--llm-jitter-ms", str(args.llm_jitter_ms),
+                        "--llm-chunk-ms", str(args.llm_chunk_ms),
+                        "--tts-ttfb-ms", str(args.tts_ttfb_ms), "--tts-jitter-ms", str(args.tts_jitter_ms),
+                        "--llm-stall-rate", str(args.llm_stall_rate), "--llm-stall-ms", str(args.llm_stall_ms),
+                        "--llm-error-rate", str(args.llm_error_rate),
+                        "--tts-stall-rate", str(args.tts_stall_rate), "--tts-stall-ms", str(args.tts_stall_ms),
+                        "--tts-error-rate", str(args.tts_error_rate)]
+        if args.seed is not None:
+            self.command += ["--seed", str(args.seed)]
+        for option in ("llm_rate_limit", "llm_max_concurrency", "tts_rate_limit", "tts_max_concurrency"):
+            if getattr(args, option, None):
+                self.command += ["--" + option.replace("_", "-"), str(getattr(args, option))]
+        if stt:
+            self.command += ["--stt", "--stt-word-ms", str(args.word_ms),
+                             "--stt-endpointing-ms", str(args.endpointing_ms)]
+            if getattr(args, "stt_drop_after_s", None):
+                self.command += ["--stt-drop-after-s", str(args.stt_drop_after_s),
+                                 "--stt-drop-mode", args.stt_drop_mode]
+        self.process = None
+        self.gemini_url = None
+        self.tts_url = None
+        self.stt_url = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        ready = self.process.stdout.readline().split()
+        if not ready or ready[0] != "READY":
+            self.__exit__(None, None, None)
+            raise RuntimeError("fake services did not start")
+        ports = dict(field.split("=") for field in ready[1:])
+        self.gemini_url = f"http://127.0.0.1:{ports['gemini']}/"
+        self.tts_url = f"http://127.0.0.1:{ports['tts']}/"
+        if "stt" in ports:
+            self.stt_url = f"http://127.0.0.1:{ports['stt']}"
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.process.stdin.close() # fakes.py exits when its stdin closes
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+# --- Running the HTTP stand-ins (in their own process, so their CPU is not counted) ---
+def load_script_responses(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        script = json.load(f)
+    return {normalize_key(turn["user"]): turn["response"]
+            for turn in script.get("turns", []) if turn.get("response")}
+
+
+def load_script_lines(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [turn["user"] for turn in json.load(f).get("turns", [])]
+
+
+def serve(handler_class, port: int = 0, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=f"{handler_class.__name__}_Server",
+                     daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Gemini and Unreal Speech stand-ins.")
+    parser.add_argument("--gemini-port", type=int, default=0)
+    parser.add_argument("--tts-port", type=int, default=0)
+    parser.add_argument("--script", help="Conversation script whose responses Gemini should return")
+    parser.add_argument("--llm-ttft-ms", type=float, default=350)
+    parser.add_argument("--llm-jitter-ms", type=float, default=80)
+    parser.add_argument("--llm-chunk-ms", type=float, default=40)
+    parser.add_argument("--tts-ttfb-ms", type=float, default=200)
+    parser.add_argument("--tts-jitter-ms", type=float, default=60)
+    # Injected tail latency and errors, e.g. to exercise hedging and circuit breaking
+    parser.add_argument("--llm-stall-rate", type=float, default=0.0)
+    parser.add_argument("--llm-stall-ms", type=float, default=3000)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--tts-stall-rate", type=float, default=0.0)
+    parser.add_argument("--tts-stall-ms", type=float, default=3000)
+    parser.add_argument("--tts-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    # Provider quotas: requests over them are answered 429 (see call_scheduler.py)
+    parser.add_argument("--llm-rate-limit", type=float, default=None, help="Gemini requests per second")
+    parser.add_argument("--llm-max-concurrency", type=int, default=None, help="Gemini streams open at once")
+    parser.add_argument("--tts-rate-limit", type=float, default=None, help="Unreal Speech requests per second")
+    parser.add_argument("--tts-max-concurrency", type=int, default=None, help="Unreal Speech streams open at once")
+    # Deepgram live websocket, for agents in other processes (see load_test.py)
+    parser.add_argument("--stt", action="store_true")
+    parser.add_argument("--stt-port", type=int, default=0)
+    parser.add_argument("--stt-word-ms", type=float, default=180)
+    parser.add_argument("--stt-endpointing-ms", type=float, default=300)
+    parser.add_argument("--stt-drop-after-s", type=float, default=None,
+                        help="Fail every Deepgram connection this long after it opens")
+    parser.add_argument("--stt-drop-mode", choices=("close", "stall"), default="close")
+    args = parser.parse_args()
+
+    if args.script:
+        FakeGeminiHandler.responses = load_script_responses(args.script)
+    FakeGeminiHandler.ttft = LatencyModel(args.llm_ttft_ms, args.llm_jitter_ms, args.seed,
+                                          args.llm_stall_rate, args.llm_stall_ms)
+    FakeGeminiHandler.inter_chunk = LatencyModel(args.llm_chunk_ms, args.llm_chunk_ms / 3, args.seed)
+    FakeGeminiHandler.failures = FailureModel(args.llm_error_rate, args.seed)
+    FakeUnrealSpeechHandler.ttfb = LatencyModel(args.tts_ttfb_ms, args.tts_jitter_ms, args.seed,
+                                                args.tts_stall_rate, args.tts_stall_ms)
+    FakeUnrealSpeechHandler.failures = FailureModel(args.tts_error_rate, args.seed)
+    FakeGeminiHandler.quota = QuotaModel(args.llm_rate_limit, max_concurrency=args.llm_max_concurrency)
+    FakeUnrealSpeechHandler.quota = QuotaModel(args.tts_rate_limit, max_concurrency=args.tts_max_concurrency)
+
+    gemini = serve(FakeGeminiHandler, args.gemini_port)
+    tts = serve(FakeUnrealSpeechHandler, args.tts_port)
+    ready = f"READY gemini={gemini.server_address[1]} tts={tts.server_address[1]}"
+    if args.stt:
+        stt = FakeDeepgramLiveServer(load_script_lines(args.script) if args.script else [],
+                                     args.stt_word_ms, args.stt_endpointing_ms,
+                                     drop_after_s=args.stt_drop_after_s, drop_mode=args.stt_drop_mode)
+        ready += f" stt={stt.start(args.stt_port)}"
+    # The benchmark harness waits for this line to learn the ports
+    print(ready, flush=True)
+    try:
+        sys.stdin.read() # Runs until the parent closes our stdin (or Ctrl+C)
+    except KeyboardInterrupt:
+        pass
+    gemini.shutdown()
+    tts.shutdown()
+    rejected = FakeGeminiHandler.quota.rejected + FakeUnrealSpeechHandler.quota.rejected
+    if rejected:
+        print(f"[Fakes] Quotas rejected {FakeGeminiHandler.quota.rejected} Gemini and "
+              f"{FakeUnrealSpeechHandler.quota.rejected} Unreal Speech request(s) with 429", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
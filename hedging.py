@@ -0,0 +1,341 @@
+import asyncio
+import collections
+import inspect
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from call_scheduler import CallCancelled, CallScheduler
+
+# --- Rolling latency/error record of one backend, with a circuit breaker ---
+class ProviderHealth:
+    """
+    Tracks the last `window` calls to a backend. The breaker opens when, over at least
+    `min_samples` of them, the error rate reaches `error_threshold` or the p95 latency
+    exceeds `slow_ms`. An open backend is skipped; after `cooldown` seconds a single
+    probe call is let through (half-open) and its outcome closes or re-opens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, window: int = 50, min_samples: int = 5, error_threshold: float = 0.5,
+                 slow_ms: float = None, cooldown: float = 30.0):
+        self.min_samples = min_samples
+        self.error_threshold = error_threshold
+        self.slow_ms = slow_ms
+        self.cooldown = cooldown
+        self._samples = collections.deque(maxlen=window) # latency in ms, or None for a failure
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_started = None # When the half-open probe was let through
+        self.successes = 0
+        self.failures = 0
+        self.trips = 0
+
+    def percentile_ms(self, q: float = 0.95):
+        """Latency percentile of recent successful calls, or None without enough of them."""
+        with self._lock:
+            latencies = sorted(ms for ms in self._samples if ms is not None)
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+
+    def allow(self) -> bool:
+        """True if a call may be sent now (closed, or the half-open probe)."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self._opened_at >= self.cooldown:
+                self.state, self._probe_started = self.HALF_OPEN, None
+            if self.state == self.HALF_OPEN:
+                # One probe at a time; a probe that was never sent (or never answered) expires
+                if self._probe_started is None or now - self._probe_started >= self.cooldown:
+                    self._probe_started = now
+                    return True
+                return False
+            return self.state == self.CLOSED
+
+    def record_success(self, latency_ms: float):
+        with self._lock:
+            self.successes += 1
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED # Recovered; judge it on fresh calls only
+                self._samples.clear()
+            self._samples.append(latency_ms)
+            self._check()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self._trip()
+                return
+            self._samples.append(None)
+            self._check()
+
+    def _check(self):
+        if self.state != self.CLOSED or len(self._samples) < self.min_samples:
+            return
+        errors = sum(1 for ms in self._samples if ms is None)
+        if errors / len(self._samples) >= self.error_threshold:
+            self._trip()
+            return
+        if self.slow_ms is not None:
+            latencies = sorted(ms for ms in self._samples if ms is not None)
+            if len(latencies) >= self.min_samples and \
+                    latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] > self.slow_ms:
+                self._trip()
+
+    def _trip(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_started = None
+        self.trips += 1
+
+
+class Provider:
+    """
+    One interchangeable backend: `target` is whatever the call needs (an HTTP client,
+    an SDK client), `options` any per-backend settings (model name, ...). Provider
+    objects can be shared between sessions so their health is learned once, and so
+    their `scheduler` (unlimited unless given) paces all of their callers together.
+    """
+    def __init__(self, name: str, target, health: ProviderHealth = None, scheduler: CallScheduler = None,
+                 **options):
+        self.name = name
+        self.target = target
+        self.health = health if health is not None else ProviderHealth()
+        self.scheduler = scheduler if scheduler is not None else CallScheduler(name)
+        self.options = options
+
+    def summary(self) -> str:
+        p95 = self.health.percentile_ms()
+        p95_text = f"{p95:.0f}ms" if p95 is not None else "n/a"
+        text = (f"{self.name}: {self.health.state}, {self.health.successes} ok, "
+                f"{self.health.failures} failed, p95 {p95_text}, {self.health.trips} trip(s)")
+        if self.scheduler.limited:
+            text += f", {self.scheduler.summary()}"
+        return text
+
+
+# --- When to send the hedged duplicate ---
+class HedgePolicy:
+    """
+    A call that has not succeeded after the provider's p95 latency is probably in the
+    tail, so a second request is sent then (`initial_ms` until enough calls have been
+    seen), clamped to [`min_ms`, `max_ms`]. Hedging at p95 costs ~5% extra requests.
+    """
+    def __init__(self, percentile: float = 0.95, initial_ms: float = 1000, min_ms: float = 100,
+                 max_ms: float = 3000, enabled: bool = True):
+        self.percentile = percentile
+        self.initial_ms = initial_ms
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.enabled = enabled
+
+    def delay_s(self, health: ProviderHealth):
+        """Seconds to wait before hedging, or None if hedging is disabled."""
+        if not self.enabled:
+            return None
+        p = health.percentile_ms(self.percentile)
+        delay_ms = self.initial_ms if p is None else p
+        return min(self.max_ms, max(self.min_ms, delay_ms)) / 1000
+
+
+class HedgeStats:
+    def __init__(self):
+        self.calls = 0
+        self.hedges = 0 # Second requests sent because the first was slow
+        self.hedge_wins = 0 # ... that answered first
+        self.failovers = 0 # Second requests sent because the first failed
+        self.losers_discarded = 0
+
+    def summary(self) -> str:
+        return (f"{self.calls} call(s), {self.hedges} hedged ({self.hedge_wins} won), "
+                f"{self.failovers} failover(s), {self.losers_discarded} slower result(s) discarded")
+
+
+class _RouterBase:
+    def __init__(self, providers: list, call, policy: HedgePolicy = None, discard=None,
+                 max_attempts: int = 2, queue_wait_ms=None):
+        self.providers = providers
+        self._call = call
+        self.policy = policy if policy is not None else HedgePolicy()
+        self._discard = discard
+        self.max_attempts = max_attempts
+        self._queue_wait_ms = queue_wait_ms
+        self.stats = HedgeStats()
+
+    def _record_success(self, provider: Provider, start: float, result):
+        # Time spent queued for the provider's quota says nothing about the provider itself
+        latency_ms = (time.perf_counter() - start) * 1000
+        if self._queue_wait_ms is not None:
+            latency_ms = max(0.0, latency_ms - self._queue_wait_ms(result))
+        provider.health.record_success(latency_ms)
+
+    def _plan(self) -> list:
+        """Providers for successive attempts: healthy ones in preference order, the first if none is."""
+        healthy = [provider for provider in self.providers if provider.health.allow()]
+        plan = healthy or self.providers[:1]
+        return [plan[min(i, len(plan) - 1)] for i in range(self.max_attempts)]
+
+    def summary(self) -> str:
+        return self.stats.summary() + "; " + "; ".join(p.summary() for p in self.providers)
+
+
+# --- Hedged calls from worker threads ---
+class HedgedRouter(_RouterBase):
+    """
+    call(*args) runs `call_fn(provider, *args)` on the preferred healthy provider. If
+    it has not returned within the hedge delay, a second attempt starts (on the next
+    healthy provider, or a duplicate on the same one) and whichever succeeds first is
+    returned; a failure before then fails over at once. The slower attempt's result
+    is handed to `discard` (e.g. to close its HTTP response) whenever it arrives, and
+    every outcome feeds the providers' health. If `call_fn` first waits in the
+    provider's CallScheduler, `queue_wait_ms(result)` returns that wait, which is left
+    out of the latency recorded (and so out of the hedge delay and the breaker).
+    """
+    def __init__(self, providers: list, call_fn, policy: HedgePolicy = None, discard=None,
+                 max_attempts: int = 2, executor: ThreadPoolExecutor = None, queue_wait_ms=None):
+        super().__init__(providers, call_fn, policy, discard, max_attempts, queue_wait_ms)
+        self._owns_executor = executor is None
+        self._executor = executor if executor is not None else ThreadPoolExecutor(
+            max_workers=4 * max_attempts, thread_name_prefix="Hedge")
+
+    def _timed(self, provider: Provider, args):
+        start = time.perf_counter()
+        try:
+            result = self._call(provider, *args)
+        except CallCancelled:
+            raise # Given up on while queued for the provider's quota; never sent
+        except Exception:
+            provider.health.record_failure()
+            raise
+        self._record_success(provider, start, result)
+        return result
+
+    def call(self, *args):
+        """Returns (provider, result) of the first successful attempt; raises the last error."""
+        self.stats.calls += 1
+        plan = self._plan()
+        attempts = {} # future -> attempt index
+        errors = []
+
+        def launch():
+            index = len(attempts)
+            attempts[self._executor.submit(self._timed, plan[index], args)] = index
+
+        launch()
+        hedge_at = self.policy.delay_s(plan[0].health)
+        hedge_at = None if hedge_at is None else time.monotonic() + hedge_at
+        pending = set(attempts)
+        while pending:
+            can_add = len(attempts) < self.max_attempts
+            timeout = max(0.0, hedge_at - time.monotonic()) if can_add and hedge_at is not None else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done: # Slow: send the hedge
+                self.stats.hedges += 1
+                launch()
+                pending = {f for f in attempts if not f.done()}
+                hedge_at = None
+                continue
+            for future in done:
+                if future.exception() is None:
+                    if attempts[future] > 0 and hedge_at is None and not errors:
+                        self.stats.hedge_wins += 1
+                    for other in pending:
+                        other.add_done_callback(self._discard_late)
+                    return plan[attempts[future]], future.result()
+                errors.append(future.exception())
+            if len(attempts) < self.max_attempts: # Failed outright: fail over now
+                self.stats.failovers += 1
+                launch()
+                pending = {f for f in attempts if not f.done()}
+                hedge_at = None
+        raise errors[-1]
+
+    def _discard_late(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.stats.losers_discarded += 1
+        if self._discard is not None:
+            self._discard(future.result())
+
+    def shutdown(self):
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+
+# --- Hedged calls on an asyncio loop ---
+class AsyncHedgedRouter(_RouterBase):
+    """
+    Same policy as HedgedRouter for coroutine calls: `call_fn(provider, *args)` is a
+    coroutine function, and the slower attempt's task is cancelled outright (a result
+    that was already complete goes to `discard`, which may be a coroutine function).
+    Cancelling call() cancels every attempt. `queue_wait_ms` as for HedgedRouter.
+    """
+    async def _timed(self, provider: Provider, args):
+        start = time.perf_counter()
+        try:
+            result = await self._call(provider, *args)
+        except asyncio.CancelledError:
+            raise # Lost the race (or the turn was cancelled); says nothing about the provider
+        except Exception:
+            provider.health.record_failure()
+            raise
+        self._record_success(provider, start, result)
+        return result
+
+    async def call(self, *args):
+        """Returns (provider, result) of the first successful attempt; raises the last error."""
+        self.stats.calls += 1
+        plan = self._plan()
+        attempts = {} # task -> attempt index
+        errors = []
+
+        def launch():
+            index = len(attempts)
+            attempts[asyncio.ensure_future(self._timed(plan[index], args))] = index
+
+        launch()
+        hedge_at = self.policy.delay_s(plan[0].health)
+        loop = asyncio.get_running_loop()
+        hedge_at = None if hedge_at is None else loop.time() + hedge_at
+        pending = set(attempts)
+        try:
+            while pending:
+                can_add = len(attempts) < self.max_attempts
+                timeout = max(0.0, hedge_at - loop.time()) if can_add and hedge_at is not None else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.stats.hedges += 1
+                    launch()
+                    pending = {t for t in attempts if not t.done()}
+                    hedge_at = None
+                    continue
+                winner = next((t for t in done if not t.cancelled() and t.exception() is None), None)
+                for task in done:
+                    if task is not winner and not task.cancelled() and task.exception() is None:
+                        await self._discard_result(task.result()) # Both finished at once
+                if winner is not None:
+                    if attempts[winner] > 0 and hedge_at is None and not errors:
+                        self.stats.hedge_wins += 1
+                    return plan[attempts[winner]], winner.result()
+                errors.extend(t.exception() for t in done if not t.cancelled())
+                if len(attempts) < self.max_attempts:
+                    self.stats.failovers += 1
+                    launch()
+                    pending = {t for t in attempts if not t.done()}
+                    hedge_at = None
+            raise errors[-1]
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel() # The slower request: its coroutine closes what it opened
+                    self.stats.losers_discarded += 1
+
+    async def _discard_result(self, result):
+        self.stats.losers_discarded += 1
+        if self._discard is not None:
+            outcome = self._discard(result)
+            if inspect.isawaitable(outcome):
+                await outcome
@@ -0,0 +1,110 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- Shared keep-alive HTTP connections for a single API host ---
+class PooledHTTPClient:
+    """
+    Wraps a requests.Session whose connection pool is opened ahead of time and
+    kept warm, so requests skip DNS, TCP and TLS setup.
+
+    Args:
+        base_url (str): Scheme and host of the API (used for warm-up pings).
+        pool_size (int): Number of keep-alive connections to hold open.
+        keepalive_interval (float): Seconds of idleness after which the pool is pinged again.
+    """
+    def __init__(self, base_url: str, pool_size: int = 4, keepalive_interval: float = 20.0):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.keepalive_interval = keepalive_interval
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+        self.session.mount(base_url, adapter)
+
+        self._last_used = 0.0
+        self._stop_event = threading.Event()
+        self._keepalive_thread = None
+
+    @staticmethod
+    def _mark_connection(response) -> bool:
+        """
+        Returns True if the response came over a connection that had already been used
+        (a warm connection), and marks that connection as used for next time.
+        """
+        connection = getattr(response.raw, "_connection", None)
+        if connection is None:
+            return False
+        reused = getattr(connection, "_pool_warm", False)
+        connection._pool_warm = True
+        return reused
+
+    def _ping(self):
+        try:
+            with self.session.head(self.base_url, timeout=5) as r:
+                self._mark_connection(r)
+        except requests.exceptions.RequestException as e:
+            print(f"[HTTP] Warm-up ping to {self.base_url} failed: {e}")
+
+    def warm(self):
+        """Opens `pool_size` connections in parallel so the first real requests find them ready."""
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            for _ in range(self.pool_size):
+                executor.submit(self._ping)
+        self._last_used = time.monotonic()
+        print(f"[HTTP] Warmed {self.pool_size} connection(s) to {self.base_url} "
+              f"in {int((time.time() - start_time) * 1000)}ms")
+
+    def start_keepalive(self):
+        """Starts a background thread that pings the host whenever the pool sits idle."""
+        if self._keepalive_thread is not None:
+            return
+        self._keepalive_thread = threading.Thread(target=self._keepalive_loop,
+                                                  name="HTTP_Keepalive_Thread", daemon=True)
+        self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while not self._stop_event.wait(self.keepalive_interval / 2):
+            if time.monotonic() - self._last_used >= self.keepalive_interval:
+                self.warm()
+
+    def post_stream(self, url: str, **kwargs):
+        """
+        POSTs with a streamed response body over the pool.
+
+        Returns:
+            tuple: (requests.Response, bool) where the bool is True if a warm connection was used.
+        """
+        self._last_used = time.monotonic()
+        response = self.session.post(url, stream=True, **kwargs)
+        return response, self._mark_connection(response)
+
+    def close(self):
+        self._stop_event.set()
+        self.session.close()
+
+
+# --- Time-to-first-byte bookkeeping, split by connection state ---
+class TTFBStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {"cold": [], "warm": []}
+
+    def record(self, ttfb_ms: int, warm: bool):
+        with self._lock:
+            self.samples["warm" if warm else "cold"].append(ttfb_ms)
+
+    def summary(self) -> str:
+        with self._lock:
+            parts = []
+            for kind, values in self.samples.items():
+                if values:
+                    parts.append(f"{kind}: n={len(values)} avg={sum(values) // len(values)}ms "
+                                 f"min={min(values)}ms max={max(values)}ms")
+                else:
+                    parts.append(f"{kind}: n=0")
+            return ", ".join(parts)
@@ -1,86 +1,351 @@
 import asyncio
 import os
-import queue
 import threading
-import google.generativeai as genai 
+import time
 from google import genai
 from google.genai import types
 
+from call_scheduler import INTERACTIVE, SPECULATIVE, CallScheduler, limit_from_env, retry_after_s
+from conversation_context import ConversationContext
+from event_runtime import HandoffQueue, QueueClosed
+from hedging import AsyncHedgedRouter, HedgePolicy, Provider, ProviderHealth
+from metrics import console
+from response_cache import ResponseCache
+from speculation import SpeculationStats, SpeculativeRun
+from turn_control import TurnController, TurnToken
+
 class LLMProcessor:
-    def __init__(self, stt_to_llm_queue: queue.Queue,
-                 llm_to_tts_queue: queue.Queue,
-                 exit_event: threading.Event):
+    MODEL = "gemini-2.0-flash"
+    ERROR_MESSAGE = "I'm sorry, I encountered an error when thinking. Please try again."
+    MAX_HISTORY_TOKENS = 2000 # Prompt budget for past turns; keeps TTFT flat on long calls
+    FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-2.0-flash-lite") # Empty disables failover
+    HEDGING_ENABLED = os.getenv("VOICE_HEDGING", "1") == "1" # Second request if the first chunk is past p95
+    LLM_SLOW_MS = 4000 # A model whose p95 time to first chunk exceeds this is skipped for a while
+    GEMINI_RATE_PER_S = limit_from_env("GEMINI_RATE_PER_S", "25") # Request quota per model; 0 = unlimited
+    GEMINI_MAX_IN_FLIGHT = limit_from_env("GEMINI_MAX_IN_FLIGHT", "16") # Open streams per model
+
+    def __init__(self, stt_to_llm_queue: HandoffQueue,
+                 llm_to_tts_queue: HandoffQueue,
+                 exit_event: threading.Event,
+                 turn_controller: TurnController = None,
+                 client: genai.Client = None,
+                 response_cache: ResponseCache = None,
+                 llm_providers: list = None,
+                 recorder=None):
         
         self.stt_to_llm_queue = stt_to_llm_queue
         self.llm_to_tts_queue = llm_to_tts_queue
         self.exit_event = exit_event
+        # Shared with TTS so a barge-in stops generation, synthesis and playback together
+        self.turn_controller = turn_controller if turn_controller is not None else TurnController()
 
+        # Markup, emojis, numbers, currency and abbreviations are rewritten for speech by
+        # TTSPlayer's StreamingNormalizer, so the prompt only has to ask for spoken style.
         self.system_instructions = (
-            "You are a helpful and articulate AI assistant designed for real-time voice conversations. "
-            "Your responses must be highly suitable for Text-to-Speech (TTS) conversion. "
-            "Make sure to keep your senteces of length about 12-15 words and end them with a fullstop"
-            "Therefore, use only plain, natural language. "
-            "Avoid all Markdown formatting (e.g., bold, italics, code blocks, bullet points, numbered lists). "
-            "Do not use emojis or other non-standard symbols. "
-            "Spell out numbers, abbreviations, and acronyms clearly if they might be ambiguous when spoken "
-            "(e.g., 'NASA' should be 'N.A.S.A.' or 'National Aeronautics and Space Administration' depending on context, "
-            "'$5' should be 'five dollars'). "
-            "Ensure your sentences are grammatically correct and use standard punctuation that aids natural cadence. "
-            "Keep your responses concise and to the point, while remaining informative."
+            "You are a helpful assistant in a real-time voice conversation. "
+            "Answer in short, plain spoken sentences, without lists or headings, concisely and to the point."
         )
 
-        self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-        self.chat = self.client.chats.create(model="gemini-2.0-flash", 
-                                             config=types.GenerateContentConfig(system_instruction=self.system_instructions)
-                                            )             
+        # A session server passes one client shared by every conversation
+        self.client = client if client is not None else genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        self.generation_config = types.GenerateContentConfig(system_instruction=self.system_instructions)
+        # Gemini models in preference order. A request whose first chunk is later than the model's
+        # p95 is hedged on the next one (the slower stream is closed), errors fail over, and
+        # latency/error rates drive each model's circuit breaker. Sessions may share the providers,
+        # and with them each model's CallScheduler, which keeps requests within its quota and
+        # admits turns ahead of speculative generations.
+        self.llm_router = AsyncHedgedRouter(
+            llm_providers if llm_providers is not None else self.create_llm_providers(
+                self.client, self.turn_controller.metrics),
+            self._open_gemini_stream, policy=HedgePolicy(enabled=self.HEDGING_ENABLED),
+            discard=self._discard_stream, queue_wait_ms=lambda result: result[2].wait_ms)
+        # Conversation history, kept here rather than in a chat object so that
+        # speculative generations that get discarded never leave a trace in it.
+        # Bounded by a token budget; older turns are folded into a rolling summary.
+        self.context = ConversationContext(self.client, self.MODEL,
+                                           max_history_tokens=self.MAX_HISTORY_TOKENS,
+                                           scheduler=self.llm_router.providers[0].scheduler)
                                             
         # Keep track of the full response for potential logging or later use
         self.full_llm_response_text = ""
 
-    async def _get_gemini_response_async(self, prompt: str) -> str:
+        # Answers to repeated standalone questions skip Gemini (may be shared between sessions)
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+
+        # Optional SessionRecorder: prompts and Gemini chunks, for replay
+        self.recorder = recorder
+
+        # Speculative generation on stable interim transcripts (see STTListener.SPECULATION_STABLE_MS)
+        self.speculation = None # SpeculativeRun waiting for the final transcript
+        self.speculation_stats = SpeculationStats()
+
+    @classmethod
+    def create_llm_providers(cls, client, metrics=None) -> list:
+        """The Gemini models in preference order, each with its own quota (queue waits go to `metrics`)."""
+        models = [cls.MODEL]
+        if cls.FALLBACK_MODEL and cls.FALLBACK_MODEL != cls.MODEL:
+            models.append(cls.FALLBACK_MODEL)
+        return [Provider(model, client, ProviderHealth(slow_ms=cls.LLM_SLOW_MS),
+                         CallScheduler(model, cls.GEMINI_RATE_PER_S, max_in_flight=cls.GEMINI_MAX_IN_FLIGHT,
+                                       metrics=metrics),
+                         model=model) for model in models]
+
+    async def warm(self):
+        """
+        Opens the Gemini connection (TLS handshake included) with a metadata request per
+        model, so the first turn does not pay for it. Must run on the loop that will make
+        the requests, since the async client's connection pool is bound to it.
+        """
+        for provider in self.llm_router.providers:
+            try:
+                await provider.target.aio.models.get(model=provider.options["model"])
+            except Exception as e:
+                print(f"[LLM] Warm-up of {provider.name} failed: {e}")
+
+    async def _open_gemini_stream(self, provider: Provider, contents, priority: int = INTERACTIVE,
+                                  mark=None):
+        """
+        AsyncHedgedRouter call: once the model's scheduler admits the request at `priority`,
+        starts a stream on `provider` and waits for its first chunk. Returns (stream,
+        first_chunk, grant); the grant is released when the stream is closed. `mark` gets
+        the "llm_request_sent" timeline mark once the request is admitted.
+        """
+        grant = await provider.scheduler.acquire_async(priority)
+        if mark is not None:
+            mark("llm_request_sent")
+        stream = None
+        try:
+            stream = await provider.target.aio.models.generate_content_stream(
+                model=provider.options["model"], contents=contents, config=self.generation_config)
+            first_chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            first_chunk = None
+        except BaseException as e:
+            self._note_throttling(provider, e)
+            if stream is not None:
+                await self._close_stream(stream) # Failed, or lost the race to the hedged request
+            grant.release()
+            raise
+        return stream, first_chunk, grant
+
+    @staticmethod
+    def _note_throttling(provider: Provider, error: BaseException):
+        """A 429 (RESOURCE_EXHAUSTED) pauses the model's scheduler for the Retry-After."""
+        if getattr(error, "code", None) == 429:
+            response = getattr(error, "response", None)
+            provider.scheduler.throttled(retry_after_s(getattr(response, "headers", None)))
+
+    async def _discard_stream(self, result):
+        stream, _, grant = result
+        await self._close_stream(stream)
+        grant.release()
+
+    @staticmethod
+    async def _close_stream(stream):
+        # Closes the HTTP stream, so Gemini stops generating tokens we pay for
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception:
+                pass
+
+    @staticmethod
+    async def _chunks_from(first_chunk, stream):
+        if first_chunk is None:
+            return
+        yield first_chunk
+        async for chunk in stream:
+            yield chunk
+
+    def _record_exchange(self, user_text: str, model_text: str):
+        self.context.add_exchange(user_text, model_text)
+
+    async def _get_gemini_response_async(self, prompt: str, turn: TurnToken = None,
+                                         speculation: SpeculativeRun = None) -> str:
         """
         Sends the user's prompt to the Gemini LLM, sends chunks to TTS queue,
         and returns the full combined response text.
+        The stream is consumed asynchronously; when the TTS queue is full the producer
+        waits for room (and Gemini's stream is read more slowly) instead of dropping text.
+        Every item is tagged with `turn` so TTS can drop leftovers of a cancelled turn.
+        With `speculation`, items are held by the SpeculativeRun until it is committed.
         """
         self.full_llm_response_text = "" # Reset for new response
+        response_chunks = []
+        chunk_count = 0
+        overhead_s = 0.0 # Time spent handling chunks, excluding waits for TTS
+        backpressure_s = 0.0 # Time spent waiting for room on the TTS queue
+        response = None
+        grant = None
 
-        print(f"\n[LLM] Sending to Gemini: '{prompt}'")
+        emit = speculation.emit if speculation is not None else self.llm_to_tts_queue.put_async
+        if speculation is not None:
+            mark = speculation.mark
+        else:
+            mark = turn.timeline.mark if turn is not None else (lambda name: None)
+        label = " (speculative)" if speculation is not None else ""
+        print(f"\n[LLM] Sending to Gemini{label}: '{prompt}'")
         try:
             # Signal the start of a new LLM response (important for TTS consumer)
-            # Use asyncio.to_thread because queue.put_nowait() is blocking in an async context
-            await asyncio.to_thread(self.llm_to_tts_queue.put_nowait, {"type": "start_response"})
-
-            response = self.chat.send_message_stream(prompt)
-
-            for chunk in response:
-                if chunk.text:
-                    llm_chunk = chunk.text
-                    self.full_llm_response_text += llm_chunk
-                    print(f"[LLM] Gemini Chunk: {llm_chunk}", end="") # Print chunk as it arrives
-                    print()
-                    
-                    # Put each chunk onto the TTS queue
-                    # Using put_nowait to avoid blocking, the queue has a maxsize
-                    try:
-                        await asyncio.to_thread(self.llm_to_tts_queue.put_nowait, {"type": "chunk", "text": llm_chunk})
-                    except queue.Full:
-                        print("[LLM] TTS queue is full, dropping LLM chunk.")
+            await emit({"type": "start_response", "turn": turn})
+
+            contents, estimated_tokens = self.context.build_contents(prompt)
+            reported_tokens = None
+            request_time = time.perf_counter()
+            ttft_ms = None
+            turn_id = turn.turn_id if turn is not None else 0
+            if self.recorder is not None:
+                self.recorder.llm_request(turn_id, prompt, speculative=speculation is not None)
+            priority = SPECULATIVE if speculation is not None else INTERACTIVE
+            provider, (response, first_chunk, grant) = await self.llm_router.call(contents, priority, mark)
+            if provider is not self.llm_router.providers[0]:
+                print(f"[LLM] Answered by {provider.name} (hedge or failover)")
+
+            async for chunk in self._chunks_from(first_chunk, response):
+                received_time = time.perf_counter()
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage is not None and usage.prompt_token_count:
+                    reported_tokens = usage.prompt_token_count
+                llm_chunk = chunk.text
+                if llm_chunk:
+                    mark("first_llm_chunk")
+                    if ttft_ms is None:
+                        ttft_ms = (received_time - request_time) * 1000
+                    response_chunks.append(llm_chunk)
+                    if self.recorder is not None:
+                        self.recorder.llm_chunk(turn_id, llm_chunk)
+                    console.print(f"[LLM] Gemini Chunk: {llm_chunk}") # Printed off the event loop
+
+                    # Put each chunk onto the TTS queue, waiting for room if TTS is behind
+                    item = {"type": "chunk", "text": llm_chunk, "turn": turn}
+                    if speculation is not None:
+                        await speculation.emit(item)
+                    elif self.llm_to_tts_queue.full():
+                        wait_start = time.perf_counter()
+                        overhead_s += wait_start - received_time
+                        await self.llm_to_tts_queue.put_async(item)
+                        backpressure_s += time.perf_counter() - wait_start
+                    else:
+                        self.llm_to_tts_queue.put_nowait(item)
+                        overhead_s += time.perf_counter() - received_time
+                    chunk_count += 1
             
             # Signal the end of the LLM response
-            await asyncio.to_thread(self.llm_to_tts_queue.put_nowait, {"type": "end_response"})
+            await emit({"type": "end_response", "turn": turn})
+            self.full_llm_response_text = "".join(response_chunks)
             print("\n[LLM] End of Gemini Response.")
+            if speculation is None or speculation.turn is not None: # Discarded speculations don't count
+                self.context.record_turn(estimated_tokens, reported_tokens, ttft_ms)
+                print(f"[LLM] Prompt ~{estimated_tokens} tokens (reported: {reported_tokens}), TTFT {ttft_ms or 0:.0f}ms")
+            if chunk_count:
+                print(f"[LLM] {chunk_count} chunks, avg handling overhead "
+                      f"{overhead_s / chunk_count * 1e6:.1f}us/chunk, waited {int(backpressure_s * 1000)}ms for TTS")
             return self.full_llm_response_text # Return full text for logging/other purposes
             
+        except QueueClosed:
+            return "".join(response_chunks) # Shutting down
         except Exception as e:
             print(f"[LLM] Error calling Gemini API: {e}")
-            error_msg = "I'm sorry, I encountered an error when thinking. Please try again."
+            error_msg = self.ERROR_MESSAGE
             # Optionally put an error message chunk or end signal
             try:
-                await asyncio.to_thread(self.llm_to_tts_queue.put_nowait, {"type": "chunk", "text": error_msg})
-                await asyncio.to_thread(self.llm_to_tts_queue.put_nowait, {"type": "end_response"})
-            except queue.Full:
-                print("[LLM] TTS queue full, could not send error message.")
+                await emit({"type": "chunk", "text": error_msg, "turn": turn})
+                await emit({"type": "end_response", "turn": turn})
+            except QueueClosed:
+                print("[LLM] TTS queue closed, could not send error message.")
             return error_msg
+        finally:
+            if response is not None: # Also on cancellation (barge-in)
+                await self._close_stream(response)
+            if grant is not None:
+                grant.release()
+
+    def _start_speculation(self, text: str):
+        """Starts generating for a stable interim transcript without sending anything to TTS."""
+        if self.response_cache.peek(text):
+            return # The answer is already cached; nothing to get ahead on
+        if self.speculation is not None:
+            if self.speculation.matches(text):
+                return # Already generating for this text
+            self.speculation.cancel()
+            self.speculation_stats.record_miss()
+        run = SpeculativeRun(text, self.llm_to_tts_queue)
+        run.task = asyncio.create_task(self._get_gemini_response_async(text, speculation=run))
+        self.speculation = run
+        self.speculation_stats.started += 1
+
+    def _take_speculation(self, user_sentence: str) -> SpeculativeRun:
+        """Returns the pending speculation if it answers `user_sentence`; cancels it otherwise."""
+        run, self.speculation = self.speculation, None
+        if run is None:
+            return None
+        failed = run.task.done() and (run.task.cancelled() or run.task.result() == self.ERROR_MESSAGE)
+        if run.matches(user_sentence) and not failed:
+            saved_ms = (time.perf_counter() - run.started) * 1000
+            self.speculation_stats.record_hit(saved_ms)
+            print(f"[LLM] Speculation hit: generation started {saved_ms:.0f}ms before the final transcript.")
+            return run
+        run.cancel() # Cheap: closes the stream before more tokens are generated
+        self.speculation_stats.record_miss()
+        print(f"[LLM] Speculation miss: '{run.text}' != '{user_sentence}'")
+        return None
+
+    def _record_turn_start(self, turn: TurnToken, user_sentence: str, source: str):
+        if self.recorder is not None:
+            self.recorder.event("turn_start", turn=turn.turn_id, text=user_sentence, source=source)
+
+    async def _run_turn(self, user_sentence: str):
+        """
+        Generates the response for one turn as a task that a barge-in can abort.
+        _get_gemini_response_async sends chunks to llm_to_tts_queue directly;
+        a matching speculative run is adopted instead of starting a new request.
+        """
+        turn = self.turn_controller.begin_turn()
+        cached_response = self.response_cache.get(user_sentence)
+        if cached_response is not None:
+            self._record_turn_start(turn, user_sentence, "cache")
+            await self._play_cached_response(user_sentence, cached_response, turn)
+            return
+        loop = asyncio.get_running_loop()
+        # Read before the exchange below is added; speculation runs on the same history
+        history = self.context.caller_text()
+        run = self._take_speculation(user_sentence)
+        if run is not None:
+            self._record_turn_start(turn, user_sentence, "speculation")
+            task = run.task
+            await run.commit(turn)
+        else:
+            self._record_turn_start(turn, user_sentence, "gemini")
+            task = asyncio.create_task(self._get_gemini_response_async(user_sentence, turn))
+        # Cancellation may come from another thread (e.g. the interrupt listener)
+        turn.add_cancel_callback(lambda _turn: loop.call_soon_threadsafe(task.cancel))
+        await asyncio.wait({task})
+        if task.cancelled():
+            print(f"[LLM] Gemini request for turn {turn.turn_id} aborted.")
+        elif task.exception() is None and task.result() != self.ERROR_MESSAGE:
+            self._record_exchange(user_sentence, task.result())
+            marks = turn.timeline.marks
+            if "llm_request_sent" in marks and "first_llm_chunk" in marks:
+                ttft_ms = max(0.0, (marks["first_llm_chunk"] - marks["llm_request_sent"]) * 1000)
+                self.response_cache.put(user_sentence, task.result(), ttft_ms, history)
+
+    async def _play_cached_response(self, user_sentence: str, response_text: str, turn: TurnToken):
+        """Streams a cached answer straight to TTS, without calling Gemini."""
+        print(f"[LLM] Response cache hit for: '{user_sentence}'")
+        if self.speculation is not None:
+            self.speculation.cancel() # Any in-flight speculation is for this same utterance
+            self.speculation = None
+        turn.timeline.mark("llm_request_sent")
+        turn.timeline.mark("first_llm_chunk")
+        try:
+            for item in ({"type": "start_response", "turn": turn},
+                         {"type": "chunk", "text": response_text, "turn": turn},
+                         {"type": "end_response", "turn": turn}):
+                await self.llm_to_tts_queue.put_async(item)
+        except QueueClosed:
+            return
+        self._record_exchange(user_sentence, response_text)
 
     async def process_llm_requests(self):
         """
@@ -91,23 +356,30 @@ class LLMProcessor:
         print("[LLM] Processor ready.")
         while not self.exit_event.is_set():
             try:
-                # Use get() with a timeout to allow loop to check exit_event periodically
-                # Wrap in asyncio.to_thread as queue.get is blocking and this is an async method
-                user_sentence = await asyncio.to_thread(self.stt_to_llm_queue.get, timeout=0.1)
+                # Resumes as soon as STT hands over a sentence; close() on shutdown ends the loop
+                user_sentence = await self.stt_to_llm_queue.get_async()
+
+                if isinstance(user_sentence, dict) and user_sentence.get("type") == "speculate":
+                    self._start_speculation(user_sentence["text"])
                 
-                if user_sentence:
+                elif user_sentence:
                     print(f"[LLM] Processing user input: '{user_sentence}'")
-                    # _get_gemini_response_async now directly sends chunks to llm_to_tts_queue
-                    # It still returns the full text which you can use for logging or other purposes
-                    await self._get_gemini_response_async(user_sentence)
+                    await self._run_turn(user_sentence)
                 
                 # Mark task as done for the queue
-                await asyncio.to_thread(self.stt_to_llm_queue.task_done)
+                self.stt_to_llm_queue.task_done()
 
-            except queue.Empty:
-                # If queue is empty, yield control to the asyncio event loop
-                await asyncio.sleep(0.05) 
+            except QueueClosed:
+                break
             except Exception as e:
                 print(f"[LLM] Unexpected error in LLM processing loop: {e}")
                 await asyncio.sleep(0.1) # Prevent tight looping on continuous errors
+
+        if self.speculation is not None:
+            self.speculation.cancel()
+        self.context.close()
+        print(f"[LLM] Speculation: {self.speculation_stats.summary()}")
+        print(f"[LLM] Context: {self.context.summary_text()}")
+        print(f"[LLM] Response cache: {self.response_cache.summary()}")
+        print(f"[LLM] Hedging: {self.llm_router.summary()}")
         print("[LLM] Processor finished.")
\ No newline at end of file
@@ -0,0 +1,249 @@
+import argparse
+import array
+import asyncio
+import json
+import math
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+
+from fakes import FakeServices
+from metrics import distribution
+from session_protocol import KIND_AUDIO, KIND_END, KIND_EVENT, encode_frame, read_frame
+
+FRAME_SAMPLES = 320 # 20 ms at 16 kHz, like the Microphone
+FRAME_S = FRAME_SAMPLES / 16000
+
+
+def voiced_frames(duration_ms: float, seed: int = 0) -> list:
+    """Vowel-like audio (harmonics of a wobbling pitch, syllable-rate envelope) that passes local VAD."""
+    rng = random.Random(seed)
+    pitch = rng.uniform(110, 220)
+    samples = array.array("h")
+    for n in range(int(duration_ms * 16)):
+        t = n / 16000
+        envelope = 0.55 + 0.45 * math.sin(2 * math.pi * 4 * t)
+        f0 = pitch * (1 + 0.05 * math.sin(2 * math.pi * 3 * t))
+        value = sum(math.sin(2 * math.pi * f0 * h * t) / h for h in range(1, 12))
+        samples.append(int(4000 * envelope * value))
+    data = samples.tobytes()
+    return [data[i:i + FRAME_SAMPLES * 2] for i in range(0, len(data), FRAME_SAMPLES * 2)]
+
+
+def quiet_frame(seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    return array.array("h", (rng.randint(-30, 30) for _ in range(FRAME_SAMPLES))).tobytes()
+
+
+# --- One simulated caller ---
+class SimulatedCaller:
+    """
+    Streams microphone audio to the server in real time, like a phone: `turns` times
+    speech for `speech_ms`, then room noise until the bot has answered and gone quiet,
+    then a pause. Measures the time from the end of each utterance to the bot's first
+    audio (this includes end-of-turn detection).
+    """
+    QUIET_AFTER_BOT_S = 0.6 # Bot audio silent this long means its answer is over
+
+    def __init__(self, caller_id: int, host: str, port: int, turns: int, speech_ms: float,
+                 pause_ms: float, response_timeout_s: float = 20.0):
+        self.caller_id = caller_id
+        self.host = host
+        self.port = port
+        self.turns = turns
+        self.speech = voiced_frames(speech_ms, seed=caller_id)
+        self.quiet = quiet_frame(seed=caller_id)
+        self.pause_s = pause_ms / 1000
+        self.response_timeout_s = response_timeout_s
+        self.latencies_ms = []
+        self.timeouts = 0
+        self.busy = False
+        self.error = None
+        self.audio_bytes = 0
+        self._last_audio = None
+        self._first_audio = None
+
+    async def _receive(self, reader):
+        while True:
+            kind, payload = await read_frame(reader)
+            if kind is None:
+                return
+            if kind == KIND_AUDIO:
+                now = time.monotonic()
+                self.audio_bytes += len(payload)
+                self._last_audio = now
+                if self._first_audio is None:
+                    self._first_audio = now
+            elif kind == KIND_EVENT and json.loads(payload).get("event") == "busy":
+                self.busy = True
+                return
+
+    async def _stream(self, writer, frames, until=None, timeout_s: float = None):
+        """Sends frames paced at real time (repeating the last one) until `until()` or the timeout."""
+        loop = asyncio.get_running_loop()
+        start = next_due = loop.time()
+        index = 0
+        while True:
+            if until is not None and until():
+                return True
+            if index >= len(frames) and until is None:
+                return True
+            if timeout_s is not None and loop.time() - start > timeout_s:
+                return False
+            writer.write(encode_frame(KIND_AUDIO, frames[min(index, len(frames) - 1)]))
+            await writer.drain()
+            index += 1
+            next_due += FRAME_S
+            await asyncio.sleep(max(0.0, next_due - loop.time()))
+
+    async def run(self):
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except OSError as e:
+            self.error = str(e)
+            return
+        receiver = asyncio.create_task(self._receive(reader))
+        try:
+            for _ in range(self.turns):
+                if receiver.done():
+                    break
+                await self._stream(writer, self.speech)
+                speech_end, self._first_audio = time.monotonic(), None
+                answered = await self._stream(writer, [self.quiet], until=lambda: self._first_audio is not None
+                                              or receiver.done(), timeout_s=self.response_timeout_s)
+                if not answered or self._first_audio is None:
+                    self.timeouts += 1
+                    continue
+                self.latencies_ms.append((self._first_audio - speech_end) * 1000)
+                await self._stream(writer, [self.quiet], timeout_s=self.response_timeout_s,
+                                   until=lambda: time.monotonic() - self._last_audio > self.QUIET_AFTER_BOT_S)
+                await self._stream(writer, [self.quiet], timeout_s=self.pause_s, until=lambda: False)
+            writer.write(encode_frame(KIND_END, b""))
+            await writer.drain()
+        except ConnectionError as e:
+            self.error = str(e)
+        finally:
+            receiver.cancel()
+            writer.close()
+
+
+async def run_callers(args) -> list:
+    callers = [SimulatedCaller(i + 1, args.host, args.port, args.turns, args.speech_ms, args.pause_ms)
+               for i in range(args.callers)]
+    tasks = []
+    for caller in callers:
+        tasks.append(asyncio.create_task(caller.run()))
+        await asyncio.sleep(args.ramp_s / max(1, args.callers))
+    await asyncio.gather(*tasks)
+    return callers
+
+
+def summarize(callers: list, wall_s: float) -> dict:
+    served = [caller for caller in callers if not caller.busy and caller.error is None]
+    return {"callers": len(callers), "served": len(served),
+            "busy": sum(caller.busy for caller in callers),
+            "errors": sum(caller.error is not None for caller in callers),
+            "turns": sum(len(caller.latencies_ms) for caller in callers),
+            "timeouts": sum(caller.timeouts for caller in callers),
+            "response_latency_ms": distribution(ms for caller in callers for ms in caller.latencies_ms),
+            "wall_s": round(wall_s, 1)}
+
+
+async def _wait_for_port(host: str, port: int, process, timeout_s: float = 60.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"supervisor exited with code {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("supervisor did not start listening")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the session supervisor (or a running server) "
+                                                 "with simulated callers against local Deepgram, Gemini "
+                                                 "and Unreal Speech stand-ins.")
+    parser.add_argument("--target", help="host:port of a running server; otherwise a supervisor is started")
+    parser.add_argument("--port", type=int, default=8775, help="Port for the supervisor this starts")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-sessions-per-worker", type=int, default=8)
+    parser.add_argument("--callers", type=int, default=16)
+    parser.add_argument("--ramp-s", type=float, default=5.0, help="Callers join evenly over this long")
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--speech-ms", type=float, default=1500)
+    parser.add_argument("--pause-ms", type=float, default=800)
+    parser.add_argument("--output", help="Write the summary as JSON")
+    # Stand-ins (same meaning as in benchmark_harness.py)
+    parser.add_argument("--script", default=os.path.join("benchmark_scripts", "conversation.json"))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--llm-ttft-ms", type=float, default=350)
+    parser.add_argument("--llm-jitter-ms", type=float, default=80)
+    parser.add_argument("--llm-chunk-ms", type=float, default=40)
+    parser.add_argument("--tts-ttfb-ms", type=float, default=200)
+    parser.add_argument("--tts-jitter-ms", type=float, default=60)
+    parser.add_argument("--llm-stall-rate", type=float, default=0.0)
+    parser.add_argument("--llm-stall-ms", type=float, default=3000)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--tts-stall-rate", type=float, default=0.0)
+    parser.add_argument("--tts-stall-ms", type=float, default=3000)
+    parser.add_argument("--tts-error-rate", type=float, default=0.0)
+    parser.add_argument("--word-ms", type=float, default=180, help="Fake Deepgram: speech per transcribed word")
+    parser.add_argument("--endpointing-ms", type=float, default=300, help="Fake Deepgram: silence before speech_final")
+    parser.add_argument("--stt-drop-after-s", type=float, default=None,
+                        help="Fake Deepgram: fail every connection this long after it opens (exercises reconnects)")
+    parser.add_argument("--stt-drop-mode", choices=("close", "stall"), default="close")
+    # Stand-in quotas (429 over them); the agent paces itself with GEMINI_RATE_PER_S etc. from the environment
+    parser.add_argument("--llm-rate-limit", type=float, default=None, help="Fake Gemini: requests per second")
+    parser.add_argument("--llm-max-concurrency", type=int, default=None, help="Fake Gemini: open streams")
+    parser.add_argument("--tts-rate-limit", type=float, default=None, help="Fake Unreal Speech: requests per second")
+    parser.add_argument("--tts-max-concurrency", type=int, default=None, help="Fake Unreal Speech: open streams")
+    args = parser.parse_args()
+
+    if args.target:
+        args.host, port = args.target.rsplit(":", 1)
+        args.port = int(port)
+        start = time.monotonic()
+        callers = asyncio.run(run_callers(args))
+        summary = summarize(callers, time.monotonic() - start)
+    else:
+        args.host = "127.0.0.1"
+        with FakeServices(args.script, args, stt=True) as services:
+            env = dict(os.environ, DEEPGRAM_URL=services.stt_url, DEEPGRAM_API_KEY="loadtest",
+                       GEMINI_BASE_URL=services.gemini_url, GEMINI_API_KEY="loadtest",
+                       UNREAL_SPEECH_BASE_URL=services.tts_url, UNREAL_SPEECH_API_KEY="loadtest")
+            env.pop("UNREAL_SPEECH_FALLBACK_URL", None)
+            command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_supervisor.py"),
+                       "--port", str(args.port), "--max-sessions-per-worker", str(args.max_sessions_per_worker),
+                       "--report-interval", "10", "--drain-timeout", "10"]
+            if args.workers:
+                command += ["--workers", str(args.workers)]
+            supervisor = subprocess.Popen(command, env=env)
+            try:
+                asyncio.run(_wait_for_port(args.host, args.port, supervisor))
+                start = time.monotonic()
+                callers = asyncio.run(run_callers(args))
+                summary = summarize(callers, time.monotonic() - start)
+            finally:
+                supervisor.send_signal(signal.SIGINT) # Drains the workers and prints the aggregated report
+                try:
+                    supervisor.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    supervisor.kill()
+
+    print(f"\n[LoadTest] {summary['served']}/{summary['callers']} caller(s) served, {summary['busy']} busy, "
+          f"{summary['errors']} error(s); {summary['turns']} turn(s), {summary['timeouts']} without an answer")
+    print(f"[LoadTest] End of speech -> first bot audio (ms): {summary['response_latency_ms']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "summary": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,85 +1,207 @@
+import time
+_PROCESS_START = time.perf_counter() # Origin of the startup report, taken before any heavy import
+
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+import importlib
 import os
 import threading
-import queue # For thread-safe queues
+from typing import TYPE_CHECKING
+
+# Light modules only: the SDK-backed components (Deepgram, Gemini, audio, NumPy) are
+# imported on startup worker threads so their import time overlaps
+from event_runtime import AwaitableEvent, HandoffQueue
+from metrics import MetricsRecorder, StartupTimer
+from session_recorder import SessionRecorder
+from turn_control import TurnController
+
+if TYPE_CHECKING:
+    from llm_component import LLMProcessor
+    from stt_component import STTListener
+    from tts_component import TTSPlayer
+
+async def warm_up(stt_listener: "STTListener", llm_processor: "LLMProcessor", tts_player: "TTSPlayer",
+                  startup: StartupTimer):
+    """
+    Opens every network connection before the agent is announced: the Deepgram socket,
+    the Gemini connection and the TTS pool (plus the audio device) all at once. A failed
+    warm-up is only reported; the stage retries on first use.
+    """
+    results = await asyncio.gather(
+        startup.measure("connect stt", stt_listener.connect()),
+        startup.measure("warm llm", llm_processor.warm()),
+        startup.measure("warm tts + audio", asyncio.to_thread(tts_player.prepare)),
+        return_exceptions=True)
+    for name, result in zip(("STT", "LLM", "TTS"), results):
+        if isinstance(result, BaseException):
+            print(f"[Startup] {name} warm-up failed: {result}")
+
+async def run_voice_pipeline(stt_listener: "STTListener", llm_processor: "LLMProcessor", tts_player: "TTSPlayer",
+                             startup: StartupTimer = None, ready_event: threading.Event = None):
+    """
+    Single scheduler for the whole agent: STT and LLM run as tasks on one event loop and
+    wake only when data arrives on their queues. The TTS player does blocking audio I/O,
+    so it runs in a worker thread owned by the same loop.
+    """
+    if startup is not None:
+        await warm_up(stt_listener, llm_processor, tts_player, startup)
+        startup.ready()
+    if ready_event is not None:
+        ready_event.set()
+    await asyncio.gather(
+        stt_listener.listen_and_transcribe(),
+        llm_processor.process_llm_requests(),
+        asyncio.to_thread(tts_player.play_tts),
+    )
 
-# Import your custom components
-from stt_component import STTListener
-from llm_component import LLMProcessor
-from tts_component import TTSPlayer
+def _import_timed(name: str, startup: StartupTimer):
+    with startup.phase(f"import {name}"):
+        return importlib.import_module(name)
 
 def main_orchestrator():
     print("--- Initializing Voice Agent ---")
 
+    startup = StartupTimer(origin=_PROCESS_START)
+
     # Load environment variables (API keys)
-    load_dotenv()
+    with startup.phase("load env"):
+        load_dotenv()
 
-    # --- Queues for inter-thread communication (thread-safe) ---
+    # --- Queues between the stages (thread-safe and awaitable, no polling) ---
     # Maxsize 1 prevents backlogs, ensuring processing of the latest input/response.
-    stt_to_llm_queue = queue.Queue(maxsize=1) 
-    llm_to_tts_queue = queue.Queue(maxsize=15)
-
-    # --- Events for synchronization and interruption (thread-safe) ---
-    user_speaking_event = threading.Event()  # Set when user is detected speaking
-    bot_speaking_event = threading.Event()   # Set when bot is actively playing audio
-    interrupt_bot_event = threading.Event()  # Set by STT if user interrupts bot
-    exit_event = threading.Event()           # Set by main thread to signal all threads to exit
-
-    # --- Create instances of the component classes, passing necessary queues and events ---
-    stt_listener = STTListener(
-        stt_to_llm_queue=stt_to_llm_queue,
-        user_speaking_event=user_speaking_event,
-        interrupt_bot_event=interrupt_bot_event,
-        bot_speaking_event=bot_speaking_event,
-        exit_event=exit_event
-    )
-    llm_processor = LLMProcessor(
-        stt_to_llm_queue=stt_to_llm_queue,
-        llm_to_tts_queue=llm_to_tts_queue,
-        exit_event=exit_event
-    )
-    tts_player = TTSPlayer(
-        llm_to_tts_queue=llm_to_tts_queue,
-        interrupt_bot_event=interrupt_bot_event,
-        bot_speaking_event=bot_speaking_event,
-        exit_event=exit_event
-    )
+    stt_to_llm_queue = HandoffQueue(maxsize=1) 
+    llm_to_tts_queue = HandoffQueue(maxsize=15)
+
+    # --- Events for synchronization and interruption (thread-safe and awaitable) ---
+    user_speaking_event = AwaitableEvent()  # Set when user is detected speaking
+    bot_speaking_event = AwaitableEvent()   # Set when bot is actively playing audio
+    interrupt_bot_event = AwaitableEvent()  # Set by STT if user interrupts bot
+    exit_event = AwaitableEvent()           # Set by main thread to signal all stages to exit
+
+    # --- Per-turn latency timelines, aggregated and optionally exported (JSONL / Prometheus textfile) ---
+    metrics = MetricsRecorder(jsonl_path=os.getenv("VOICE_METRICS_JSONL"),
+                              prometheus_path=os.getenv("VOICE_METRICS_PROM_FILE"))
 
-    # --- Create and start threads for each component ---
-    # STT and LLM threads need their own asyncio event loops because their main functions
-    # (`listen_and_transcribe`, `process_llm_requests`) use async/await.
-    # The lambda function creates a new event loop and runs the async function within it.
-    stt_thread = threading.Thread(target=lambda: asyncio.run(stt_listener.listen_and_transcribe()), 
-                                  name="STT_Thread")
-    llm_thread = threading.Thread(target=lambda: asyncio.run(llm_processor.process_llm_requests()),
-                                  name="LLM_Thread")
-    # TTS thread is designed to be blocking (using time.sleep for now), so it runs directly.
-    tts_thread = threading.Thread(target=tts_player.play_tts, 
-                                  name="TTS_Thread")
-
-    stt_thread.start()
-    llm_thread.start()
-    tts_thread.start()
-
-    print("\n--- Voice Agent Started ---")
-    print("Speak into your microphone. Press Enter to gracefully stop the agent.")
+    # --- Turn-scoped cancellation: an interruption aborts the LLM request, TTS requests and playback ---
+    turn_controller = TurnController(interrupt_event=interrupt_bot_event, metrics=metrics)
+
+    # --- Optional recording of the session (mic audio, transcripts, LLM chunks, TTS audio) for replay ---
+    record_path = os.getenv("VOICE_RECORD_PATH")
+    recorder = SessionRecorder(record_path) if record_path else None
+
+    # --- Import and build the components concurrently ---
+    # Imports share the GIL, so they overlap only where they wait on disk or run C code; the
+    # client set-ups (and the network warm-up below) overlap fully.
+    with ThreadPoolExecutor(max_workers=8, thread_name_prefix="Startup") as executor:
+        modules = {name: executor.submit(_import_timed, name, startup)
+                   for name in ("echo_canceller", "stt_component", "llm_component", "tts_component")}
+
+        def build_echo_canceller():
+            # Echo suppression: what the speaker plays is subtracted from the mic before VAD
+            if os.getenv("VOICE_ECHO_CANCELLATION", "1") != "1":
+                return None
+            echo_module, tts_module = modules["echo_canceller"].result(), modules["tts_component"].result()
+            with startup.phase("create echo canceller"):
+                try:
+                    return echo_module.EchoCanceller(mic_rate=16000,
+                                                     playback_rate=tts_module.TTSPlayer.PCM_SAMPLE_RATE)
+                except RuntimeError as e:
+                    print(f"[Runtime] Echo suppression disabled: {e}")
+                    return None
+
+        echo_future = executor.submit(build_echo_canceller)
+
+        # --- Create instances of the component classes, passing necessary queues and events ---
+        def build_stt_listener():
+            stt_module = modules["stt_component"].result()
+            with startup.phase("create stt client"):
+                deepgram_client = stt_module.DeepgramClient() # API key from DEEPGRAM_API_KEY
+            echo_canceller = echo_future.result()
+            with startup.phase("create stt listener"):
+                return stt_module.STTListener(
+                    stt_to_llm_queue=stt_to_llm_queue,
+                    user_speaking_event=user_speaking_event,
+                    interrupt_bot_event=interrupt_bot_event,
+                    bot_speaking_event=bot_speaking_event,
+                    exit_event=exit_event,
+                    deepgram_client=deepgram_client,
+                    turn_controller=turn_controller,
+                    echo_canceller=echo_canceller,
+                    recorder=recorder
+                )
+
+        def build_llm_processor():
+            llm_module = modules["llm_component"].result()
+            with startup.phase("create llm client"):
+                return llm_module.LLMProcessor(
+                    stt_to_llm_queue=stt_to_llm_queue,
+                    llm_to_tts_queue=llm_to_tts_queue,
+                    exit_event=exit_event,
+                    turn_controller=turn_controller,
+                    recorder=recorder
+                )
+
+        def build_tts_player():
+            tts_module = modules["tts_component"].result()
+            echo_canceller = echo_future.result()
+            with startup.phase("create tts player"):
+                return tts_module.TTSPlayer(
+                    llm_to_tts_queue=llm_to_tts_queue,
+                    interrupt_bot_event=interrupt_bot_event,
+                    bot_speaking_event=bot_speaking_event,
+                    exit_event=exit_event,
+                    turn_controller=turn_controller,
+                    playback_listener=echo_canceller.reference.feed if echo_canceller is not None else None,
+                    recorder=recorder
+                )
+
+        stt_future = executor.submit(build_stt_listener)
+        llm_future = executor.submit(build_llm_processor)
+        tts_future = executor.submit(build_tts_player)
+        stt_listener, llm_processor, tts_player = stt_future.result(), llm_future.result(), tts_future.result()
+
+    # --- Run every stage on one event loop in a background thread ---
+    # The main thread stays free to wait for the user to press Enter.
+    # Connections are warmed on that loop first; the agent is announced once they are open.
+    ready_event = threading.Event()
+    scheduler_thread = threading.Thread(
+        target=lambda: asyncio.run(run_voice_pipeline(stt_listener, llm_processor, tts_player,
+                                                      startup=startup, ready_event=ready_event)),
+        name="Scheduler_Thread")
+    scheduler_thread.start()
 
     # Main thread waits for user input to signal shutdown
     try:
+        while not ready_event.wait(timeout=0.1) and scheduler_thread.is_alive():
+            pass
+        print(startup.report())
+
+        print("\n--- Voice Agent Started ---")
+        print("Speak into your microphone. Press Enter to gracefully stop the agent.")
         input() # This will block until Enter is pressed
     except KeyboardInterrupt:
         print("\nCtrl+C detected.")
     finally:
         print("Initiating graceful shutdown...")
-        # Set the global exit event to signal all threads to stop
+        # Set the global exit event and close the queues so every waiting stage wakes up and stops
         exit_event.set()
+        stt_to_llm_queue.close()
+        llm_to_tts_queue.close()
+
+        # Wait for all stages to complete their cleanup and exit
+        # This prevents the main program from terminating before they finish
+        scheduler_thread.join()
 
-        # Wait for all threads to complete their cleanup and exit
-        # This prevents the main program from terminating before threads finish
-        stt_thread.join()
-        llm_thread.join()
-        tts_thread.join()
+        print(f"[Runtime] STT -> LLM handoffs: {stt_to_llm_queue.stats.summary()}")
+        print(f"[Runtime] LLM -> TTS handoffs: {llm_to_tts_queue.stats.summary()}")
+        print(f"[Runtime] Barge-ins: {turn_controller.summary()}")
+        print(f"[Runtime] Turn latency (ms): {metrics.summary()}")
+        if metrics.prometheus_path:
+            metrics.write_prometheus()
+        if recorder is not None:
+            recorder.close()
+            print(f"[Runtime] Recording: {recorder.summary()}")
 
         print("--- Voice Agent Stopped ---")
 
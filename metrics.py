@@ -0,0 +1,304 @@
+import collections
+import contextlib
+import json
+import os
+import queue
+import threading
+import time
+
+# --- Off-thread console and file output ---
+class BackgroundLogger:
+    """
+    Runs print() calls and file writes on one daemon thread, so the threads handling
+    audio and token streams only pay for a queue put. Output order is preserved among
+    messages logged through the same logger.
+    """
+    def __init__(self):
+        self._tasks = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="Background_Logger",
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            fn, args, kwargs = self._tasks.get()
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                print(f"[Log] Background write failed: {e}")
+
+    def submit(self, fn, *args, **kwargs):
+        self._ensure_started()
+        self._tasks.put((fn, args, kwargs))
+
+    def print(self, *args, **kwargs):
+        kwargs.setdefault("flush", True)
+        self.submit(print, *args, **kwargs)
+
+    def clear_line(self):
+        """Blanks the current console line (used before the bot is cut off mid-sentence)."""
+        self.submit(_clear_console_line)
+
+
+def _clear_console_line():
+    try:
+        columns = os.get_terminal_size().columns
+    except OSError:
+        return # Not a terminal (e.g. running under the session server)
+    print(" " * columns, end='\r', flush=True)
+
+
+console = BackgroundLogger() # Shared by every component for hot-path messages
+
+
+# --- Timestamps of one turn, from the first interim transcript to the end of playback ---
+class TurnTimeline:
+    """
+    Records when each stage of a turn first happened. mark() keeps only the first
+    timestamp per name, so stages can mark on every chunk without checking first.
+    """
+    MARKS = ("first_interim", "speech_final", "llm_request_sent", "first_llm_chunk",
+             "first_segment_ready", "tts_request_sent", "first_tts_byte", "first_audio_out", "end")
+
+    def __init__(self, turn_id=None, marks: dict = None):
+        self.turn_id = turn_id
+        self.marks = dict(marks) if marks else {}
+        self.outcome = None
+
+    def mark(self, name: str):
+        if name not in self.marks:
+            self.marks.setdefault(name, time.perf_counter())
+
+    def adopt(self, marks: dict):
+        """Takes marks recorded before the turn existed (e.g. by a speculative generation)."""
+        for name, timestamp in marks.items():
+            self.marks.setdefault(name, timestamp)
+
+    def relative_ms(self, origin: str = "speech_final") -> dict:
+        """Every mark in milliseconds relative to `origin` (or to the earliest mark)."""
+        if not self.marks:
+            return {}
+        base = self.marks.get(origin, min(self.marks.values()))
+        return {name: round((timestamp - base) * 1000, 2)
+                for name, timestamp in sorted(self.marks.items(), key=lambda item: item[1])}
+
+
+# --- Where startup time goes, phase by phase ---
+class StartupTimer:
+    """
+    Records named startup phases, which may overlap (they run on several threads and
+    on the event loop). report() lists them in start order against the time to ready,
+    so the critical path and the benefit of running phases concurrently are visible.
+    """
+    def __init__(self, origin: float = None):
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.phases = [] # (name, start, end)
+        self.ready_at = None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, start, time.perf_counter()))
+
+    async def measure(self, name: str, awaitable):
+        with self.phase(name):
+            return await awaitable
+
+    def ready(self):
+        self.ready_at = time.perf_counter()
+
+    def report(self) -> str:
+        with self._lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+        ready_at = self.ready_at if self.ready_at is not None else time.perf_counter()
+        total_ms = (ready_at - self.origin) * 1000
+        busy_ms = sum((end - start) * 1000 for _, start, end in phases)
+        lines = [f"[Startup] Ready in {total_ms:.0f}ms; phases add up to {busy_ms:.0f}ms "
+                 f"({busy_ms / total_ms if total_ms else 0:.1f}x overlap)"]
+        width = max((len(name) for name, _, _ in phases), default=0)
+        for name, start, end in phases:
+            lines.append(f"[Startup]   {name:<{width}}  {(start - self.origin) * 1000:6.0f} -> "
+                         f"{(end - self.origin) * 1000:6.0f}ms  ({(end - start) * 1000:.0f}ms)")
+        return "\n".join(lines)
+
+
+# --- Latency distribution of one stage ---
+class LatencyHistogram:
+    """Keeps the most recent samples for quantiles plus running totals for export."""
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, max_samples: int = 2048):
+        self.samples = collections.deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+        self.exported = 0 # self.count at the last take_new()
+
+    def observe(self, value_ms: float):
+        self.samples.append(value_ms)
+        self.count += 1
+        self.total += value_ms
+
+    def take_new(self) -> list:
+        """Samples observed since the previous call (the newest ones, if more than fit)."""
+        new = min(self.count - self.exported, len(self.samples))
+        self.exported = self.count
+        return list(self.samples)[len(self.samples) - new:] if new else []
+
+    def quantiles(self) -> dict:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {}
+        return {q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] for q in self.QUANTILES}
+
+
+def distribution(values) -> dict:
+    """count/mean/p50/p95/p99/max of a list of milliseconds (empty dict if there are none)."""
+    ordered = sorted(v for v in values if v is not None)
+    if not ordered:
+        return {}
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+    return {"count": len(ordered), "mean": round(sum(ordered) / len(ordered), 2),
+            "p50": round(pick(0.5), 2), "p95": round(pick(0.95), 2), "p99": round(pick(0.99), 2),
+            "max": round(ordered[-1], 2)}
+
+
+# --- Aggregates turn timelines and exports them ---
+class MetricsRecorder:
+    """
+    Turns completed TurnTimelines into per-stage latency histograms and exports them.
+    Each turn is appended to `jsonl_path` as one JSON line, and `prometheus_path` is
+    rewritten (at most every `prometheus_interval` seconds) in the Prometheus text
+    format for a node-exporter textfile collector. Files are written by the
+    background logger, never by the thread completing the turn.
+    """
+    # (histogram name, from mark, to mark)
+    STAGES = (
+        ("stt_finalize_ms", "first_interim", "speech_final"),
+        ("llm_dispatch_ms", "speech_final", "llm_request_sent"),
+        ("llm_first_chunk_ms", "llm_request_sent", "first_llm_chunk"),
+        ("first_segment_ms", "first_llm_chunk", "first_segment_ready"),
+        ("tts_dispatch_ms", "first_segment_ready", "tts_request_sent"),
+        ("tts_first_byte_ms", "tts_request_sent", "first_tts_byte"),
+        ("audio_out_ms", "first_tts_byte", "first_audio_out"),
+        ("response_latency_ms", "speech_final", "first_audio_out"),
+        ("turn_duration_ms", "speech_final", "end"),
+    )
+
+    def __init__(self, jsonl_path: str = None, prometheus_path: str = None,
+                 prometheus_interval: float = 5.0, logger: BackgroundLogger = None):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.prometheus_interval = prometheus_interval
+        self.logger = logger if logger is not None else console
+        self.histograms = {name: LatencyHistogram() for name, _, _ in self.STAGES}
+        self.outcomes = collections.Counter()
+        self._lock = threading.Lock()
+        self._last_prometheus_write = 0.0
+        self._exported_outcomes = collections.Counter()
+
+    def complete(self, timeline: TurnTimeline, outcome: str):
+        """Closes a turn ("completed" or "interrupted") and records its stage latencies."""
+        if timeline.outcome is not None:
+            return
+        timeline.outcome = outcome
+        timeline.mark("end")
+        marks = timeline.marks
+        with self._lock:
+            self.outcomes[outcome] += 1
+            for name, start, end in self.STAGES:
+                if start in marks and end in marks:
+                    # A speculative request can start before speech_final; that stage then cost nothing
+                    self.histograms[name].observe(max(0.0, (marks[end] - marks[start]) * 1000))
+            write_prometheus = (self.prometheus_path is not None and
+                                time.monotonic() - self._last_prometheus_write >= self.prometheus_interval)
+            if write_prometheus:
+                self._last_prometheus_write = time.monotonic()
+
+        if self.jsonl_path:
+            record = {"time": time.time(), "turn": timeline.turn_id, "outcome": outcome,
+                      "marks_ms": timeline.relative_ms()}
+            self.logger.submit(self._append_jsonl, record)
+        if write_prometheus:
+            self.logger.submit(self.write_prometheus)
+
+    def observe(self, name: str, value_ms: float):
+        """Records a latency outside the turn stages (e.g. a scheduler queue wait); exported alike."""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.observe(value_ms)
+
+    def export_delta(self) -> dict:
+        """
+        What was recorded since the previous export, for merge() into a recorder in another
+        process (e.g. a worker reporting to the session supervisor). JSON-serializable.
+        """
+        with self._lock:
+            outcomes = self.outcomes - self._exported_outcomes
+            self._exported_outcomes = collections.Counter(self.outcomes)
+            stages = {name: histogram.take_new() for name, histogram in self.histograms.items()}
+        return {"outcomes": dict(outcomes), "stages": {name: values for name, values in stages.items() if values}}
+
+    def merge(self, delta: dict):
+        """Adds another recorder's export_delta() to this one."""
+        with self._lock:
+            self.outcomes.update(delta.get("outcomes", {}))
+            for name, values in delta.get("stages", {}).items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = LatencyHistogram()
+                for value in values:
+                    histogram.observe(value)
+
+    def _append_jsonl(self, record: dict):
+        with open(self.jsonl_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def prometheus_text(self, prefix: str = "voice_agent") -> str:
+        with self._lock:
+            snapshot = {name: (h.quantiles(), h.total, h.count) for name, h in self.histograms.items()}
+            outcomes = dict(self.outcomes)
+        lines = [f"# TYPE {prefix}_turns_total counter"]
+        for outcome, count in sorted(outcomes.items()):
+            lines.append(f'{prefix}_turns_total{{outcome="{outcome}"}} {count}')
+        for name, (quantiles, total, count) in snapshot.items():
+            metric = f"{prefix}_{name}"
+            lines.append(f"# TYPE {metric} summary")
+            for q, value in quantiles.items():
+                lines.append(f'{metric}{{quantile="{q}"}} {value:.3f}')
+            lines.append(f"{metric}_sum {total:.3f}")
+            lines.append(f"{metric}_count {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self):
+        temp_path = f"{self.prometheus_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, self.prometheus_path) # Scrapers never see a partial file
+
+    def summary(self) -> str:
+        with self._lock:
+            outcomes = dict(self.outcomes)
+            parts = []
+            for name, histogram in self.histograms.items():
+                quantiles = histogram.quantiles()
+                if quantiles:
+                    parts.append(f"{name} p50={quantiles[0.5]:.0f} p95={quantiles[0.95]:.0f} "
+                                 f"p99={quantiles[0.99]:.0f}")
+        if not outcomes:
+            return "no turns recorded"
+        counts = ", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items()))
+        return f"{counts}; " + "; ".join(parts)
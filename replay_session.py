@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from session_recorder import (EVENT, LLM_CHUNK, LLM_REQUEST, MIC_FRAME, TRANSCRIPT, TTS_AUDIO, TTS_SEGMENT,
+                              SessionRecorder, SessionRecording)
+
+MIC_STALL_MS = 60 # A longer gap between recorded frames means the audio path was blocked
+
+
+# --- What happened in each turn of a recording ---
+def analyze(recording: SessionRecording) -> dict:
+    """
+    Per-turn stage times (ms after the final transcript) and microphone stalls, from the
+    recording alone. Turns are the LLM's "turn_start" events; segments and playback are
+    attributed to turns through the segment ids.
+    """
+    finals, requests, first_chunks, chunk_gaps = [], {}, {}, []
+    segments, first_audio, turns, playback, interrupted = {}, {}, [], {}, set()
+    last_chunk, llm_text, last_frame, frame_gaps = {}, {}, None, []
+    for record in recording.records():
+        if record.kind == MIC_FRAME:
+            if last_frame is not None:
+                frame_gaps.append((record.ts_ns - last_frame) / 1e6)
+            last_frame = record.ts_ns
+        elif record.kind == TRANSCRIPT:
+            value = record.value()
+            if value["speech_final"] and value["text"].strip():
+                finals.append(record.ts_ns)
+        elif record.kind == LLM_REQUEST:
+            requests.setdefault(record.stream, record.ts_ns)
+        elif record.kind == LLM_CHUNK:
+            first_chunks.setdefault(record.stream, record.ts_ns)
+            if record.stream in last_chunk:
+                chunk_gaps.append((record.ts_ns - last_chunk[record.stream]) / 1e6)
+            last_chunk[record.stream] = record.ts_ns
+            llm_text.setdefault(record.stream, []).append(record.value())
+        elif record.kind == TTS_SEGMENT:
+            segments[record.stream] = dict(record.value(), ts_ns=record.ts_ns)
+        elif record.kind == TTS_AUDIO:
+            first_audio.setdefault(record.stream, record.ts_ns)
+        elif record.kind == EVENT:
+            value = record.value()
+            if value["event"] == "turn_start":
+                turns.append(dict(value, ts_ns=record.ts_ns))
+            elif value["event"] == "playback_start":
+                playback.setdefault(value["segment"], record.ts_ns)
+            elif value["event"] == "playback_interrupted":
+                interrupted.add(value["segment"])
+
+    results = []
+    for turn in turns:
+        turn_id = turn["turn"]
+        earlier_finals = [ts for ts in finals if ts <= turn["ts_ns"]]
+        origin = earlier_finals[-1] if earlier_finals else turn["ts_ns"]
+        turn_segments = sorted(segment_id for segment_id, segment in segments.items() if segment["turn"] == turn_id)
+        since = lambda ts: round((ts - origin) / 1e6, 1) if ts is not None else None
+        results.append({
+            "turn": turn_id,
+            "source": turn["source"],
+            "text": turn["text"],
+            "llm_request_ms": since(requests.get(turn_id)),
+            "first_llm_chunk_ms": since(first_chunks.get(turn_id)),
+            "first_segment_ms": since(segments[turn_segments[0]]["ts_ns"]) if turn_segments else None,
+            "first_tts_byte_ms": since(min((first_audio[s] for s in turn_segments if s in first_audio), default=None)),
+            "first_audio_out_ms": since(min((playback[s] for s in turn_segments if s in playback), default=None)),
+            "interrupted": any(s in interrupted for s in turn_segments),
+            # What Gemini answered; for speculative and cached answers, what was spoken
+            "response": ("".join(llm_text[turn_id]) if turn_id in llm_text else
+                         " ".join(segments[s]["text"] for s in turn_segments)),
+        })
+
+    ttfts = [(first_chunks[t] - requests[t]) / 1e6 for t in requests if t in first_chunks and t != 0]
+    ttfbs = [(first_audio[s] - segment["ts_ns"]) / 1e6 for s, segment in segments.items()
+             if s in first_audio and not segment["cached"]]
+    stalls = [gap for gap in frame_gaps if gap > MIC_STALL_MS]
+    return {
+        "turns": results,
+        "llm_ttft_ms": _median(ttfts), "llm_chunk_ms": _median(chunk_gaps), "tts_ttfb_ms": _median(ttfbs),
+        "mic_frames": len(frame_gaps) + (1 if last_frame is not None else 0),
+        "mic_stalls": len(stalls), "mic_max_gap_ms": round(max(frame_gaps, default=0.0), 1),
+    }
+
+
+def _median(values):
+    return round(statistics.median(values), 1) if values else None
+
+
+def print_report(analysis: dict, label: str = "Recording"):
+    for turn in analysis["turns"]:
+        stages = ", ".join(f"{name[:-3]} +{turn[name]:.0f}" for name in
+                           ("llm_request_ms", "first_llm_chunk_ms", "first_segment_ms",
+                            "first_tts_byte_ms", "first_audio_out_ms") if turn[name] is not None)
+        flag = " [interrupted]" if turn["interrupted"] else ""
+        print(f"[{label}] Turn {turn['turn']} ({turn['source']}){flag} '{turn['text'][:40]}': {stages} ms")
+    print(f"[{label}] Median LLM first chunk {analysis['llm_ttft_ms']}ms, between chunks {analysis['llm_chunk_ms']}ms, "
+          f"TTS first byte {analysis['tts_ttfb_ms']}ms")
+    print(f"[{label}] Microphone: {analysis['mic_frames']} frame(s), {analysis['mic_stalls']} gap(s) over "
+          f"{MIC_STALL_MS}ms, longest {analysis['mic_max_gap_ms']}ms")
+
+
+# --- The recorded caller, for running a recording through the pipeline again ---
+class RecordedCaller:
+    """
+    Used by benchmark_harness.run_script in place of ScriptedCaller: pushes the recorded
+    microphone frames into STTListener and re-emits the recorded Deepgram results on the
+    fake connection, each at its recorded offset (divided by `speed`).
+    """
+    def __init__(self, recording: SessionRecording, deepgram, turn_controller, bot_speaking_event,
+                 speed: float = 1.0, drain_timeout_s: float = 30.0):
+        self.recording = recording
+        self.deepgram = deepgram
+        self.turn_controller = turn_controller
+        self.bot_speaking_event = bot_speaking_event
+        self.speed = speed
+        self.drain_timeout_s = drain_timeout_s
+        self.push_callback = None
+        self.cpu_at_final = {} # Same fields as ScriptedCaller, read by run_script
+        self.timeouts = 0
+
+    # STTListener audio source interface
+    def audio_source_factory(self, push_callback):
+        self.push_callback = push_callback
+        return self
+
+    def start(self):
+        pass
+
+    def finish(self):
+        pass
+
+    async def run(self):
+        while self.deepgram.connection is None:
+            await asyncio.sleep(0.01)
+        await self.deepgram.connection.started.wait()
+        loop = asyncio.get_running_loop()
+        start, origin_ns, finals = loop.time(), None, 0
+        for record in self.recording.records(kinds=[MIC_FRAME, TRANSCRIPT]):
+            if origin_ns is None:
+                origin_ns = record.ts_ns
+            delay = start + (record.ts_ns - origin_ns) / 1e9 / self.speed - loop.time()
+            if delay > 0.001:
+                await asyncio.sleep(delay)
+            if record.kind == MIC_FRAME:
+                if self.push_callback is not None:
+                    await self.push_callback(record.payload)
+            else:
+                value = record.value()
+                if value["speech_final"] and value["text"].strip():
+                    finals += 1
+                    self.cpu_at_final[finals] = time.process_time()
+                self.deepgram.connection.emit_transcript(value["text"], is_final=value["is_final"],
+                                                         speech_final=value["speech_final"])
+        # Let the last answer play out
+        deadline = loop.time() + self.drain_timeout_s
+        await asyncio.sleep(0.5)
+        while self.bot_speaking_event.is_set() or (self.turn_controller.current is not None
+                                                   and self.turn_controller.current.active):
+            if loop.time() > deadline:
+                self.timeouts += 1
+                break
+            await asyncio.sleep(0.05)
+
+
+def run_replay(recording: SessionRecording, analysis: dict, args) -> dict:
+    """
+    Runs the recording through the real pipeline against the local stand-ins of
+    benchmark_harness, with Gemini and Unreal Speech answering what they answered in the
+    recording at its median latencies. A turn that is slow in both runs points at the
+    pipeline; one that is only slow in the recording points at a provider.
+    """
+    # Imported here so reports need nothing beyond the standard library
+    from benchmark_harness import run_script
+    from fakes import FakeServices
+
+    script = {"name": os.path.basename(recording.path),
+              "turns": [{"user": turn["text"], "response": turn["response"]} for turn in analysis["turns"]]}
+    for name in ("llm_ttft_ms", "llm_chunk_ms", "tts_ttfb_ms"):
+        if getattr(args, name) is None:
+            setattr(args, name, analysis[name] if analysis[name] is not None else 0.0)
+    with tempfile.TemporaryDirectory(prefix="replay_") as directory:
+        script_path = os.path.join(directory, "script.json")
+        with open(script_path, "w", encoding="utf-8") as f:
+            json.dump(script, f)
+        record_path = args.record or os.path.join(directory, "replay.vrec")
+        recorder = SessionRecorder(record_path)
+        with FakeServices(script_path, args) as services:
+            result = asyncio.run(run_script(
+                script, services, args, recorder=recorder,
+                caller_factory=lambda deepgram, turn_controller, bot_speaking_event: RecordedCaller(
+                    recording, deepgram, turn_controller, bot_speaking_event, speed=args.speed)))
+        recorder.close()
+        with SessionRecording(record_path) as replayed:
+            result["analysis"] = analyze(replayed)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report on a session recording, or run it through the "
+                                                 "pipeline again against local stand-ins (--run).")
+    parser.add_argument("recording")
+    parser.add_argument("--run", action="store_true", help="Replay through the pipeline and compare")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed (2 = twice as fast)")
+    parser.add_argument("--record", help="Keep the recording of the replay at this path")
+    parser.add_argument("--output", help="Write the analysis (and replay results) as JSON")
+    parser.add_argument("--no-hedging", dest="hedging", action="store_false")
+    # Stand-in latencies; by default the recording's medians
+    parser.add_argument("--llm-ttft-ms", type=float)
+    parser.add_argument("--llm-chunk-ms", type=float)
+    parser.add_argument("--tts-ttfb-ms", type=float)
+    args = parser.parse_args()
+    # Fixed settings of the stand-ins: recorded transcripts already include Deepgram's latency
+    args.seed, args.stt_latency_ms, args.stt_jitter_ms = 1, 0.0, 0.0
+    args.llm_jitter_ms = args.tts_jitter_ms = 0.0
+    args.llm_stall_rate = args.llm_error_rate = args.tts_stall_rate = args.tts_error_rate = 0.0
+    args.llm_stall_ms = args.tts_stall_ms = 0.0
+    args.word_ms, args.endpointing_ms = 0.0, 0.0 # Only used by ScriptedCaller
+
+    with SessionRecording(args.recording) as recording:
+        if recording.recovered:
+            print(f"[Recording] No index (the writer did not close it); {len(recording.chunks)} chunk(s) recovered")
+        analysis = analyze(recording)
+        print_report(analysis)
+        output = {"recording": args.recording, "analysis": analysis}
+        if args.run:
+            result = run_replay(recording, analysis, args)
+            print_report(result["analysis"], label="Replay")
+            for recorded, replayed in zip(analysis["turns"], result["analysis"]["turns"]):
+                print(f"[Compare] Turn {recorded['turn']}: first audio +{recorded['first_audio_out_ms']}ms recorded, "
+                      f"+{replayed['first_audio_out_ms']}ms replayed")
+            output["replay"] = result
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import collections
+import re
+import threading
+import time
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s']")
+
+# Words that change nothing about what is being asked
+FILLER_WORDS = frozenset({
+    "um", "umm", "uh", "uhh", "erm", "er", "hmm", "ah", "oh", "well", "so", "okay", "ok",
+    "please", "hey", "hi", "just", "actually", "basically", "kindly",
+})
+
+# Words whose meaning comes from earlier turns; utterances containing them are never cached
+CONTEXT_WORDS = frozenset({
+    "it", "its", "it's", "that", "this", "these", "those", "they", "them", "their", "there",
+    "he", "him", "his", "she", "her", "again", "more", "else", "also", "too", "another",
+    "previous", "last", "earlier", "before", "above", "same", "one", "ones", "continue",
+})
+
+# Words that make the answer about the speaker or the agent ("what is my name?"); the
+# cache is shared by every session, so utterances containing them are never cached either
+PERSONAL_WORDS = frozenset({
+    "i", "i'm", "i've", "i'd", "i'll", "me", "my", "mine", "myself", "we", "we're", "us",
+    "our", "ours", "ourselves", "you", "you're", "you've", "you'd", "you'll", "your",
+    "yours", "yourself", "yourselves",
+})
+
+_BYPASS_WORDS = CONTEXT_WORDS | PERSONAL_WORDS
+# Names, places and numbers: capitalized words past the start of a sentence, or anything with a digit
+_SPECIFIC_TERM_RE = re.compile(r"(?<![.!?]\s)(?<!^)\b[A-Z][\w']+|\b\w*\d[\w,.]*\w|\b\d\b")
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, no punctuation, no filler words, single spaces."""
+    words = _PUNCTUATION_RE.sub(" ", text.lower()).split()
+    return " ".join(word for word in words if word not in FILLER_WORDS)
+
+
+# --- Answers to standalone questions, reused across turns (and sessions) ---
+class ResponseCache:
+    """
+    Maps normalized questions to the answer Gemini gave, for `ttl` seconds and at most
+    `max_entries` entries (least recently used evicted first). Only standalone
+    utterances are eligible: anything referring back to the conversation ("what about
+    that one?") or to the people in it ("what is my name?") is neither served from nor
+    stored in the cache. An answer that repeats a name or number the caller mentioned
+    earlier in the call (and not in the question) drew on their history, so it is not
+    stored either.
+    """
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0, min_words: int = 3):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_words = min_words
+        self._entries = collections.OrderedDict() # key -> (stored_at, response_text, saved_ms)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.personal = 0 # Answers not stored because they repeated the caller's earlier words
+        self.evictions = 0
+        self.saved_ms = 0.0
+
+    def key_for(self, text: str):
+        """Cache key for `text`, or None if the utterance depends on the conversation."""
+        key = normalize_question(text)
+        words = key.split()
+        if len(words) < self.min_words or any(word in _BYPASS_WORDS for word in words):
+            return None
+        return key
+
+    def get(self, text: str):
+        """Returns the cached answer or None. Counts a hit, miss or bypass."""
+        key = self.key_for(text)
+        with self._lock:
+            if key is None:
+                self.bypassed += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key] # Expired
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_ms += entry[2]
+            return entry[1]
+
+    def peek(self, text: str) -> bool:
+        """True if `text` would be a hit; does not touch the statistics."""
+        key = self.key_for(text)
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            return entry is not None and time.monotonic() - entry[0] <= self.ttl
+
+    @staticmethod
+    def specific_terms(text: str) -> set:
+        """Lowercased names and numbers in `text` (see put's `history`)."""
+        return {term.lower() for term in _SPECIFIC_TERM_RE.findall(text)}
+
+    def put(self, text: str, response_text: str, generation_ms: float = 0.0, history: str = ""):
+        """
+        Stores the answer to `text`; `generation_ms` is what a later hit saves. `history`
+        is what the caller said earlier in the call: an answer repeating one of its names
+        or numbers (that the question does not contain) is personal, and is dropped.
+        """
+        key = self.key_for(text)
+        if key is None or not response_text:
+            return
+        borrowed = self.specific_terms(history) - self.specific_terms(text)
+        if borrowed and borrowed & self.specific_terms(response_text):
+            with self._lock:
+                self.personal += 1
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), response_text, generation_ms)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def summary(self) -> str:
+        with self._lock:
+            lookups = self.hits + self.misses
+            hit_rate = self.hits / lookups * 100 if lookups else 0.0
+            return (f"{self.hits} hit(s), {self.misses} miss(es), {self.bypassed} context-dependent, "
+                    f"{self.personal} personal answer(s) not stored, "
+                    f"hit rate {hit_rate:.0f}%, ~{self.saved_ms / 1000:.1f}s of LLM time saved, "
+                    f"{len(self._entries)} entries, {self.evictions} eviction(s)")
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import socket
+import struct
+
+# --- Wire format between callers and the session server ---
+# Every message in either direction is one frame: a 1-byte kind, a 4-byte big-endian
+# payload length, then the payload.
+#   b"A"  audio. Caller -> server: 16 kHz mono linear16 (what the Microphone would send).
+#         Server -> caller: 24 kHz mono 16-bit PCM, paced at real time.
+#   b"T"  JSON event from the server ({"event": "session", ...}, {"event": "busy"},
+#         {"event": "error", "reason": ...} when the pipeline fails mid-call, ...).
+#   b"E"  end of call, sent by the caller (closing the socket works too).
+FRAME_HEADER = struct.Struct("!cI")
+KIND_AUDIO = b"A"
+KIND_EVENT = b"T"
+KIND_END = b"E"
+MAX_FRAME_BYTES = 64 * 1024
+
+
+def encode_frame(kind: bytes, payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+def encode_event(event: str, **fields) -> bytes:
+    return encode_frame(KIND_EVENT, json.dumps({"event": event, **fields}).encode("utf-8"))
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    """Returns (kind, payload), or (None, b"") when the peer has gone away."""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+        kind, length = FRAME_HEADER.unpack(header)
+        if length > MAX_FRAME_BYTES:
+            raise ValueError(f"frame of {length} bytes exceeds {MAX_FRAME_BYTES}")
+        return kind, await reader.readexactly(length)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None, b""
+
+
+# --- Control channel between session_supervisor and its worker processes ---
+class ControlChannel:
+    """
+    One JSON message per datagram over a Unix SOCK_SEQPACKET socket, optionally carrying
+    a file descriptor (SCM_RIGHTS). The supervisor hands accepted caller sockets to a
+    worker this way, so caller audio never passes through the supervisor.
+
+    Messages: supervisor -> worker {"type": "session"} (+ socket), {"type": "drain"};
+    worker -> supervisor {"type": "ready"}, {"type": "load", ...} every report interval.
+    """
+    MAX_MESSAGE_BYTES = 1024 * 1024
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.sock.setblocking(False)
+
+    @staticmethod
+    def pair():
+        """(supervisor end, worker end); the worker end is inheritable for the child process."""
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        child.set_inheritable(True)
+        return parent, child
+
+    async def _wait(self, add, remove):
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        add(self.sock, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            remove(self.sock)
+
+    async def send(self, message: dict, fd: int = None):
+        data = json.dumps(message).encode("utf-8")
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if fd is None:
+                    self.sock.send(data)
+                else:
+                    socket.send_fds(self.sock, [data], [fd])
+                return
+            except BlockingIOError:
+                await self._wait(loop.add_writer, loop.remove_writer)
+
+    async def receive(self):
+        """Returns (message, fd or None); (None, None) once the other side has closed."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                data, fds, _, _ = socket.recv_fds(self.sock, self.MAX_MESSAGE_BYTES, 1)
+                break
+            except BlockingIOError:
+                await self._wait(loop.add_reader, loop.remove_reader)
+            except ConnectionError:
+                return None, None
+        if not data:
+            for fd in fds:
+                socket.close(fd)
+            return None, None
+        return json.loads(data), (fds[0] if fds else None)
+
+    def close(self):
+        self.sock.close()
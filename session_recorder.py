@@ -0,0 +1,342 @@
+import bisect
+import collections
+import itertools
+import json
+import mmap
+import os
+import queue
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+# --- What a recording contains ---
+MIC_FRAME = 1    # Raw microphone frame, as handed to STTListener (bytes)
+TRANSCRIPT = 2   # Deepgram result reaching on_message (JSON: text, is_final, speech_final)
+LLM_REQUEST = 3  # Prompt sent to Gemini (JSON: prompt, speculative); stream = turn id
+LLM_CHUNK = 4    # Text chunk received from Gemini (UTF-8); stream = turn id
+TTS_SEGMENT = 5  # Segment handed to synthesis (JSON: text, turn, cached); stream = segment id
+TTS_AUDIO = 6    # Audio bytes received for a segment; stream = segment id
+EVENT = 7        # Anything else worth a timestamp (JSON with an "event" field)
+
+KIND_NAMES = {MIC_FRAME: "mic_frame", TRANSCRIPT: "transcript", LLM_REQUEST: "llm_request",
+              LLM_CHUNK: "llm_chunk", TTS_SEGMENT: "tts_segment", TTS_AUDIO: "tts_audio", EVENT: "event"}
+
+# --- File layout (little-endian) ---
+# header | chunk* | index | footer. Each chunk is self-describing, so a file whose writer
+# died before the index was written is still readable up to its last complete chunk.
+FILE_HEADER = struct.Struct("<4sHHd")    # magic, version, reserved, wall-clock start (s)
+CHUNK_HEADER = struct.Struct("<4sIIqq")  # magic, record count, payload bytes, first/last ts (ns)
+RECORD_HEADER = struct.Struct("<BIIq")   # kind, stream, payload bytes, ts (ns since start)
+INDEX_HEADER = struct.Struct("<4sI")     # magic, chunk count
+INDEX_ENTRY = struct.Struct("<QqqI")     # chunk offset, first/last ts (ns), record count
+FOOTER = struct.Struct("<Q4s")           # index offset, magic
+FILE_MAGIC, CHUNK_MAGIC, INDEX_MAGIC, FOOTER_MAGIC = b"VREC", b"CHNK", b"INDX", b"VEND"
+VERSION = 1
+
+_STOP = object()
+
+
+# --- Writer: cheap enqueue on the hot threads, encoding and file I/O on its own thread ---
+class SessionRecorder:
+    """
+    Records what a session sent and received, with monotonic timestamps, for later
+    analysis and replay. The recording methods only take a timestamp and enqueue; a
+    daemon thread encodes records into chunks of about `chunk_bytes` and appends them
+    to `path` (at least every `flush_interval` seconds). close() adds the chunk index.
+
+    The queue holds at most `max_pending` records. If the disk cannot keep up, further
+    records are dropped (and counted) rather than blocking the audio or event loop.
+    """
+    def __init__(self, path: str, chunk_bytes: int = 256 * 1024, flush_interval: float = 1.0,
+                 max_pending: int = 20000):
+        self.path = path
+        self.chunk_bytes = chunk_bytes
+        self.flush_interval = flush_interval
+        self.origin_ns = time.monotonic_ns()
+        self.records = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._segment_ids = itertools.count(1)
+        self._index = [] # (offset, first_ts, last_ts, count) per chunk written
+        self._file = open(path, "wb")
+        self._file.write(FILE_HEADER.pack(FILE_MAGIC, VERSION, 0, time.time()))
+        self._thread = threading.Thread(target=self._run, name="Session_Recorder_Thread", daemon=True)
+        self._thread.start()
+
+    def record(self, kind: int, payload, stream: int = 0):
+        """payload: bytes, str or a JSON-serializable dict (encoded on the writer thread)."""
+        try:
+            self._pending.put_nowait((kind, stream, time.monotonic_ns() - self.origin_ns, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def mic_frame(self, frame: bytes):
+        self.record(MIC_FRAME, frame if isinstance(frame, bytes) else bytes(frame))
+
+    def transcript(self, text: str, is_final: bool, speech_final: bool):
+        self.record(TRANSCRIPT, {"text": text, "is_final": bool(is_final), "speech_final": bool(speech_final)})
+
+    def llm_request(self, turn_id: int, prompt: str, speculative: bool = False):
+        self.record(LLM_REQUEST, {"prompt": prompt, "speculative": speculative}, turn_id or 0)
+
+    def llm_chunk(self, turn_id: int, text: str):
+        self.record(LLM_CHUNK, text, turn_id or 0)
+
+    def tts_segment(self, turn_id: int, text: str, cached: bool = False) -> int:
+        """Returns the segment id to pass to tts_audio() for this segment's audio."""
+        segment_id = next(self._segment_ids)
+        self.record(TTS_SEGMENT, {"text": text, "turn": turn_id, "cached": cached}, segment_id)
+        return segment_id
+
+    def tts_audio(self, segment_id: int, audio: bytes):
+        self.record(TTS_AUDIO, audio if isinstance(audio, bytes) else bytes(audio), segment_id)
+
+    def event(self, name: str, **fields):
+        self.record(EVENT, dict(fields, event=name))
+
+    def close(self):
+        """Writes what is still queued plus the index, then closes the file."""
+        if self._thread is None:
+            return
+        self._pending.put(_STOP) # Blocks only if the queue is full; the writer is draining it
+        self._thread.join()
+        self._thread = None
+
+    def summary(self) -> str:
+        return (f"{self.records} record(s), {self.bytes_written / 1024:.0f} KiB in {len(self._index)} chunk(s), "
+                f"{self.dropped} dropped -> {self.path}")
+
+    # Writer thread
+    def _run(self):
+        buffer = bytearray()
+        count, first_ts, last_ts = 0, 0, 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._pending.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is not None and item is not _STOP:
+                kind, stream, ts, payload = item
+                if isinstance(payload, str):
+                    payload = payload.encode("utf-8")
+                elif isinstance(payload, dict):
+                    payload = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                buffer += RECORD_HEADER.pack(kind, stream, len(payload), ts)
+                buffer += payload
+                if count == 0:
+                    first_ts = ts
+                last_ts = max(last_ts, ts)
+                count += 1
+            if buffer and (item is None or item is _STOP or len(buffer) >= self.chunk_bytes):
+                self._write_chunk(buffer, count, first_ts, last_ts)
+                buffer, count, last_ts = bytearray(), 0, 0
+            if item is None:
+                deadline = time.monotonic() + self.flush_interval
+            if item is _STOP:
+                break
+        self._write_index()
+
+    def _write_chunk(self, payload: bytearray, count: int, first_ts: int, last_ts: int):
+        try:
+            offset = self._file.tell()
+            self._file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, count, len(payload), first_ts, last_ts))
+            self._file.write(payload)
+            self._file.flush() # A crash loses at most the chunk being filled
+        except OSError as e:
+            print(f"[Recorder] Write failed, {count} record(s) lost: {e}")
+            self.dropped += count
+            return
+        self._index.append((offset, first_ts, last_ts, count))
+        self.records += count
+        self.bytes_written += CHUNK_HEADER.size + len(payload)
+
+    def _write_index(self):
+        try:
+            offset = self._file.tell()
+            self._file.write(INDEX_HEADER.pack(INDEX_MAGIC, len(self._index)))
+            for entry in self._index:
+                self._file.write(INDEX_ENTRY.pack(*entry))
+            self._file.write(FOOTER.pack(offset, FOOTER_MAGIC))
+        except OSError as e:
+            print(f"[Recorder] Could not write the index (the recording is still readable): {e}")
+        finally:
+            self._file.close()
+
+
+# --- Reader: memory-mapped, with random access by time through the chunk index ---
+class Record(collections.namedtuple("Record", "kind stream ts_ns payload")):
+    __slots__ = ()
+
+    @property
+    def ts_ms(self) -> float:
+        return self.ts_ns / 1e6
+
+    def value(self):
+        """The payload decoded as it was recorded: dict, str or bytes."""
+        if self.kind in (TRANSCRIPT, LLM_REQUEST, TTS_SEGMENT, EVENT):
+            return json.loads(self.payload)
+        if self.kind == LLM_CHUNK:
+            return self.payload.decode("utf-8")
+        return self.payload
+
+
+class SessionRecording:
+    """
+    Opens a recording written by SessionRecorder through mmap. Chunks are located via
+    the index (or, for a recording whose writer never closed it, by walking the chunk
+    headers), so records(start_ms=...) reads only the chunks it needs.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.recovered = False # True if the index was missing and the chunks were scanned
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < FILE_HEADER.size:
+            raise ValueError(f"{path} is not a session recording")
+        magic, version, _, self.wall_start = FILE_HEADER.unpack_from(self._map, 0)
+        if magic != FILE_MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} session recording")
+        self.chunks = self._read_index()
+        if self.chunks is None:
+            self.chunks = self._scan_chunks()
+            self.recovered = True
+        self._first_ts = [first_ts for _, first_ts, _, _ in self.chunks]
+
+    def _read_index(self):
+        if len(self._map) < FILE_HEADER.size + FOOTER.size:
+            return None
+        index_offset, magic = FOOTER.unpack_from(self._map, len(self._map) - FOOTER.size)
+        if magic != FOOTER_MAGIC:
+            return None
+        index_magic, count = INDEX_HEADER.unpack_from(self._map, index_offset)
+        if index_magic != INDEX_MAGIC:
+            return None
+        return [INDEX_ENTRY.unpack_from(self._map, index_offset + INDEX_HEADER.size + i * INDEX_ENTRY.size)
+                for i in range(count)]
+
+    def _scan_chunks(self) -> list:
+        chunks, offset, size = [], FILE_HEADER.size, len(self._map)
+        while offset + CHUNK_HEADER.size <= size:
+            magic, count, length, first_ts, last_ts = CHUNK_HEADER.unpack_from(self._map, offset)
+            if magic != CHUNK_MAGIC or offset + CHUNK_HEADER.size + length > size:
+                break # The index, or a chunk cut short by a crash
+            chunks.append((offset, first_ts, last_ts, count))
+            offset += CHUNK_HEADER.size + length
+        return chunks
+
+    def _chunk_records(self, offset: int):
+        _, count, length, _, _ = CHUNK_HEADER.unpack_from(self._map, offset)
+        position = offset + CHUNK_HEADER.size
+        for _ in range(count):
+            kind, stream, size, ts = RECORD_HEADER.unpack_from(self._map, position)
+            position += RECORD_HEADER.size
+            yield Record(kind, stream, ts, self._map[position:position + size])
+            position += size
+
+    def records(self, kinds=None, start_ms: float = None, end_ms: float = None):
+        """Records in write order, optionally only `kinds` and those within [start_ms, end_ms]."""
+        start_ns = int(start_ms * 1e6) if start_ms is not None else None
+        end_ns = int(end_ms * 1e6) if end_ms is not None else None
+        first_chunk = 0
+        if start_ns is not None:
+            # Chunks are written in time order, but a chunk's last record may be later than the
+            # next chunk's first one (records are stamped on other threads), so back off by one
+            first_chunk = max(0, bisect.bisect_right(self._first_ts, start_ns) - 2)
+        kinds = set(kinds) if kinds is not None else None
+        for offset, first_ts, last_ts, _ in self.chunks[first_chunk:]:
+            if start_ns is not None and last_ts < start_ns:
+                continue
+            if end_ns is not None and first_ts > end_ns:
+                break
+            for record in self._chunk_records(offset):
+                if kinds is not None and record.kind not in kinds:
+                    continue
+                if start_ns is not None and record.ts_ns < start_ns:
+                    continue
+                if end_ns is not None and record.ts_ns > end_ns:
+                    continue
+                yield record
+
+    @property
+    def duration_ms(self) -> float:
+        return max((last_ts for _, _, last_ts, _ in self.chunks), default=0) / 1e6
+
+    def counts(self) -> dict:
+        counts = collections.Counter(KIND_NAMES.get(record.kind, str(record.kind)) for record in self.records())
+        return dict(counts)
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# --- Self-check: python session_recorder.py ---
+def _run_self_check():
+    directory = tempfile.mkdtemp(prefix="session_recorder_")
+    path = os.path.join(directory, "check.vrec")
+    recorder = SessionRecorder(path, chunk_bytes=64 * 1024, flush_interval=0.2)
+    frame = bytes(640) # 20 ms of 16 kHz linear16
+    frames = 3000 # One minute of microphone audio
+    start = time.perf_counter()
+    for i in range(frames):
+        recorder.mic_frame(frame)
+        if i % 50 == 0:
+            recorder.transcript(f"interim {i}", is_final=False, speech_final=False)
+        if i % 500 == 499:
+            turn = i // 500 + 1
+            recorder.transcript(f"question {turn}", is_final=True, speech_final=True)
+            recorder.llm_request(turn, f"question {turn}")
+            for word in ("An", " answer", " in", " chunks."):
+                recorder.llm_chunk(turn, word)
+            segment = recorder.tts_segment(turn, "An answer in chunks.")
+            recorder.tts_audio(segment, bytes(4096))
+            recorder.event("playback_start", segment=segment)
+    calls = frames + frames // 50 + (frames // 500) * 9
+    hot_path_us = (time.perf_counter() - start) / calls * 1e6
+    recorder.close()
+    print(f"Recorder: {recorder.summary()}; {hot_path_us:.2f}us per record on the calling thread")
+
+    with SessionRecording(path) as recording:
+        counts = recording.counts()
+        assert not recording.recovered and counts["mic_frame"] == frames, counts
+        window = list(recording.records(kinds=[TRANSCRIPT], start_ms=recording.duration_ms / 2))
+        assert window and all(r.ts_ns >= recording.duration_ms / 2 * 1e6 for r in window)
+        finals = [r.value()["text"] for r in recording.records(kinds=[TRANSCRIPT]) if r.value()["speech_final"]]
+        assert finals == [f"question {turn}" for turn in range(1, frames // 500 + 1)], finals
+        text = "".join(r.value() for r in recording.records(kinds=[LLM_CHUNK]) if r.stream == 1)
+        assert text == "An answer in chunks.", text
+        print(f"Reader: {counts}; {len(recording.chunks)} chunk(s) indexed")
+        complete_size = recording.chunks[-1][0] - 1 # Cut into the last chunk, as a crash would
+
+    # A recording whose writer died mid-chunk, without index or footer
+    with open(path, "rb") as f:
+        truncated = f.read(complete_size)
+    crashed_path = os.path.join(directory, "crashed.vrec")
+    with open(crashed_path, "wb") as f:
+        f.write(truncated)
+    with SessionRecording(crashed_path) as recording:
+        assert recording.recovered and recording.chunks
+        print(f"Crash recovery: {len(recording.chunks)} complete chunk(s), "
+              f"{sum(recording.counts().values())} record(s) readable")
+    print("Self-check passed.")
+
+
+if __name__ == "__main__":
+    # python session_recorder.py            -> self-check
+    # python session_recorder.py a.vrec     -> record counts of a recording
+    if sys.argv[1:]:
+        for recording_path in sys.argv[1:]:
+            with SessionRecording(recording_path) as recording:
+                print(f"{recording_path}: {recording.duration_ms / 1000:.1f}s, {len(recording.chunks)} chunk(s)"
+                      f"{' (recovered, no index)' if recording.recovered else ''}, {recording.counts()}")
+    else:
+        _run_self_check()
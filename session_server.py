@@ -0,0 +1,451 @@
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from deepgram import DeepgramClient, DeepgramClientOptions
+from dotenv import load_dotenv
+from google import genai
+from google.genai import types
+
+from audio_cache import AudioCache
+from audio_sink import StreamAudioSink
+from call_scheduler import CallScheduler
+from event_runtime import AwaitableEvent, HandoffQueue, LoopLagMonitor
+from http_pool import PooledHTTPClient
+from llm_component import LLMProcessor
+from metrics import MetricsRecorder
+from response_cache import ResponseCache
+from session_protocol import (KIND_AUDIO, KIND_END, KIND_EVENT, ControlChannel, encode_event, encode_frame,
+                              read_frame)
+from session_recorder import SessionRecorder
+from stt_component import STTListener
+from tts_component import TTSPlayer
+from turn_control import TurnController
+
+def _process_rss_bytes() -> int:
+    """Resident set size of this process (Linux), or 0 where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+# --- Caller audio in place of the local microphone ---
+class SocketAudioSource:
+    """
+    Drop-in for deepgram.Microphone fed by a network connection. Frames are held in a
+    bounded queue (oldest dropped first if Deepgram falls behind) and forwarded to the
+    push callback by a task on the session's event loop.
+    """
+    def __init__(self, max_frames: int = 50):
+        self._frames = asyncio.Queue(maxsize=max_frames)
+        self._push = None
+        self._task = None
+        self.bytes_received = 0
+        self.frames_dropped = 0
+        self.buffered_bytes = 0
+
+    def bind(self, push_callback):
+        """Used as STTListener's audio_source_factory: attaches Deepgram's send callback."""
+        self._push = push_callback
+        return self
+
+    def feed(self, frame: bytes):
+        self.bytes_received += len(frame)
+        if self._frames.full():
+            dropped = self._frames.get_nowait()
+            self.buffered_bytes -= len(dropped)
+            self.frames_dropped += 1
+        self._frames.put_nowait(frame)
+        self.buffered_bytes += len(frame)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._forward())
+
+    async def _forward(self):
+        while True:
+            frame = await self._frames.get()
+            self.buffered_bytes -= len(frame)
+            result = self._push(frame)
+            if inspect.isawaitable(result):
+                await result
+
+    def finish(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# --- TTS for remote callers ---
+class SessionTTSPlayer(TTSPlayer):
+    AUDIO_FORMAT = "pcm" # Raw PCM from Unreal Speech: no ffmpeg process per session
+
+
+# --- Clients, pools and executors shared by every session in the process ---
+class SharedResources:
+    """
+    Everything that is expensive to create or benefits from reuse across calls:
+    API clients, the Unreal Speech connection pool, the audio cache and the worker
+    threads that fetch TTS audio. Endpoints can be pointed at local stand-ins with
+    DEEPGRAM_URL, GEMINI_BASE_URL and UNREAL_SPEECH_BASE_URL (UNREAL_SPEECH_FALLBACK_URL
+    adds a second TTS backend for hedging and failover). With VOICE_RECORD_DIR set, every
+    session is recorded there (see session_recorder.py and replay_session.py). Provider
+    quotas are set with GEMINI_RATE_PER_S, GEMINI_MAX_IN_FLIGHT, UNREAL_SPEECH_RATE_PER_S,
+    UNREAL_SPEECH_MAX_IN_FLIGHT and DEEPGRAM_CONNECT_RATE_PER_S (see call_scheduler.py).
+    """
+    def __init__(self, max_sessions: int, http_pool_size: int = 16):
+        deepgram_url = os.getenv("DEEPGRAM_URL")
+        self.deepgram_client = (DeepgramClient("", DeepgramClientOptions(url=deepgram_url))
+                                if deepgram_url else DeepgramClient())
+
+        gemini_url = os.getenv("GEMINI_BASE_URL")
+        http_options = types.HttpOptions(base_url=gemini_url) if gemini_url else None
+        self.gemini_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"), http_options=http_options)
+
+        # Turn timelines of every session feed one set of histograms
+        self.metrics = MetricsRecorder(jsonl_path=os.getenv("VOICE_METRICS_JSONL"),
+                                       prometheus_path=os.getenv("VOICE_METRICS_PROM_FILE"))
+
+        self.http_client = PooledHTTPClient(SessionTTSPlayer.UNREAL_SPEECH_BASE_URL,
+                                            pool_size=http_pool_size)
+        # Backend health (hedge delays, circuit breakers) is learned once for all sessions, and
+        # each backend's quota is shared by them: a first segment of one call is sent ahead of
+        # the prefetches and speculative requests of the others
+        self.tts_providers = SessionTTSPlayer.create_tts_providers(self.http_client, self.metrics)
+        self.llm_providers = LLMProcessor.create_llm_providers(self.gemini_client, self.metrics)
+        self.deepgram_scheduler = CallScheduler("deepgram", STTListener.DG_CONNECT_RATE_PER_S,
+                                                metrics=self.metrics)
+        self.audio_cache = AudioCache(max_bytes=SessionTTSPlayer.AUDIO_CACHE_MAX_BYTES * 4,
+                                      disk_dir=SessionTTSPlayer.AUDIO_CACHE_DIR,
+                                      max_disk_bytes=SessionTTSPlayer.AUDIO_CACHE_DISK_MAX_BYTES)
+        self.fetch_executor = ThreadPoolExecutor(max_workers=http_pool_size,
+                                                 thread_name_prefix="TTS_Fetch")
+        # FAQ-style questions repeat across callers, so their answers are shared
+        self.response_cache = ResponseCache(max_entries=1024)
+        self.record_dir = os.getenv("VOICE_RECORD_DIR")
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+        # play_tts blocks on its queue, so each live session holds one of these threads
+        self.tts_executor = ThreadPoolExecutor(max_workers=max_sessions,
+                                               thread_name_prefix="TTS_Session")
+
+    def close(self):
+        self.fetch_executor.shutdown(wait=False)
+        self.tts_executor.shutdown(wait=False)
+        for provider in self.tts_providers:
+            provider.target.close()
+
+
+# --- One caller's conversation ---
+class VoiceSession:
+    """
+    The STT -> LLM -> TTS pipeline of main_agent.py for one connection, with its own
+    queues, events and turn controller, running on the server's event loop.
+    """
+    def __init__(self, session_id: int, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter, shared: SharedResources):
+        self.session_id = session_id
+        self.reader = reader
+        self.writer = writer
+        self.shared = shared
+        self.started = time.monotonic()
+        self._loop = asyncio.get_running_loop()
+        self._write_lock = asyncio.Lock()
+
+        # Same bounds as the single-user agent
+        self.stt_to_llm_queue = HandoffQueue(maxsize=1)
+        self.llm_to_tts_queue = HandoffQueue(maxsize=15)
+        self.user_speaking_event = AwaitableEvent()
+        self.bot_speaking_event = AwaitableEvent()
+        self.interrupt_bot_event = AwaitableEvent()
+        self.exit_event = AwaitableEvent()
+        self.turn_controller = TurnController(interrupt_event=self.interrupt_bot_event,
+                                              metrics=shared.metrics)
+
+        self.recorder = (SessionRecorder(os.path.join(shared.record_dir,
+                                                      f"session-{int(time.time())}-{session_id}.vrec"))
+                         if shared.record_dir else None)
+
+        self.audio_source = SocketAudioSource()
+        self.stt_listener = STTListener(
+            stt_to_llm_queue=self.stt_to_llm_queue,
+            user_speaking_event=self.user_speaking_event,
+            interrupt_bot_event=self.interrupt_bot_event,
+            bot_speaking_event=self.bot_speaking_event,
+            exit_event=self.exit_event,
+            deepgram_client=shared.deepgram_client,
+            audio_source_factory=self.audio_source.bind,
+            turn_controller=self.turn_controller,
+            recorder=self.recorder,
+            connect_scheduler=shared.deepgram_scheduler,
+        )
+        self.llm_processor = LLMProcessor(
+            stt_to_llm_queue=self.stt_to_llm_queue,
+            llm_to_tts_queue=self.llm_to_tts_queue,
+            exit_event=self.exit_event,
+            turn_controller=self.turn_controller,
+            client=shared.gemini_client,
+            response_cache=shared.response_cache,
+            llm_providers=shared.llm_providers,
+            recorder=self.recorder,
+        )
+        self.tts_player = SessionTTSPlayer(
+            llm_to_tts_queue=self.llm_to_tts_queue,
+            interrupt_bot_event=self.interrupt_bot_event,
+            bot_speaking_event=self.bot_speaking_event,
+            exit_event=self.exit_event,
+            turn_controller=self.turn_controller,
+            audio_sink_factory=lambda **kwargs: StreamAudioSink(self.send_audio, self._loop, **kwargs),
+            http_client=shared.http_client,
+            audio_cache=shared.audio_cache,
+            fetch_executor=shared.fetch_executor,
+            tts_providers=shared.tts_providers,
+            recorder=self.recorder,
+        )
+
+    async def _send(self, kind: bytes, payload: bytes):
+        async with self._write_lock:
+            if self.writer.is_closing():
+                return
+            self.writer.write(encode_frame(kind, payload))
+            await self.writer.drain()
+
+    async def send_audio(self, pcm: bytes):
+        try:
+            await self._send(KIND_AUDIO, pcm)
+        except ConnectionError:
+            self.exit_event.set()
+
+    async def send_event(self, event: str, **fields):
+        await self._send(KIND_EVENT, json.dumps({"event": event, **fields}).encode("utf-8"))
+
+    async def run(self):
+        """
+        Feeds the caller's frames to the pipeline until they hang up. Reads are raced
+        against the pipeline itself, so a stage that dies (e.g. STT cannot connect) ends
+        the session with an "error" event instead of leaving the caller talking to nobody.
+        """
+        stages = [
+            asyncio.ensure_future(self.stt_listener.listen_and_transcribe()),
+            asyncio.ensure_future(self.llm_processor.process_llm_requests()),
+            self._loop.run_in_executor(self.shared.tts_executor, self.tts_player.play_tts),
+        ]
+        read = None
+        try:
+            await self.send_event("session", id=self.session_id)
+            while not self.exit_event.is_set():
+                read = asyncio.ensure_future(read_frame(self.reader))
+                done, _ = await asyncio.wait({read, *stages}, return_when=asyncio.FIRST_COMPLETED)
+                if read not in done: # A stage ended while the caller was still connected
+                    failure = next((stage.exception() for stage in done if not stage.cancelled()
+                                    and stage.exception() is not None), None)
+                    await self.send_event("error", reason=str(failure or "pipeline stopped"))
+                    break
+                kind, payload = read.result()
+                if kind is None or kind == KIND_END:
+                    break
+                if kind == KIND_AUDIO:
+                    self.audio_source.feed(payload)
+        finally:
+            if read is not None and not read.done():
+                read.cancel()
+            self.stop()
+            results = await asyncio.gather(*stages, return_exceptions=True) # Every stage exits
+            if self.recorder is not None:
+                await asyncio.to_thread(self.recorder.close) # Waits for the writer to drain
+        failure = next((result for result in results if isinstance(result, Exception)), None)
+        if failure is not None:
+            raise failure
+
+    def stop(self):
+        """Same shutdown as main_orchestrator: every waiting stage wakes up and exits."""
+        self.exit_event.set()
+        self.stt_to_llm_queue.close()
+        self.llm_to_tts_queue.close()
+
+    def memory_usage(self) -> dict:
+        """Bytes held by this session's own buffers (shared pools and caches excluded)."""
+        sink = self.tts_player.audio_sink
+        context = self.llm_processor.context
+        history_bytes = len(context.summary) + sum(len(user_text) + len(model_text)
+                                                   for user_text, model_text, _ in context.exchanges)
+        return {
+            "output_ring_bytes": sink.ring.capacity,
+            "output_buffered_bytes": len(sink.ring),
+            "input_buffered_bytes": self.audio_source.buffered_bytes,
+            "history_bytes": history_bytes,
+            "llm_to_tts_items": self.llm_to_tts_queue.qsize(),
+        }
+
+    def summary(self) -> str:
+        memory = self.memory_usage()
+        held = memory["output_ring_bytes"] + memory["input_buffered_bytes"] + memory["history_bytes"]
+        return (f"session {self.session_id}: up {time.monotonic() - self.started:.0f}s, "
+                f"~{held / 1024:.0f}KB held, in={self.audio_source.bytes_received}B "
+                f"(dropped {self.audio_source.frames_dropped} frame(s)), "
+                f"out={self.tts_player.audio_sink.bytes_sent}B, barge-ins: {self.turn_controller.summary()}"
+                + (f", uplink {self.stt_listener.uplink.summary()}" if self.stt_listener.uplink else ""))
+
+
+# --- Accepts callers and runs one VoiceSession per connection ---
+class VoiceSessionServer:
+    """
+    Serves up to `max_sessions` concurrent conversations from one process. All sessions
+    share one event loop (STT and LLM are coroutines) and the SharedResources pools;
+    callers beyond the limit get a "busy" event and are disconnected.
+
+    Under session_supervisor.py the server runs as a worker (serve_worker): callers are
+    accepted by the supervisor and arrive as sockets over the control channel, and load
+    and metrics are reported back instead of printed.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, max_sessions: int = 8,
+                 report_interval: float = 30.0, worker_id: int = 0):
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.report_interval = report_interval
+        self.worker_id = worker_id
+        self.shared = None
+        self.sessions = {}
+        self._next_id = worker_id * 1000000 + 1 # Session ids stay unique across workers
+        self.total_sessions = 0
+        self.rejected = 0
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if len(self.sessions) >= self.max_sessions:
+            self.rejected += 1
+            writer.write(encode_event("busy"))
+            await writer.drain()
+            writer.close()
+            return
+
+        session = VoiceSession(self._next_id, reader, writer, self.shared)
+        self._next_id += 1
+        self.total_sessions += 1
+        self.sessions[session.session_id] = session
+        print(f"[Server] Session {session.session_id} started ({len(self.sessions)}/{self.max_sessions}).")
+        try:
+            await session.run()
+        except Exception as e:
+            print(f"[Server] Session {session.session_id} failed: {e}")
+        finally:
+            del self.sessions[session.session_id]
+            print(f"[Server] Ended {session.summary()}")
+            writer.close()
+
+    def report(self) -> str:
+        lines = [f"[Server] {len(self.sessions)}/{self.max_sessions} active, {self.total_sessions} served, "
+                 f"{self.rejected} rejected, process RSS {_process_rss_bytes() / 1048576:.1f}MB, "
+                 f"audio cache {self.shared.audio_cache.summary()}",
+                 f"[Server] Turn latency (ms): {self.shared.metrics.summary()}",
+                 f"[Server] Response cache: {self.shared.response_cache.summary()}"]
+        lines.extend(f"[Server] Backend {provider.summary()}"
+                     for provider in self.shared.llm_providers + self.shared.tts_providers)
+        if self.shared.deepgram_scheduler.limited:
+            lines.append(f"[Server] Backend deepgram connects: {self.shared.deepgram_scheduler.summary()}")
+        lines.extend(f"[Server]   {session.summary()}" for session in self.sessions.values())
+        return "\n".join(lines)
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            print(self.report())
+
+    async def _open_shared(self):
+        self.shared = SharedResources(self.max_sessions)
+        # One warm pool per TTS backend for everybody, opened before the first caller needs it
+        for provider in self.shared.tts_providers:
+            await asyncio.to_thread(provider.target.warm)
+            provider.target.start_keepalive()
+
+    async def serve(self):
+        await self._open_shared()
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        reporter = asyncio.create_task(self._report_loop())
+        print(f"[Server] Listening on {self.host}:{self.port} (max {self.max_sessions} sessions).")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            reporter.cancel()
+            for session in list(self.sessions.values()):
+                session.stop()
+            print(self.report())
+            self.shared.close()
+
+    def load(self, lag: LoopLagMonitor) -> dict:
+        return {"type": "load", "active": len(self.sessions), "served": self.total_sessions,
+                "rejected": self.rejected, "lag_ms": round(lag.lag_ms, 2), "max_lag_ms": round(lag.reset_max(), 2),
+                "rss_bytes": _process_rss_bytes(), "metrics": self.shared.metrics.export_delta()}
+
+    async def _report_load(self, channel: ControlChannel, lag: LoopLagMonitor):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            await channel.send(self.load(lag))
+
+    async def serve_worker(self, control_fd: int):
+        """
+        Runs as a session_supervisor worker until told to drain (or the supervisor goes
+        away), then lets the active sessions finish and returns.
+        """
+        channel = ControlChannel(socket.socket(fileno=control_fd))
+        await self._open_shared()
+        lag = LoopLagMonitor()
+        lag.start()
+        reporter = asyncio.create_task(self._report_load(channel, lag))
+        await channel.send({"type": "ready", "pid": os.getpid()})
+        connections = set()
+        try:
+            while True:
+                message, fd = await channel.receive()
+                if message is None or message["type"] == "drain":
+                    break
+                if message["type"] == "session" and fd is not None:
+                    reader, writer = await asyncio.open_connection(sock=socket.socket(fileno=fd))
+                    task = asyncio.create_task(self._handle_connection(reader, writer))
+                    connections.add(task)
+                    task.add_done_callback(connections.discard)
+            print(f"[Worker {self.worker_id}] Draining {len(self.sessions)} session(s).")
+            if connections:
+                await asyncio.wait(set(connections))
+        finally:
+            reporter.cancel()
+            try:
+                await channel.send(self.load(lag)) # Last metrics before exiting
+            except OSError:
+                pass # Supervisor already gone
+            lag.stop()
+            channel.close()
+            for session in list(self.sessions.values()):
+                session.stop()
+            self.shared.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve voice agent sessions over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-sessions", type=int, default=8)
+    parser.add_argument("--report-interval", type=float, default=30.0)
+    # Set by session_supervisor.py when it starts this process as a worker
+    parser.add_argument("--control-fd", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-id", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    load_dotenv()
+    server = VoiceSessionServer(args.host, args.port, args.max_sessions, args.report_interval,
+                                worker_id=args.worker_id)
+    try:
+        asyncio.run(server.serve() if args.control_fd is None else server.serve_worker(args.control_fd))
+    except KeyboardInterrupt:
+        print("\n[Server] Stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import sys
+import time
+
+from metrics import MetricsRecorder
+from session_protocol import ControlChannel, encode_event
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_server.py")
+
+
+# --- One worker process, as the supervisor sees it ---
+class WorkerHandle:
+    """
+    A session_server.py process started with --control-fd. `active` is the worker's last
+    reported session count plus the sessions handed to it since that report, so a burst
+    of callers spreads out before the next report arrives.
+    """
+    def __init__(self, worker_id: int, generation: int, process, channel: ControlChannel):
+        self.worker_id = worker_id
+        self.generation = generation
+        self.process = process
+        self.channel = channel
+        self.started = time.monotonic()
+        self.ready = False
+        self.draining = False
+        self.active = 0
+        self.assigned = 0 # Sessions handed over during this process's lifetime
+        self.served = 0
+        self.rejected = 0
+        self.lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.rss_bytes = 0
+
+    @property
+    def name(self) -> str:
+        return f"worker {self.worker_id}.{self.generation} (pid {self.process.pid})"
+
+    def update(self, load: dict):
+        in_flight = self.assigned - load["served"] - load["rejected"] # Handed over, not yet seen by the worker
+        self.served, self.rejected = load["served"], load["rejected"]
+        self.active = load["active"] + max(0, in_flight)
+        self.lag_ms, self.max_lag_ms, self.rss_bytes = load["lag_ms"], load["max_lag_ms"], load["rss_bytes"]
+
+    def score(self, lag_ms_per_session: float) -> float:
+        """Placement cost: active sessions, plus event-loop lag in session equivalents."""
+        return self.active + self.lag_ms / lag_ms_per_session
+
+    def summary(self) -> str:
+        state = "draining" if self.draining else ("ready" if self.ready else "starting")
+        return (f"{self.name}: {state}, {self.active} active, {self.served} served, {self.rejected} rejected, "
+                f"loop lag {self.lag_ms:.1f}ms (max {self.max_lag_ms:.1f}ms), "
+                f"RSS {self.rss_bytes / 1048576:.1f}MB, up {time.monotonic() - self.started:.0f}s")
+
+
+# --- Accepts callers and spreads them over worker processes ---
+class SessionSupervisor:
+    """
+    Runs `workers` session_server processes, each on its own core and GIL, and places
+    every new caller on the least loaded one (active sessions and event-loop lag). The
+    accepted socket itself is passed to the worker, so audio never crosses this process.
+
+    Workers are restarted when they exit unexpectedly (with backoff if they keep dying),
+    recycled after `recycle_after` sessions, and all replaced one by one on SIGHUP. A
+    replaced worker drains: it takes no new callers and exits once its calls have ended.
+    Their turn metrics are merged into one MetricsRecorder (VOICE_METRICS_PROM_FILE is
+    written here rather than by the workers).
+    """
+    LAG_MS_PER_SESSION = 20.0 # Loop lag that counts as much as one more active session
+    RESTART_BACKOFF = (1.0, 30.0) # First and longest delay before restarting a crashing worker
+    STABLE_AFTER_S = 60.0 # A worker that lived this long resets the backoff
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, workers: int = None,
+                 max_sessions_per_worker: int = 8, recycle_after: int = 0, report_interval: float = 30.0,
+                 load_interval: float = 1.0, drain_timeout: float = 300.0):
+        self.host = host
+        self.port = port
+        self.worker_count = workers or os.cpu_count() or 1
+        self.max_sessions_per_worker = max_sessions_per_worker
+        self.recycle_after = recycle_after
+        self.report_interval = report_interval
+        self.load_interval = load_interval
+        self.drain_timeout = drain_timeout
+        self.workers = {} # worker_id -> current WorkerHandle
+        self.retired = set() # Draining handles that have been replaced
+        self.metrics = MetricsRecorder(jsonl_path=None, prometheus_path=os.getenv("VOICE_METRICS_PROM_FILE"))
+        self.total_sessions = 0
+        self.busy_rejections = 0
+        self.restarts = 0
+        self._generations = {}
+        self._backoff = {}
+        self._stopping = False
+        self._tasks = set()
+
+    # Worker lifecycle
+    async def _spawn(self, worker_id: int) -> WorkerHandle:
+        parent, child = ControlChannel.pair()
+        env = dict(os.environ)
+        env.pop("VOICE_METRICS_PROM_FILE", None) # Aggregated and written by the supervisor
+        # Provider quotas (GEMINI_RATE_PER_S, ...) are for the whole deployment: split them evenly
+        env["VOICE_QUOTA_SHARE"] = str(float(os.getenv("VOICE_QUOTA_SHARE", "1")) / self.worker_count)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, SERVER_SCRIPT, "--control-fd", str(child.fileno()), "--worker-id", str(worker_id),
+                "--max-sessions", str(self.max_sessions_per_worker), "--report-interval", str(self.load_interval),
+                pass_fds=(child.fileno(),), env=env,
+                start_new_session=True) # Ctrl+C reaches only the supervisor, which drains the workers
+        finally:
+            child.close()
+        generation = self._generations[worker_id] = self._generations.get(worker_id, 0) + 1
+        handle = WorkerHandle(worker_id, generation, process, ControlChannel(parent))
+        self.workers[worker_id] = handle
+        self._start_task(self._monitor(handle))
+        print(f"[Supervisor] Started {handle.name}.")
+        return handle
+
+    def _start_task(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _monitor(self, handle: WorkerHandle):
+        """Applies the worker's messages until its channel closes, then handles its exit."""
+        while True:
+            message, fd = await handle.channel.receive()
+            if fd is not None:
+                os.close(fd)
+            if message is None:
+                break
+            if message["type"] == "ready":
+                handle.ready = True
+                print(f"[Supervisor] {handle.name} ready.")
+            elif message["type"] == "load":
+                self.metrics.merge(message.pop("metrics", {}))
+                handle.update(message)
+        returncode = await handle.process.wait()
+        handle.channel.close()
+        self.retired.discard(handle)
+        if self.workers.get(handle.worker_id) is not handle:
+            print(f"[Supervisor] {handle.name} retired (exit code {returncode}).")
+            return
+        if self._stopping:
+            return
+        # Unexpected exit: its callers are gone, but the slot must come back
+        lifetime = time.monotonic() - handle.started
+        delay = self._backoff.get(handle.worker_id, 0.0)
+        delay = (self.RESTART_BACKOFF[0] if lifetime >= self.STABLE_AFTER_S or not delay
+                 else min(delay * 2, self.RESTART_BACKOFF[1]))
+        self._backoff[handle.worker_id] = delay
+        self.restarts += 1
+        print(f"[Supervisor] {handle.name} exited with code {returncode} after {lifetime:.0f}s "
+              f"({handle.active} active session(s) lost); restarting in {delay:.1f}s.")
+        await asyncio.sleep(delay)
+        if not self._stopping:
+            await self._spawn(handle.worker_id)
+
+    async def _replace(self, handle: WorkerHandle):
+        """Starts a successor for the worker's slot, then drains the old process."""
+        if handle.draining:
+            return
+        handle.draining = True
+        self.retired.add(handle)
+        successor = await self._spawn(handle.worker_id)
+        while not successor.ready and successor.process.returncode is None:
+            await asyncio.sleep(0.05) # Keep the old worker until the new one can take callers
+        print(f"[Supervisor] Draining {handle.name} ({handle.active} active session(s)).")
+        try:
+            await handle.channel.send({"type": "drain"})
+        except OSError:
+            pass # Already gone; _monitor handles the exit
+
+    async def rolling_restart(self):
+        """Replaces every worker, one at a time (e.g. after a deploy)."""
+        for handle in list(self.workers.values()):
+            await self._replace(handle)
+
+    # Placement
+    def _place(self):
+        candidates = [handle for handle in self.workers.values()
+                      if handle.ready and not handle.draining and handle.active < self.max_sessions_per_worker]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda handle: handle.score(self.LAG_MS_PER_SESSION))
+
+    async def _accept_loop(self, listener: socket.socket):
+        loop = asyncio.get_running_loop()
+        while True:
+            connection, _ = await loop.sock_accept(listener)
+            handle = self._place()
+            if handle is None:
+                self.busy_rejections += 1
+                try:
+                    await loop.sock_sendall(connection, encode_event("busy"))
+                except OSError:
+                    pass
+                connection.close()
+                continue
+            try:
+                await handle.channel.send({"type": "session"}, fd=connection.fileno())
+                handle.active += 1
+                handle.assigned += 1
+                self.total_sessions += 1
+            except OSError as e:
+                print(f"[Supervisor] Could not hand a caller to {handle.name}: {e}")
+            finally:
+                connection.close() # The worker holds its own copy of the socket now
+            if self.recycle_after and handle.assigned >= self.recycle_after:
+                self._start_task(self._replace(handle))
+
+    # Reporting
+    def report(self) -> str:
+        handles = sorted(list(self.workers.values()) + list(self.retired), key=lambda h: (h.worker_id, h.generation))
+        lines = [f"[Supervisor] {len(self.workers)} worker(s), "
+                 f"{sum(h.active for h in self.workers.values())} active session(s), {self.total_sessions} placed, "
+                 f"{self.busy_rejections} rejected (all busy), {self.restarts} unexpected restart(s)",
+                 f"[Supervisor] Turn latency (ms), all workers: {self.metrics.summary()}"]
+        lines.extend(f"[Supervisor]   {handle.summary()}" for handle in handles)
+        return "\n".join(lines)
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            print(self.report())
+            if self.metrics.prometheus_path:
+                self.metrics.logger.submit(self.metrics.write_prometheus)
+
+    async def _shutdown(self):
+        self._stopping = True
+        handles = list(self.workers.values()) + list(self.retired)
+        for handle in handles:
+            handle.draining = True
+            try:
+                await handle.channel.send({"type": "drain"})
+            except OSError:
+                pass
+        waits = [handle.process.wait() for handle in handles if handle.process.returncode is None]
+        if waits:
+            print(f"[Supervisor] Waiting up to {self.drain_timeout:.0f}s for "
+                  f"{sum(h.active for h in handles)} session(s) to end.")
+            done, pending = await asyncio.wait([asyncio.ensure_future(w) for w in waits], timeout=self.drain_timeout)
+            for handle in handles:
+                if handle.process.returncode is None:
+                    handle.process.kill()
+            if pending:
+                await asyncio.wait(pending)
+        await asyncio.sleep(0.1) # Let the monitors apply the workers' last load reports
+
+    async def serve(self):
+        listener = socket.create_server((self.host, self.port), reuse_port=False)
+        listener.setblocking(False)
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        loop.add_signal_handler(signal.SIGHUP, lambda: self._start_task(self.rolling_restart()))
+
+        for worker_id in range(1, self.worker_count + 1):
+            await self._spawn(worker_id)
+        accept = loop.create_task(self._accept_loop(listener))
+        reporter = loop.create_task(self._report_loop())
+        print(f"[Supervisor] Listening on {self.host}:{self.port} with {self.worker_count} worker(s) "
+              f"of up to {self.max_sessions_per_worker} session(s) each.")
+        try:
+            await stop.wait()
+        finally:
+            accept.cancel()
+            reporter.cancel()
+            listener.close()
+            print("[Supervisor] Shutting down: draining workers.")
+            await self._shutdown()
+            print(self.report())
+            if self.metrics.prometheus_path:
+                self.metrics.write_prometheus()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve voice agent sessions from several worker processes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--max-sessions-per-worker", type=int, default=8)
+    parser.add_argument("--recycle-after", type=int, default=0,
+                        help="Replace a worker after it has been given this many sessions (0 = never)")
+    parser.add_argument("--report-interval", type=float, default=30.0)
+    parser.add_argument("--drain-timeout", type=float, default=300.0,
+                        help="On shutdown, seconds to wait for calls in progress before killing workers")
+    args = parser.parse_args()
+
+    supervisor = SessionSupervisor(args.host, args.port, args.workers, args.max_sessions_per_worker,
+                                   args.recycle_after, args.report_interval, drain_timeout=args.drain_timeout)
+    asyncio.run(supervisor.serve())
+    print("[Supervisor] Stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import asyncio
+import collections
+import re
+import time
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s']")
+
+def normalize_transcript(text: str) -> str:
+    """Case, punctuation and spacing differences between interim and final transcripts don't count."""
+    return " ".join(_PUNCTUATION_RE.sub(" ", text.lower()).split())
+
+
+# --- One LLM generation started before the user's turn was final ---
+class SpeculativeRun:
+    """
+    Collects the output of a generation started on a stable interim transcript.
+    Nothing reaches TTS until commit(); after that, buffered items are replayed in
+    order and later ones are forwarded directly. Discarding is just cancelling `task`.
+    """
+    def __init__(self, text: str, llm_to_tts_queue):
+        self.text = text
+        self.key = normalize_transcript(text)
+        self.started = time.perf_counter()
+        self.task = None
+        self.turn = None
+        self._queue = llm_to_tts_queue
+        self._buffer = []
+        self._committed = False
+        self.marks = {} # Timeline marks made before the run belonged to a turn
+        self._lock = asyncio.Lock() # Keeps buffered and live items in order during commit()
+
+    def matches(self, final_text: str) -> bool:
+        return self.key == normalize_transcript(final_text)
+
+    async def emit(self, item: dict):
+        async with self._lock:
+            if self._committed:
+                item["turn"] = self.turn
+                await self._queue.put_async(item)
+            else:
+                self._buffer.append(item)
+
+    def mark(self, name: str):
+        """Timeline mark for the turn this run is (or will be) committed to."""
+        if self.turn is not None:
+            self.turn.timeline.mark(name)
+        elif name not in self.marks:
+            self.marks[name] = time.perf_counter()
+
+    async def commit(self, turn):
+        """Adopts the run as the real response for `turn` and releases its output to TTS."""
+        async with self._lock:
+            self.turn = turn
+            turn.timeline.adopt(self.marks)
+            for item in self._buffer:
+                item["turn"] = turn
+                await self._queue.put_async(item)
+            self._buffer.clear()
+            self._committed = True
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+# --- Hit rate and head start of speculative generations ---
+class SpeculationStats:
+    def __init__(self, max_samples: int = 1000):
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = collections.deque(maxlen=max_samples)
+
+    def record_hit(self, saved_ms: float):
+        self.hits += 1
+        self.saved_ms.append(saved_ms)
+
+    def record_miss(self):
+        self.misses += 1
+
+    def summary(self) -> str:
+        decided = self.hits + self.misses
+        hit_rate = self.hits / decided * 100 if decided else 0.0
+        saved = sorted(self.saved_ms)
+        saved_text = f", median head start {saved[len(saved) // 2]:.0f}ms" if saved else ""
+        return (f"{self.started} started, {self.hits} hit(s), {self.misses} miss(es), "
+                f"hit rate {hit_rate:.0f}%{saved_text}")
@@ -1,5 +1,4 @@
 import asyncio
-import os
 import threading
 import queue # For thread-safe queues
 
@@ -10,6 +9,14 @@ from deepgram import (
     Microphone,
 )
 
+from call_scheduler import INTERACTIVE, CallScheduler, limit_from_env
+from event_runtime import AwaitableEvent, HandoffQueue, QueueClosed
+from metrics import console
+from stt_connection import SupervisedLiveConnection
+from turn_control import TurnController
+from uplink_gate import UplinkGate
+from vad import VoiceActivityDetector
+
 # --- Helper Class for Transcript Collection ---
 class TranscriptCollector:
     def __init__(self):
@@ -26,13 +33,27 @@ class TranscriptCollector:
     def get_full_transcript(self):
         return ' '.join(self.transcript_parts)
 
+    def get_with_interim(self, interim: str):
+        """Finalized parts plus the current (still changing) interim text."""
+        if interim.strip():
+            return ' '.join(self.transcript_parts + [interim])
+        return self.get_full_transcript()
+
 # --- Component 1: Speech-to-Text (STT) using Deepgram ---
 class STTListener:
-    def __init__(self, stt_to_llm_queue: queue.Queue,
+    DG_CONNECT_RATE_PER_S = limit_from_env("DEEPGRAM_CONNECT_RATE_PER_S", "5") # Connection opens; 0 = unlimited
+
+    def __init__(self, stt_to_llm_queue: HandoffQueue,
                  user_speaking_event: threading.Event,
                  interrupt_bot_event: threading.Event,
                  bot_speaking_event: threading.Event,
-                 exit_event: threading.Event):
+                 exit_event: AwaitableEvent,
+                 deepgram_client: DeepgramClient = None,
+                 audio_source_factory=None,
+                 turn_controller: TurnController = None,
+                 echo_canceller=None,
+                 recorder=None,
+                 connect_scheduler: CallScheduler = None):
         
         self.stt_to_llm_queue = stt_to_llm_queue
         self.user_speaking_event = user_speaking_event
@@ -40,12 +61,59 @@ class STTListener:
         self.bot_speaking_event = bot_speaking_event
         self.exit_event = exit_event
         self.transcript_collector = TranscriptCollector() # Each listener has its own collector
+        # Shared client and a non-microphone audio source, for serving remote callers
+        self.deepgram_client = deepgram_client
+        self.audio_source_factory = audio_source_factory if audio_source_factory is not None else (
+            lambda push_callback: Microphone(push_callback, chunk=self.MIC_CHUNK_SAMPLES))
+        # Receives the first-interim and speech_final marks of the next turn's timeline
+        self.turn_controller = turn_controller
+        # Optional SessionRecorder: microphone frames and transcript results, for replay
+        self.recorder = recorder
+        # Paces connection opens against Deepgram's quota; a session server shares one, so that
+        # every session reconnecting after an outage does not hit Deepgram at the same instant
+        self.connect_scheduler = connect_scheduler if connect_scheduler is not None else CallScheduler(
+            "deepgram", self.DG_CONNECT_RATE_PER_S,
+            metrics=turn_controller.metrics if turn_controller is not None else None)
 
         # Deepgram audio parameters (must match Microphone and LiveOptions)
         self.DG_ENCODING = "linear16"
         self.DG_CHANNELS = 1
         self.DG_SAMPLE_RATE = 16000
         self.DG_ENDPOINTING_MS = 300 # Time in milliseconds Deepgram waits for silence
+        self.MIC_CHUNK_SAMPLES = 320 # 20 ms per microphone callback, so local VAD reacts within tens of ms
+
+        # Local voice activity detection on every frame before it is sent: barge-in on speech
+        # onset instead of the first transcript, and an adaptive end-of-turn that asks Deepgram
+        # to finalize early. Disabled (Deepgram endpointing only) if NumPy is unavailable.
+        self.LOCAL_VAD_ENABLED = True
+        self.vad = self._create_vad() if self.LOCAL_VAD_ENABLED else None
+        self._dg_connection = None # SupervisedLiveConnection: reconnects and replays unfinalized audio
+        self.DG_REPLAY_MS = 10000 # Mic audio kept for replay after a dropped connection
+        self.DG_STALL_TIMEOUT_S = 2.0 # Audio sent without any result for this long means a stalled socket
+        self._local_endpoint = False # Set when local VAD ended the turn and a final result is due
+        self.vad_barge_ins = 0
+        self.vad_endpoints = 0
+
+        # Optional EchoCanceller (fed with what the speaker plays) applied before VAD, so the
+        # bot's own voice does not read as a barge-in. A second detector runs on the raw mic
+        # audio only to count the barge-ins echo would have caused.
+        self.echo_canceller = echo_canceller
+        self._raw_vad = self._create_vad() if self.vad is not None and echo_canceller is not None else None
+        self.raw_vad_barge_ins = 0
+        self._unconfirmed_barge_in = False # A barge-in that no transcript has backed up yet
+        self.false_interrupts = 0
+
+        # With local VAD, silence is not streamed to Deepgram: keep-alives are sent instead,
+        # and a short pre-roll is replayed when speech starts
+        self.UPLINK_GATING_ENABLED = True
+        self.uplink = None
+
+        # Speculative LLM start: if the interim transcript stays unchanged this long, the LLM
+        # starts generating (without speaking) before speech_final arrives. None disables it.
+        self.SPECULATION_STABLE_MS = 200
+        self.SPECULATION_MIN_WORDS = 2
+        self._last_interim = ""
+        self._speculation_timer = None
 
     # # Deepgram's on_message callback. `dg_connection_instance` is the first arg from SDK.
     # async def on_message(self, dg_connection_instance, result, **kwargs):
@@ -95,6 +163,8 @@ class STTListener:
 
     async def on_message(self, dg_connection_instance, result, **kwargs):
         sentence = result.channel.alternatives[0].transcript        
+        if self.recorder is not None:
+            self.recorder.transcript(sentence, result.is_final, result.speech_final)
 
         # -------- Interruption Logic (User speaking while bot is active) --------
         # If user speaks anything, set the user_speaking_event
@@ -102,94 +172,246 @@ class STTListener:
             if not self.user_speaking_event.is_set():
                 # This is the first time we detect user speech in this segment
                 self.user_speaking_event.set() # Signal that user is speaking
+            if self.turn_controller is not None:
+                self.turn_controller.mark_upcoming("first_interim")
 
             # If the bot is currently speaking AND user starts speaking, signal interruption
             if self.bot_speaking_event.is_set():
                 if not self.interrupt_bot_event.is_set(): # Avoid redundant signals
-                    print("\n[Interrupt] User detected speaking while bot is talking. Signaling bot to stop.")
                     self.interrupt_bot_event.set() # Signal TTS thread to stop immediately
+                    # Console output happens off this thread, after the interruption is signalled
+                    console.print("\n[Interrupt] User detected speaking while bot is talking. Signaling bot to stop.")
                     # Important: If the bot is interrupted, clear the interim print line.
                     # This makes the console cleaner when the bot stops talking abruptly.
-                    print(" " * os.get_terminal_size().columns, end='\r')
+                    console.clear_line()
 
 
         # --- Transcript Collection Logic ---
         # Deepgram's `speech_final` means this segment is final.
         # This typically aligns with SpeechFinal due to endpointing.
-        if result.speech_final: 
+        if result.speech_final or (self._local_endpoint and result.is_final):
+            self._local_endpoint = False
             self.transcript_collector.add_part(sentence)
             full_sentence = self.transcript_collector.get_full_transcript()
+            self._reset_speculation()
             
             # Clear user_speaking_event as this utterance is finalized (implies a pause after this segment)
             if self.user_speaking_event.is_set():
                 self.user_speaking_event.clear()
 
             if full_sentence.strip(): # Only process non-empty sentences
+                self._unconfirmed_barge_in = False
+                if self.turn_controller is not None:
+                    self.turn_controller.mark_upcoming("speech_final")
                 print(f"\nUser: {full_sentence}") # Print final user utterance on a new line
-                try:
-                    # Put the full sentence in the queue for the LLM
-                    # This will block if queue is full, consider put_nowait with error handling
-                    # The queue maxsize is 1, so put_nowait is probably better here.
-                    self.stt_to_llm_queue.put_nowait(full_sentence) 
-                except queue.Full:
-                    print("[STT] LLM queue is full, skipping sentence.")
+                self._send_final_sentence(full_sentence)
+            else:
+                if self._unconfirmed_barge_in: # The bot was stopped by something that was not speech
+                    self._unconfirmed_barge_in = False
+                    self.false_interrupts += 1
+                if self.turn_controller is not None:
+                    self.turn_controller.discard_upcoming() # Noise that never became a sentence
             
             self.transcript_collector.reset() # Reset for the next utterance
         else:
-            # Interim results, continue collecting
-            self.transcript_collector.add_part(sentence)
+            # Only finalized segments are collected; an interim result is replaced by the next one
+            if result.is_final:
+                self.transcript_collector.add_part(sentence)
+                current_text = self.transcript_collector.get_full_transcript()
+            else:
+                current_text = self.transcript_collector.get_with_interim(sentence)
+            self._track_interim(current_text)
             # Only print interim results if bot is not speaking, to avoid clutter/conflicts
             if not self.bot_speaking_event.is_set():
                 # Clear the line and print new interim result
-                print(f"Interim: {self.transcript_collector.get_full_transcript()}", end='\r')
+                console.print(f"Interim: {current_text}", end='\r')
             # If the bot is speaking, interim results will be ignored on console,
             # but they still contribute to the user_speaking_event and interruption logic.
 
+    def _send_final_sentence(self, full_sentence: str):
+        """Hands a finished utterance to the LLM, replacing a queued speculation request if needed."""
+        try:
+            # The queue maxsize is 1, so put_nowait is used to never block here.
+            self.stt_to_llm_queue.put_nowait(full_sentence) 
+        except queue.Full:
+            pending = self.stt_to_llm_queue.drain()
+            sentences = [item for item in pending if isinstance(item, str)]
+            if sentences:
+                for item in sentences:
+                    self.stt_to_llm_queue.put_nowait(item)
+                print("[STT] LLM queue is full, skipping sentence.")
+            else:
+                self.stt_to_llm_queue.put_nowait(full_sentence) # Only a stale speculation was waiting
+
+    def _track_interim(self, text: str):
+        """(Re)starts the stability timer whenever the interim transcript changes."""
+        text = text.strip()
+        if self.SPECULATION_STABLE_MS is None or text == self._last_interim:
+            return
+        self._last_interim = text
+        if self._speculation_timer is not None:
+            self._speculation_timer.cancel()
+            self._speculation_timer = None
+        if self.bot_speaking_event.is_set() or len(text.split()) < self.SPECULATION_MIN_WORDS:
+            return
+        loop = asyncio.get_running_loop()
+        self._speculation_timer = loop.call_later(self.SPECULATION_STABLE_MS / 1000,
+                                                  self._request_speculation, text)
+
+    def _request_speculation(self, text: str):
+        self._speculation_timer = None
+        try:
+            self.stt_to_llm_queue.put_nowait({"type": "speculate", "text": text})
+        except (queue.Full, QueueClosed):
+            pass # The LLM is busy; speculation is only an optimization
+
+    def _reset_speculation(self):
+        self._last_interim = ""
+        if self._speculation_timer is not None:
+            self._speculation_timer.cancel()
+            self._speculation_timer = None
+
+    def _create_vad(self):
+        try:
+            return VoiceActivityDetector(self.DG_SAMPLE_RATE)
+        except RuntimeError as e:
+            print(f"[STT] Local VAD disabled: {e}")
+            return None
+
+    async def _send_frame(self, data):
+        """Audio source callback: removes echo, runs local VAD on the frame, then sends it to Deepgram."""
+        if self.recorder is not None:
+            self.recorder.mic_frame(data) # Before echo removal, so a replay reprocesses it exactly
+        if self.echo_canceller is not None:
+            raw = data
+            data = self.echo_canceller.process(data)
+            if self._raw_vad is not None:
+                bot_speaking = self.bot_speaking_event.is_set()
+                for event, _ in self._raw_vad.process(raw, strict=bot_speaking):
+                    if event == "speech_start" and bot_speaking:
+                        self.raw_vad_barge_ins += 1
+            if not data:
+                return
+        if self.vad is not None:
+            # While the bot talks, its own voice may reach the mic, so onset needs more evidence
+            for event, _ in self.vad.process(data, strict=self.bot_speaking_event.is_set()):
+                if event == "speech_start":
+                    self._on_local_speech_start()
+                else:
+                    await self._on_local_speech_end()
+        if self.uplink is not None:
+            await self.uplink.push(data, self.vad.speaking)
+        else:
+            await self._dg_connection.send(data)
+
+    def _on_local_speech_start(self):
+        self._local_endpoint = False
+        self.user_speaking_event.set()
+        if self.bot_speaking_event.is_set() and not self.interrupt_bot_event.is_set():
+            self.interrupt_bot_event.set() # Barge-in without waiting for a transcript
+            self.vad_barge_ins += 1
+            if self._unconfirmed_barge_in: # The previous one never produced a sentence either
+                self.false_interrupts += 1
+            self._unconfirmed_barge_in = True
+            console.print("\n[VAD] Speech onset while the bot is talking. Signaling bot to stop.")
+
+    async def _on_local_speech_end(self):
+        """Local end of turn: ask Deepgram to finalize now rather than wait for its endpointing."""
+        self._local_endpoint = True
+        self.vad_endpoints += 1
+        finalize = getattr(self._dg_connection, "finalize", None)
+        if finalize is not None:
+            try:
+                await finalize()
+            except Exception as e:
+                print(f"[STT] Finalize request failed: {e}")
+
     async def on_error(self, dg_connection_instance, error, **kwargs):
         print(f"\n\n[Deepgram STT] Error: {error}\n\n")
 
-    async def listen_and_transcribe(self):
+    async def connect(self):
         """
-        Runs the Deepgram STT listening loop in an asyncio event loop.
-        This function is designed to be run in a separate thread.
+        Opens the Deepgram socket (idempotent). Called during startup so the handshake
+        overlaps the other components' warm-up instead of running after it. If it cannot
+        be opened, or drops later, the connection keeps reconnecting in the background and
+        the audio captured meanwhile is replayed, so STT never stays dead.
         """
-        try:
-            # Deepgram client (API key automatically picked from DEEPGRAM_API_KEY env var)
-            deepgram: DeepgramClient = DeepgramClient() # Uses env var
+        if self._dg_connection is not None:
+            return self._dg_connection
+        # Deepgram client (API key automatically picked from DEEPGRAM_API_KEY env var)
+        if self.deepgram_client is None:
+            self.deepgram_client = DeepgramClient() # Uses env var
 
-            dg_connection = deepgram.listen.asynclive.v("1")
+        dg_connection = SupervisedLiveConnection(self._open_deepgram, self.on_message,
+                                                 sample_rate=self.DG_SAMPLE_RATE, replay_ms=self.DG_REPLAY_MS,
+                                                 stall_timeout_s=self.DG_STALL_TIMEOUT_S, recorder=self.recorder)
+        self._dg_connection = dg_connection
+        await dg_connection.start()
+        if self.vad is not None and self.UPLINK_GATING_ENABLED:
+            self.uplink = UplinkGate(dg_connection.send, dg_connection.keep_alive,
+                                     sample_rate=self.DG_SAMPLE_RATE)
+        return dg_connection
 
-            dg_connection.on(LiveTranscriptionEvents.Transcript, self.on_message)
-            dg_connection.on(LiveTranscriptionEvents.Error, self.on_error)
+    async def _open_deepgram(self, on_message, on_closed):
+        """Opens and starts one Deepgram live connection (SupervisedLiveConnection's open_fn)."""
+        dg_connection = self.deepgram_client.listen.asynclive.v("1")
 
-            options = LiveOptions(
-                model="nova-2",
-                punctuate=True,
-                language="en-IN",
-                encoding=self.DG_ENCODING,
-                channels=self.DG_CHANNELS,
-                sample_rate=self.DG_SAMPLE_RATE,
-                interim_results=True, # Get interim results
-                # Endpointing is crucial for detecting end of user's turn
-                endpointing=self.DG_ENDPOINTING_MS # Time in milliseconds Deepgram waits for silence
-            )
+        dg_connection.on(LiveTranscriptionEvents.Transcript, on_message)
+        dg_connection.on(LiveTranscriptionEvents.Error, self.on_error)
+        dg_connection.on(LiveTranscriptionEvents.Error, on_closed)
+        dg_connection.on(LiveTranscriptionEvents.Close, on_closed)
 
-            await dg_connection.start(options)
-            microphone = Microphone(dg_connection.send)
+        options = LiveOptions(
+            model="nova-2",
+            punctuate=True,
+            language="en-IN",
+            encoding=self.DG_ENCODING,
+            channels=self.DG_CHANNELS,
+            sample_rate=self.DG_SAMPLE_RATE,
+            interim_results=True, # Get interim results
+            # Endpointing is crucial for detecting end of user's turn
+            endpointing=self.DG_ENDPOINTING_MS # Time in milliseconds Deepgram waits for silence
+        )
+
+        with await self.connect_scheduler.acquire_async(INTERACTIVE):
+            started = await dg_connection.start(options)
+        if started is False: # The SDK reports a failed handshake this way
+            raise ConnectionError("Deepgram did not accept the connection")
+        return dg_connection
+
+    async def listen_and_transcribe(self):
+        """
+        Runs the Deepgram STT listening loop in an asyncio event loop.
+        This function is designed to be run in a separate thread.
+        """
+        try:
+            dg_connection = await self.connect()
+            # Any object with start()/finish() that pushes 16 kHz linear16 frames to the callback
+            microphone = self.audio_source_factory(self._send_frame)
 
             print("[STT] Microphone starting...")
             microphone.start()
             print("[STT] Microphone active. Speak now.")
 
             # Keep microphone active until exit_event is set
-            while microphone.is_active() and not self.exit_event.is_set():
-                # It's important to await asyncio.sleep to yield control
-                # This allows other tasks in this thread's asyncio loop (like on_message) to run
-                await asyncio.sleep(0.1) 
+            # Awaiting the event yields to other tasks on the loop (like on_message) without polling
+            await self.exit_event.wait_async()
 
             microphone.finish()
             await dg_connection.finish()
             print("[STT] Microphone / Deepgram STT finished.")
+            print(f"[STT] Deepgram connection: {dg_connection.summary()}")
+            if self.connect_scheduler.limited:
+                print(f"[STT] Deepgram connects: {self.connect_scheduler.summary()}")
+            if self.vad is not None:
+                print(f"[STT] Local VAD: {self.vad_barge_ins} barge-in(s), {self.vad_endpoints} endpoint(s), "
+                      f"end-of-turn silence now {self.vad.endpointer.current_ms:.0f}ms")
+            if self.uplink is not None:
+                print(f"[STT] Uplink: {self.uplink.summary()}")
+            if self.echo_canceller is not None:
+                print(f"[STT] Echo suppression: {self.echo_canceller.summary()}; barge-ins on the raw mic "
+                      f"{self.raw_vad_barge_ins}, after suppression {self.vad_barge_ins}; "
+                      f"{self.false_interrupts} false interrupt(s)")
 
         except Exception as e:
             print(f"[STT] Could not open socket or STT error: {e}")
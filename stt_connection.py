@@ -0,0 +1,379 @@
+import asyncio
+import collections
+import random
+import threading
+import time
+
+from metrics import distribution
+from uplink_gate import PrerollRing
+
+# --- Audio sent upstream, addressable by stream offset ---
+class SentAudioRing(PrerollRing):
+    """
+    PrerollRing that also counts every byte ever written, so the audio it still holds
+    can be found by absolute offset in the stream (for replay after a reconnect).
+    """
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self.written = 0
+
+    def write(self, data):
+        super().write(data)
+        self.written += len(data)
+
+    @property
+    def oldest(self) -> int:
+        """Offset of the oldest byte still held."""
+        return self.written - len(self)
+
+    def views_from(self, offset: int) -> list:
+        """Memoryviews of the held audio from `offset` (clamped to what is held) to the newest byte."""
+        skip = max(0, offset - self.oldest)
+        views = []
+        for view in self.views():
+            if skip >= len(view):
+                skip -= len(view)
+                continue
+            views.append(view[skip:])
+            skip = 0
+        return views
+
+
+# --- A Deepgram live connection that reconnects by itself ---
+class SupervisedLiveConnection:
+    """
+    Stands in for a Deepgram live connection (send / keep_alive / finalize / finish) and
+    survives its drops. Every frame sent is written to a ring of recent audio first. A
+    close or error event, a refused send, or a stall (audio flowing but no result for
+    `stall_timeout_s`) ends the connection, and a new one is opened with exponential
+    backoff. The new connection is first fed the audio that the old one had not
+    finalized yet (from the end of its last final result, as far back as the ring
+    reaches), then the frames captured while reconnecting, so the utterance in progress
+    is transcribed whole. Reconnecting always happens on the loop start() ran on, even
+    when the drop is noticed by a send() from another loop or thread.
+
+    Args:
+        open_fn: Coroutine function open_fn(on_message, on_closed) that opens and starts one
+            connection, registering the two handlers for its results and its close/error
+            events. Raises (or returns None) if the connection could not be opened.
+        on_message: Coroutine function (connection, result, **kwargs) for results of the
+            current connection; results of a connection already given up on are dropped.
+        replay_ms (int): Audio kept for replay.
+        stall_timeout_s (float): Silence from the server, while audio is sent, that counts as a stall.
+        backoff (tuple): First and longest wait between failed connection attempts.
+    """
+    FRAME_MS = 20 # For reporting replayed audio in microphone frames
+
+    def __init__(self, open_fn, on_message, sample_rate: int = 16000, replay_ms: int = 10000,
+                 stall_timeout_s: float = 2.0, backoff: tuple = (0.1, 5.0), recorder=None):
+        self.open_fn = open_fn
+        self.on_message = on_message
+        self.bytes_per_s = sample_rate * 2
+        self.stall_timeout_s = stall_timeout_s
+        self.backoff = backoff
+        self.recorder = recorder
+        self.ring = SentAudioRing(int(replay_ms * self.bytes_per_s / 1000))
+        # send() runs on the microphone's thread: writes to the ring, the _live check and the
+        # catch-up's last look at the ring happen under this lock, so no frame falls in between
+        self._ring_lock = threading.Lock()
+        self.connection = None
+        self._generation = 0
+        self._live = False # Frames go straight to the connection
+        self._origin = 0 # Stream offset at which the current connection's audio starts
+        self._committed = 0 # Stream offset up to which results are final
+        self._last_message = time.monotonic()
+        self._sent_since_message = 0
+        self._lost_at = None
+        self._loop = None # The loop start() ran on; reconnects run there whoever noticed the drop
+        self._reconnect_task = None
+        self._watchdog_task = None
+        self._closing = False
+        # Exposed statistics
+        self.drops = collections.Counter() # reason -> count
+        self.reconnects = 0
+        self.failed_attempts = 0
+        self.recovery_ms = []
+        self.replayed_bytes = 0
+        self.lost_bytes = 0 # Unfinalized audio that had already left the ring
+
+    @property
+    def connected(self) -> bool:
+        return self._live
+
+    async def start(self) -> bool:
+        """Opens the first connection. On failure it keeps retrying in the background; audio is buffered meanwhile."""
+        self._loop = asyncio.get_running_loop()
+        self._watchdog_task = self._loop.create_task(self._watch())
+        if await self._attempt():
+            return True
+        self._lost("connect failed")
+        return False
+
+    async def send(self, data):
+        with self._ring_lock:
+            self.ring.write(data)
+            live = self._live
+        if not live:
+            return # Sent by the replay once a connection is back
+        try:
+            result = await self.connection.send(data)
+        except Exception as e:
+            self._lost(f"send failed: {e}")
+            return
+        if result is False: # The SDK reports a closed socket this way
+            self._lost("send refused")
+            return
+        self._sent_since_message += len(data)
+
+    async def keep_alive(self):
+        if self._live:
+            keep_alive = getattr(self.connection, "keep_alive", None)
+            if keep_alive is not None:
+                await keep_alive()
+
+    async def finalize(self):
+        if self._live:
+            finalize = getattr(self.connection, "finalize", None)
+            if finalize is not None:
+                await finalize()
+
+    async def finish(self):
+        self._closing = True
+        for task in (self._watchdog_task, self._reconnect_task):
+            if task is not None:
+                task.cancel()
+        self._live = False
+        if self.connection is not None:
+            await self._close_quietly(self.connection)
+
+    # --- Connection lifecycle ---
+    def _handlers(self, generation: int):
+        async def on_message(connection, result, **kwargs):
+            if generation != self._generation:
+                return # Late result from a connection that was replaced
+            self._on_result(result)
+            await self.on_message(connection, result, **kwargs)
+
+        async def on_closed(connection, *args, **kwargs):
+            if generation == self._generation and not self._closing:
+                error = kwargs.get("error", args[0] if args else None)
+                self._lost(f"closed ({error})" if error else "closed")
+        return on_message, on_closed
+
+    async def _attempt(self) -> bool:
+        """Opens a connection and brings it up to date with the buffered audio."""
+        self._generation += 1
+        generation = self._generation
+        try:
+            connection = await self.open_fn(*self._handlers(generation))
+        except Exception as e:
+            print(f"[STT] Could not open the Deepgram connection: {e}")
+            connection = None
+        if connection is None:
+            return False
+        self.connection = connection
+        self._last_message = time.monotonic()
+        self._sent_since_message = 0
+        if not await self._catch_up(connection, generation):
+            await self._close_quietly(connection)
+            return False
+        return True
+
+    async def _catch_up(self, connection, generation: int) -> bool:
+        """Replays the audio the connection has to hear, then lets send() use it directly."""
+        with self._ring_lock:
+            # The new connection's audio starts at the end of the last final result
+            start = max(self._committed, self.ring.oldest)
+        self.lost_bytes += start - self._committed
+        self._origin = self._committed = start
+        offset = start
+        while True:
+            with self._ring_lock: # Frames keep arriving while the replay is awaited
+                if offset >= self.ring.written:
+                    if generation != self._generation:
+                        return False
+                    self._live = True # From here on send() forwards every frame itself
+                    break
+                pending = [bytes(view) for view in self.ring.views_from(offset)]
+            for chunk in pending:
+                try:
+                    if await connection.send(chunk) is False:
+                        return False
+                except Exception:
+                    return False
+                offset += len(chunk)
+                if generation != self._generation:
+                    return False # Dropped during the replay
+        self.replayed_bytes += offset - start
+        self._sent_since_message = offset - start
+        return True
+
+    def _lost(self, reason: str):
+        """The current connection is unusable: stop sending to it and reconnect in the background."""
+        try:
+            on_own_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_own_loop = False
+        if not on_own_loop: # e.g. send() from the microphone's loop, or an SDK thread's event
+            try:
+                self._loop.call_soon_threadsafe(self._lost, reason)
+            except RuntimeError:
+                pass # That loop is closed: the session is over
+            return
+        if self._closing or (self._reconnect_task is not None and not self._reconnect_task.done()):
+            return
+        self._live = False
+        self._generation += 1 # Its late results and events are ignored from now on
+        self._lost_at = time.monotonic()
+        self.drops[reason.split(" (")[0].split(":")[0]] += 1
+        print(f"[STT] Deepgram connection lost: {reason}. Reconnecting...")
+        old = self.connection
+        if old is not None:
+            self._loop.create_task(self._close_quietly(old))
+        self._reconnect_task = self._loop.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = self.backoff[0]
+        while not self._closing:
+            if await self._attempt():
+                break
+            self.failed_attempts += 1
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(self.backoff[1], delay * 2)
+        else:
+            return
+        recovery_ms = (time.monotonic() - self._lost_at) * 1000
+        self.recovery_ms.append(recovery_ms)
+        self.reconnects += 1
+        replayed_ms = (self.ring.written - self._origin) * 1000 / self.bytes_per_s
+        print(f"[STT] Deepgram reconnected after {recovery_ms:.0f}ms; replayed {replayed_ms:.0f}ms of audio.")
+        if self.recorder is not None:
+            self.recorder.event("stt_reconnect", recovery_ms=round(recovery_ms, 1), replayed_ms=round(replayed_ms))
+
+    async def _close_quietly(self, connection):
+        try:
+            await asyncio.wait_for(connection.finish(), timeout=2.0)
+        except Exception:
+            pass
+
+    def _on_result(self, result):
+        self._last_message = time.monotonic()
+        self._sent_since_message = 0
+        if not getattr(result, "is_final", False):
+            return
+        start, duration = getattr(result, "start", None), getattr(result, "duration", None)
+        if isinstance(start, (int, float)) and isinstance(duration, (int, float)):
+            end = self._origin + int((start + duration) * self.bytes_per_s) // 2 * 2
+        else:
+            end = self.ring.written # No timing: everything sent so far is accounted for
+        self._committed = max(self._committed, min(end, self.ring.written))
+
+    async def _watch(self):
+        """Declares a stall when audio keeps going out but nothing comes back."""
+        stall_bytes = int(self.stall_timeout_s * self.bytes_per_s)
+        while True:
+            await asyncio.sleep(self.stall_timeout_s / 4)
+            if (self._live and self._sent_since_message >= stall_bytes
+                    and time.monotonic() - self._last_message >= self.stall_timeout_s):
+                self._lost("stalled")
+
+    def summary(self) -> str:
+        if not self.drops:
+            return "no drops"
+        frames = self.replayed_bytes * 1000 // self.bytes_per_s // self.FRAME_MS
+        recovery = distribution(self.recovery_ms)
+        return (f"{sum(self.drops.values())} drop(s) {dict(self.drops)}, {self.reconnects} reconnect(s) "
+                f"({self.failed_attempts} failed attempt(s)), recovery ms {recovery}, "
+                f"{frames} frame(s) replayed, {self.lost_bytes * 1000 // self.bytes_per_s}ms beyond the replay buffer")
+
+
+# --- Self-check against fakes.FakeDeepgramLiveServer: python stt_connection.py ---
+class _WebSocketLiveConnection:
+    """
+    Just enough of Deepgram's live protocol over a plain websocket (`websockets` package)
+    to drive SupervisedLiveConnection against the local stand-in without the SDK.
+    """
+    def __init__(self, url: str):
+        self.url = url
+        self.websocket = None
+        self._reader = None
+
+    async def start(self, on_message, on_closed):
+        import json
+        from types import SimpleNamespace
+        import websockets
+
+        self.websocket = await websockets.connect(self.url)
+
+        async def read():
+            try:
+                async for message in self.websocket:
+                    data = json.loads(message)
+                    result = SimpleNamespace(
+                        channel=SimpleNamespace(alternatives=[SimpleNamespace(**data["channel"]["alternatives"][0])]),
+                        is_final=data["is_final"], speech_final=data["speech_final"],
+                        start=data["start"], duration=data["duration"])
+                    await on_message(self, result)
+            except Exception:
+                pass
+            await on_closed(self, "connection closed")
+        self._reader = asyncio.get_running_loop().create_task(read())
+        return self
+
+    async def send(self, data):
+        try:
+            await self.websocket.send(bytes(data))
+        except Exception:
+            return False
+
+    async def finalize(self):
+        await self.websocket.send('{"type": "Finalize"}')
+
+    async def finish(self):
+        self._reader.cancel()
+        await self.websocket.close()
+
+
+async def _drive(port: int, lines: list, drop_label: str):
+    import array
+    speech = array.array("h", [6000, -6000] * 160).tobytes() # Loud 20ms frames: speech to the stand-in
+    silence = bytes(640)
+    finals = []
+
+    async def on_message(connection, result, **kwargs):
+        if result.speech_final:
+            finals.append(result.channel.alternatives[0].transcript)
+
+    async def open_fn(on_message_handler, on_closed):
+        return await _WebSocketLiveConnection(f"ws://127.0.0.1:{port}").start(on_message_handler, on_closed)
+
+    supervised = SupervisedLiveConnection(open_fn, on_message, stall_timeout_s=1.0, backoff=(0.05, 1.0))
+    await supervised.start()
+    loop = asyncio.get_running_loop()
+    next_due = loop.time()
+    for line in lines:
+        for frame in [speech] * (len(line.split()) * 10 + 10) + [silence] * 40:
+            await supervised.send(frame)
+            next_due += 0.02
+            await asyncio.sleep(max(0.0, next_due - loop.time()))
+    deadline = loop.time() + 5
+    while len(finals) < len(lines) and loop.time() < deadline:
+        await supervised.send(silence)
+        await asyncio.sleep(0.02)
+    await supervised.finish()
+    print(f"[STT self-check] {drop_label}: {supervised.summary()}")
+    assert finals == lines, f"transcripts {finals} != script {lines}"
+    assert supervised.reconnects >= 1, "the stand-in never dropped the connection"
+
+
+def _run_self_check():
+    from fakes import FakeDeepgramLiveServer
+    lines = ["what is the weather like today", "and what about tomorrow morning", "thanks that is all"]
+    for mode in ("close", "stall"):
+        server = FakeDeepgramLiveServer(lines, word_ms=60, endpointing_ms=300, drop_after_s=1.5, drop_mode=mode)
+        asyncio.run(_drive(server.start(), lines, f"drop mode {mode!r}"))
+    print("[STT self-check] every utterance transcribed exactly once across drops. OK")
+
+
+if __name__ == "__main__":
+    _run_self_check()
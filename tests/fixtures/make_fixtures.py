@@ -0,0 +1,109 @@
+"""
+Regenerates the WAV fixtures used by the tests: python tests/fixtures/make_fixtures.py
+
+The audio is synthetic (vad._synthetic_speech and seeded noise), so the files are
+reproducible; they are checked in so the tests run on fixed audio.
+
+Two fixtures are real recordings instead, converted from third-party test data:
+  recorded_speech.wav  "go forward ten meters" (goforward.raw from the CMU PocketSphinx
+                       test data, BSD licence): one speaker, close microphone, with the
+                       DC offset and low-frequency rumble of a real input.
+  recorded_room.wav    the first 8 s of trn04.wav from the pyannote.audio test data (MIT),
+                       an AMI Meeting Corpus excerpt (CC BY 4.0) annotated as speech-free:
+                       low-level meeting room noise with a few short bumps.
+  python tests/fixtures/make_fixtures.py --recorded <goforward.raw> <trn04.wav>
+"""
+import os
+import sys
+import wave
+
+import numpy as np
+
+FIXTURES_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(os.path.dirname(FIXTURES_DIR)))
+
+from vad import _synthetic_speech # noqa: E402
+
+
+def _write_wav(name: str, signal, sample_rate: int):
+    with wave.open(os.path.join(FIXTURES_DIR, name), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((np.clip(signal, -1, 1) * 32767).astype("<i2").tobytes())
+
+
+def make_vad_fixtures(sample_rate: int = 16000):
+    rng = np.random.default_rng(16)
+    noise = lambda seconds: 0.003 * rng.standard_normal(int(seconds * sample_rate))
+    # Speech at 1.0-2.2s and 2.38-3.18s (one utterance with a 180 ms pause), then 4.68-5.68s
+    parts = [noise(1.0), _synthetic_speech(1.2, sample_rate, rng), noise(0.18),
+             _synthetic_speech(0.8, sample_rate, rng), noise(1.5),
+             _synthetic_speech(1.0, sample_rate, rng), noise(1.5)]
+    _write_wav("vad_two_utterances.wav", np.concatenate(parts), sample_rate)
+
+    # Room noise with mains hum and three unvoiced bursts (a door, a keyboard, a breath)
+    t = np.arange(5 * sample_rate) / sample_rate
+    signal = 0.003 * rng.standard_normal(len(t)) + 0.004 * np.sin(2 * np.pi * 50 * t)
+    for start_s, level in ((1.0, 0.05), (2.5, 0.03), (3.7, 0.02)):
+        start = int(start_s * sample_rate)
+        length = int(0.15 * sample_rate)
+        signal[start:start + length] += level * rng.standard_normal(length) * np.hanning(length)
+    _write_wav("vad_noise.wav", signal, sample_rate)
+
+
+def make_echo_fixtures(mic_rate: int = 16000, playback_rate: int = 24000):
+    rng = np.random.default_rng(18)
+    seconds = 6.0
+    bot = np.zeros(int(seconds * playback_rate))
+    # Quiet room for 0.5 s, then three bot utterances; the caller barges into the third at 5.0 s
+    for start_s, end_s in ((0.5, 2.0), (2.5, 3.8), (4.2, 6.0)):
+        start, end = int(start_s * playback_rate), int(end_s * playback_rate)
+        bot[start:end] = _synthetic_speech(end_s - start_s + 0.01, playback_rate, rng)[:end - start]
+    bot_at_mic_rate = np.interp(np.arange(int(seconds * mic_rate)) * playback_rate / mic_rate,
+                                np.arange(len(bot)), bot)
+    # Room: 40 ms from speaker to mic, -10 dB, with a short diffuse tail
+    delay = int(0.04 * mic_rate)
+    path = np.zeros(delay + int(0.03 * mic_rate))
+    path[delay] = 0.3
+    tail = len(path) - delay - 1
+    path[delay + 1:] = 0.05 * np.exp(-np.arange(tail) / 40.0) * rng.standard_normal(tail)
+    echo = np.convolve(bot_at_mic_rate, path)[:len(bot_at_mic_rate)]
+    caller = np.zeros_like(echo)
+    onset = int(5.0 * mic_rate)
+    caller[onset:onset + mic_rate] = 1.2 * _synthetic_speech(1.0, mic_rate, rng)
+    noise = 0.002 * rng.standard_normal(len(echo))
+    _write_wav("echo_playback.wav", bot, playback_rate)
+    _write_wav("echo_mic.wav", echo + caller + noise, mic_rate)
+    _write_wav("echo_mic_bot_only.wav", echo + noise, mic_rate)
+
+
+def _read_float_wav(path: str):
+    """Samples of a 32-bit float WAV (the wave module only reads integer PCM)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 12
+    while pos < len(data):
+        chunk_id, size = data[pos:pos + 4], int.from_bytes(data[pos + 4:pos + 8], "little")
+        if chunk_id == b"data":
+            return np.frombuffer(data[pos + 8:pos + 8 + size], dtype="<f4")
+        pos += 8 + size + (size & 1)
+    raise ValueError(f"{path}: no data chunk")
+
+
+def make_recorded_fixtures(goforward_raw: str, ami_wav: str, sample_rate: int = 16000):
+    speech = np.fromfile(goforward_raw, dtype="<i2") # 16 kHz linear16, written as is
+    with wave.open(os.path.join(FIXTURES_DIR, "recorded_speech.wav"), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(speech.tobytes())
+    _write_wav("recorded_room.wav", _read_float_wav(ami_wav)[:8 * sample_rate], sample_rate)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--recorded"]:
+        make_recorded_fixtures(*sys.argv[2:4])
+    else:
+        make_vad_fixtures()
+        make_echo_fixtures()
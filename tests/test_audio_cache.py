@@ -0,0 +1,55 @@
+import os
+import time
+
+from audio_cache import AudioCache
+
+CLIP_BYTES = 1000
+
+
+def _clip(index: int) -> bytes:
+    return bytes([index % 256]) * CLIP_BYTES
+
+
+def _disk_bytes(disk_dir) -> int:
+    return sum(entry.stat().st_size for entry in disk_dir.rglob("*.audio"))
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = AudioCache(max_bytes=3 * CLIP_BYTES)
+    for index in range(3):
+        cache.put(f"key{index}", _clip(index))
+    assert cache.get("key0") == _clip(0) # Now the most recently used
+    cache.put("key3", _clip(3))
+    assert cache.get("key1") is None
+    assert cache.get("key0") == _clip(0) and cache.stats["evictions"] == 1
+
+
+def test_disk_tier_stays_within_its_budget(tmp_path):
+    cache = AudioCache(max_bytes=CLIP_BYTES, disk_dir=str(tmp_path), max_disk_bytes=10 * CLIP_BYTES)
+    for index in range(50):
+        cache.put(f"key{index:02d}", _clip(index))
+        assert _disk_bytes(tmp_path) <= 10 * CLIP_BYTES
+    assert cache.stats["disk_evictions"] >= 40
+    assert bytes(cache.get("key49")) == _clip(49) # The newest clips survive
+
+
+def test_disk_hits_are_trimmed_last(tmp_path):
+    cache = AudioCache(max_bytes=CLIP_BYTES, disk_dir=str(tmp_path), max_disk_bytes=5 * CLIP_BYTES)
+    for index in range(5):
+        cache.put(f"key{index}", _clip(index))
+        time.sleep(0.01) # Distinct mtimes
+    assert bytes(cache.get("key0")) == _clip(0) # From disk (memory holds one clip): refreshes its mtime
+    cache.put("key5", _clip(5))
+    assert cache.get("key0") is not None
+    assert cache.get("key1") is None # The least recently used clip went first
+
+
+def test_existing_directory_is_trimmed_to_a_lowered_budget(tmp_path):
+    cache = AudioCache(max_bytes=CLIP_BYTES, disk_dir=str(tmp_path))
+    for index in range(10):
+        cache.put(f"key{index}", _clip(index))
+        path = cache._disk_path(f"key{index}")
+        os.utime(path, ns=(index * 10 ** 9, index * 10 ** 9)) # key0 oldest
+    restarted = AudioCache(max_bytes=CLIP_BYTES, disk_dir=str(tmp_path), max_disk_bytes=4 * CLIP_BYTES)
+    assert _disk_bytes(tmp_path) <= 4 * CLIP_BYTES
+    assert restarted.get("key9") is not None and restarted.get("key0") is None
@@ -0,0 +1,85 @@
+import array
+import asyncio
+import threading
+import time
+
+from audio_sink import AudioSink, RingBuffer, StreamAudioSink
+
+
+def _samples(count: int, start: int = 0) -> bytes:
+    return array.array("h", (((start + i) * 37) % 30000 - 15000 for i in range(count))).tobytes()
+
+
+def _aligned_chunks(data: bytes, sizes: list) -> list:
+    chunks, pos = [], 0
+    for size in sizes:
+        chunks.append(data[pos:pos + size])
+        pos += size
+    chunks.append(data[pos:])
+    return chunks
+
+
+def test_ring_buffer_reads_whole_samples_only():
+    ring = RingBuffer(64, align=2)
+    ring.write(b"\x01\x02\x03")
+    out = bytearray(16)
+    assert ring.read_into(memoryview(out)) == 2
+    assert len(ring) == 1 # The stray byte waits for its other half
+    ring.write(b"\x04")
+    assert ring.read_into(memoryview(out)) == 2
+    assert bytes(out[:2]) == b"\x03\x04"
+
+
+def test_odd_chunks_and_underruns_keep_samples_aligned():
+    sink = AudioSink(audio_format="pcm", sample_rate=8000, buffer_seconds=0.5)
+    pcm = _samples(3000)
+    played = bytearray()
+    out = bytearray(1024)
+    for chunk in _aligned_chunks(pcm, [101, 333, 7, 999, 1, 1205, 77]):
+        sink.write(chunk)
+        while True: # Drain until the buffer underruns
+            n = sink._pull(out)
+            assert n % AudioSink.BYTES_PER_SAMPLE == 0
+            played += out[:n]
+            if n < len(out):
+                break
+    assert bytes(played) == pcm
+    assert array.array("h", bytes(played)).tolist() == array.array("h", pcm).tolist()
+
+
+def test_stream_sink_sends_aligned_frames():
+    sent = []
+
+    async def run():
+        async def send(frame):
+            sent.append(frame)
+
+        loop = asyncio.get_running_loop()
+        sink = StreamAudioSink(send, loop, frame_ms=5, audio_format="pcm", sample_rate=8000)
+        pcm = _samples(800)
+        pacer = loop.create_task(sink._pace())
+        for chunk in _aligned_chunks(pcm, [3, 41, 99, 7, 501]):
+            sink.write(chunk)
+            await asyncio.sleep(0.02) # Let the pacer run dry between chunks
+        await asyncio.sleep(0.2)
+        sink._closed.set()
+        await pacer
+        return pcm
+
+    pcm = asyncio.run(run())
+    assert all(len(frame) % AudioSink.BYTES_PER_SAMPLE == 0 for frame in sent)
+    assert b"".join(sent) == pcm
+
+
+def test_writer_blocked_on_full_ring_drops_its_chunk_after_flush():
+    sink = AudioSink(audio_format="pcm", sample_rate=8000, buffer_seconds=0.1)
+    sink.write(b"\x00" * sink.ring.capacity) # Fill it so the next write has to wait
+    stale = threading.Thread(target=sink.write, args=(b"\x01" * 4000,), daemon=True)
+    stale.start()
+    time.sleep(0.05) # Let the writer block on the full ring
+    sink.flush()
+    stale.join(timeout=1.0)
+    assert not stale.is_alive()
+    assert len(sink.ring) == 0 # Nothing of the cancelled chunk was written after the flush
+    sink.write(b"\x02" * 4) # Writes after the flush go through as usual
+    assert len(sink.ring) == 4
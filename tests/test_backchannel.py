@@ -0,0 +1,47 @@
+import threading
+import time
+
+from audio_sink import AudioSink
+from backchannel import BackchannelBank, BackchannelScheduler
+from turn_control import TurnToken
+
+
+def _scheduler(sink: AudioSink, speaking_event: threading.Event, clip_bytes: int):
+    bank = BackchannelBank(phrases=["Okay."])
+    bank.prepare(lambda phrase: b"\x01" * clip_bytes)
+    return BackchannelScheduler(bank, sink.write_pcm, delay_ms=10, speaking_event=speaking_event)
+
+
+def test_clip_marks_the_bot_as_speaking_and_is_flushed_on_barge_in():
+    sink = AudioSink(audio_format="pcm", sample_rate=8000, buffer_seconds=0.5)
+    speaking = threading.Event()
+    scheduler = _scheduler(sink, speaking, clip_bytes=800)
+    turn = TurnToken(1)
+    turn.add_cancel_callback(lambda token: sink.flush())
+    scheduler.arm(turn)
+    time.sleep(0.1)
+    assert scheduler.played == 1
+    assert speaking.is_set() # So the VAD treats the caller's speech as a barge-in
+    assert len(sink.ring) == 800
+    turn.cancel()
+    assert len(sink.ring) == 0
+
+
+def test_real_audio_waits_for_a_clip_being_written():
+    sink = AudioSink(audio_format="pcm", sample_rate=8000, buffer_seconds=0.1)
+    scheduler = _scheduler(sink, threading.Event(), clip_bytes=sink.ring.capacity + 400)
+    turn = TurnToken(1)
+    scheduler.arm(turn)
+    time.sleep(0.1) # The clip has filled the ring and its writer is waiting for space
+    assert not scheduler._clip_written.is_set()
+    answered = threading.Event()
+
+    def answer():
+        scheduler.on_real_audio(turn)
+        answered.set()
+
+    threading.Thread(target=answer, daemon=True).start()
+    assert not answered.wait(0.1) # Not while the clip is still going in
+    sink._pull(bytearray(800)) # The device plays some of it; the rest of the clip fits
+    assert answered.wait(1.0)
+    assert scheduler.skipped == 0
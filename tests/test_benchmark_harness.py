@@ -0,0 +1,36 @@
+import asyncio
+import json
+
+import pytest
+
+# The harness drives the real pipeline, so it needs the SDKs it talks to
+pytest.importorskip("google.genai")
+pytest.importorskip("deepgram")
+pytest.importorskip("requests")
+
+from benchmark_harness import build_parser, run_script
+from fakes import FakeServices
+from session_recorder import SessionRecorder, SessionRecording
+
+SCRIPT = {"name": "smoke", "turns": [
+    {"user": "What is the capital of France?", "response": "Paris is the capital of France."},
+    {"user": "And how far is it from Berlin?", "response": "About eight hundred eighty kilometers."},
+]}
+
+
+def test_run_script_completes_every_turn_and_records_the_session(tmp_path):
+    script_path = tmp_path / "script.json"
+    script_path.write_text(json.dumps(SCRIPT), encoding="utf-8")
+    args = build_parser().parse_args(["--script", str(script_path), "--llm-ttft-ms", "50",
+                                      "--llm-chunk-ms", "10", "--tts-ttfb-ms", "30", "--word-ms", "60"])
+    recorder = SessionRecorder(str(tmp_path / "run.vrec"))
+    with FakeServices(str(script_path), args) as services:
+        result = asyncio.run(run_script(SCRIPT, services, args, recorder=recorder))
+    recorder.close()
+
+    assert result["caller_timeouts"] == 0
+    assert [turn["outcome"] for turn in result["turns"]] == ["completed", "completed"]
+    assert all(turn["time_to_first_audio_ms"] is not None for turn in result["turns"])
+    with SessionRecording(str(tmp_path / "run.vrec")) as recording:
+        counts = recording.counts()
+    assert counts.get("transcript") and counts.get("llm_request") == 2 and counts.get("tts_segment")
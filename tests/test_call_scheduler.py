@@ -0,0 +1,155 @@
+import asyncio
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from call_scheduler import (INTERACTIVE, PREFETCH, SPECULATIVE, CallCancelled, CallScheduler,
+                            retry_after_s)
+from event_runtime import AwaitableEvent
+from fakes import FakeUnrealSpeechHandler, LatencyModel, QuotaModel, serve
+
+
+# --- Against the quota-enforcing stand-in ---
+@pytest.fixture
+def quota_server(monkeypatch):
+    monkeypatch.setattr(FakeUnrealSpeechHandler, "ttfb", LatencyModel(30, 10, seed=3))
+    monkeypatch.setattr(FakeUnrealSpeechHandler, "realtime_factor", 50.0)
+    monkeypatch.setattr(FakeUnrealSpeechHandler, "quota", QuotaModel(rate_per_s=20, burst=2, max_concurrency=3))
+    server = serve(FakeUnrealSpeechHandler)
+    yield server.server_address[1]
+    server.shutdown()
+
+
+def _burst(port: int, scheduler: CallScheduler = None, calls: int = 36) -> list:
+    """Statuses of `calls` concurrent requests; every fourth is a turn's first segment."""
+    def post(priority):
+        grant = scheduler.acquire(priority) if scheduler is not None else None
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            connection.request("POST", "/stream", json.dumps({"Text": "A short segment of speech."}),
+                               {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            connection.close()
+            if response.status == 429 and scheduler is not None:
+                scheduler.throttled(retry_after_s(response.headers))
+            return response.status
+        finally:
+            if grant is not None:
+                grant.release()
+
+    priorities = [INTERACTIVE if i % 4 == 0 else PREFETCH for i in range(calls)]
+    with ThreadPoolExecutor(max_workers=12) as executor:
+        return list(executor.map(post, priorities))
+
+
+def test_scheduled_burst_stays_within_quota_and_first_segments_go_first(quota_server):
+    assert 429 in _burst(quota_server) # The stand-in does enforce its quota
+    time.sleep(1.0) # Let its bucket refill
+    # A little under the provider's limits: its count of open responses lags ours slightly
+    scheduler = CallScheduler("unreal-speech", rate_per_s=18, burst=2, max_in_flight=2)
+    assert 429 not in _burst(quota_server, scheduler)
+    waits = scheduler.stats.waits
+    assert waits[INTERACTIVE].quantiles()[0.5] < waits[PREFETCH].quantiles()[0.5]
+
+
+# --- Priority ordering ---
+def test_waiters_are_admitted_most_urgent_first():
+    scheduler = CallScheduler("backend", max_in_flight=1)
+    held = scheduler.acquire()
+    admitted = []
+
+    def call(priority, name):
+        with scheduler.acquire(priority):
+            admitted.append(name)
+
+    threads = []
+    for priority, name in ((SPECULATIVE, "speculative"), (PREFETCH, "prefetch-1"),
+                           (PREFETCH, "prefetch-2"), (INTERACTIVE, "interactive")):
+        threads.append(threading.Thread(target=call, args=(priority, name)))
+        threads[-1].start()
+        time.sleep(0.02) # Fixes the arrival order
+    assert scheduler.queued == 4
+    held.release()
+    for thread in threads:
+        thread.join(timeout=1.0)
+    assert admitted == ["interactive", "prefetch-1", "prefetch-2", "speculative"]
+    assert scheduler.in_flight == 0 and scheduler.queued == 0
+
+
+# --- Cancel while queued ---
+def test_cancelled_call_leaves_the_queue_without_being_sent():
+    scheduler = CallScheduler("backend", max_in_flight=1)
+    held = scheduler.acquire()
+    give_up = AwaitableEvent()
+    threading.Timer(0.1, give_up.set).start()
+    start = time.monotonic()
+    with pytest.raises(CallCancelled):
+        scheduler.acquire(PREFETCH, cancelled=give_up)
+    assert time.monotonic() - start < 0.2 # Woken by the cancel, not by a poll
+    held.release()
+    assert scheduler.queued == 0 and scheduler.in_flight == 0 and scheduler.stats.abandoned == 1
+
+
+def test_acquire_leaves_no_listener_on_the_cancel_event():
+    scheduler = CallScheduler("backend", max_in_flight=1)
+    cancelled = AwaitableEvent() # Like a SynthesisJob's, it outlives many calls
+    for _ in range(3):
+        scheduler.acquire(cancelled=cancelled).release()
+    held = scheduler.acquire()
+    threading.Timer(0.05, cancelled.set).start()
+    with pytest.raises(CallCancelled):
+        scheduler.acquire(cancelled=cancelled)
+    held.release()
+    assert cancelled._listeners == []
+
+
+# --- 429 pause ---
+def test_throttled_pauses_admissions_for_retry_after():
+    scheduler = CallScheduler("backend", rate_per_s=100)
+    scheduler.throttled(0.3)
+    start = time.monotonic()
+    scheduler.acquire().release()
+    assert time.monotonic() - start >= 0.29
+    assert scheduler.stats.throttled == 1
+
+
+def test_retry_after_header_in_seconds():
+    assert retry_after_s({"Retry-After": "2.5"}) == 2.5
+    assert retry_after_s({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) is None
+    assert retry_after_s({}) is None and retry_after_s(None) is None
+
+
+# --- From an asyncio loop ---
+def test_async_interactive_overtakes_speculative_and_cancel_abandons():
+    async def run():
+        scheduler = CallScheduler("gemini", rate_per_s=5, burst=1)
+        first = await scheduler.acquire_async()
+        speculative = asyncio.ensure_future(scheduler.acquire_async(SPECULATIVE))
+        await asyncio.sleep(0.05)
+        interactive = asyncio.ensure_future(scheduler.acquire_async(INTERACTIVE))
+        done, _ = await asyncio.wait({speculative, interactive}, return_when=asyncio.FIRST_COMPLETED)
+        assert done == {interactive}
+        speculative.cancel()
+        await asyncio.gather(speculative, return_exceptions=True)
+        assert scheduler.queued == 0 and scheduler.stats.abandoned == 1
+        first.release()
+        interactive.result().release()
+        assert scheduler.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_async_throttled_pauses_admissions():
+    async def run():
+        scheduler = CallScheduler("gemini", rate_per_s=5, burst=1)
+        scheduler.throttled(0.3)
+        start = time.monotonic()
+        (await scheduler.acquire_async()).release()
+        assert time.monotonic() - start >= 0.29
+
+    asyncio.run(run())
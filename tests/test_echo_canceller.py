@@ -0,0 +1,40 @@
+import os
+import wave
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from echo_canceller import count_onsets
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+BARGE_IN_MS = 5000 # When the caller starts talking over the bot in echo_mic.wav
+MIN_ERLE_DB = 15.0
+
+
+def _read_wav(name: str):
+    with wave.open(os.path.join(FIXTURES_DIR, name), "rb") as wav:
+        return wav.readframes(wav.getnframes()), wav.getframerate()
+
+
+@pytest.fixture(scope="module")
+def playback():
+    return _read_wav("echo_playback.wav")
+
+
+def test_bot_echo_alone_never_interrupts(playback):
+    mic_pcm, mic_rate = _read_wav("echo_mic_bot_only.wav")
+    raw_onsets, _ = count_onsets(mic_pcm, playback[0], mic_rate, playback[1], cancel=False)
+    assert raw_onsets # Without suppression the echo does read as speech
+    onsets, canceller = count_onsets(mic_pcm, playback[0], mic_rate, playback[1], cancel=True)
+    assert onsets == []
+    assert canceller.erle_db >= MIN_ERLE_DB
+    assert canceller.resets == 0
+
+
+def test_real_barge_in_is_still_detected(playback):
+    mic_pcm, mic_rate = _read_wav("echo_mic.wav")
+    onsets, canceller = count_onsets(mic_pcm, playback[0], mic_rate, playback[1], cancel=True)
+    assert [ms for ms in onsets if ms < BARGE_IN_MS] == [] # No false interrupts before it
+    assert len(onsets) == 1 and BARGE_IN_MS <= onsets[0] <= BARGE_IN_MS + 200
+    assert canceller.erle_db >= MIN_ERLE_DB
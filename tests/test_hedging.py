@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from hedging import AsyncHedgedRouter, HedgedRouter, HedgePolicy, Provider, ProviderHealth
+
+
+def _backend(delays: dict, errors: tuple = ()):
+    """call_fn answering with the provider's name after delays[name] seconds."""
+    def call(provider, request_id):
+        time.sleep(delays[provider.name])
+        if provider.name in errors:
+            raise ConnectionError(f"{provider.name} failed")
+        return provider.name
+    return call
+
+
+def _providers(*names, **health_kwargs):
+    return [Provider(name, None, ProviderHealth(**health_kwargs)) for name in names]
+
+
+# --- Hedge delay ---
+def test_hedge_delay_is_the_clamped_percentile():
+    health = ProviderHealth(min_samples=5)
+    policy = HedgePolicy(initial_ms=800, min_ms=100, max_ms=3000)
+    assert policy.delay_s(health) == pytest.approx(0.8) # Not enough calls seen yet
+    for latency_ms in (200, 220, 240, 260, 900):
+        health.record_success(latency_ms)
+    assert policy.delay_s(health) == pytest.approx(0.9)
+    for _ in range(50): # A full window of fast calls
+        health.record_success(10)
+    assert policy.delay_s(health) == pytest.approx(0.1) # Never below min_ms
+    assert HedgePolicy(enabled=False).delay_s(health) is None
+
+
+def test_slow_call_is_hedged_and_the_hedge_wins():
+    router = HedgedRouter(_providers("primary", "secondary"), _backend({"primary": 0.5, "secondary": 0.01}),
+                          policy=HedgePolicy(initial_ms=50, min_ms=10))
+    start = time.perf_counter()
+    provider, result = router.call(1)
+    elapsed = time.perf_counter() - start
+    router.shutdown()
+    assert result == "secondary" and provider.name == "secondary"
+    assert 0.05 <= elapsed < 0.3 # Sent at the hedge delay, not after the stalled call
+    assert router.stats.hedges == 1 and router.stats.hedge_wins == 1
+
+
+def test_fast_call_is_not_hedged():
+    router = HedgedRouter(_providers("primary", "secondary"), _backend({"primary": 0.01, "secondary": 0.01}),
+                          policy=HedgePolicy(initial_ms=200))
+    assert router.call(1)[1] == "primary"
+    router.shutdown()
+    assert router.stats.hedges == 0
+
+
+def test_queue_wait_is_not_counted_as_provider_latency():
+    def queued_backend(provider, queue_s):
+        time.sleep(queue_s)
+        return queue_s * 1000
+    router = HedgedRouter(_providers("primary"), queued_backend, policy=HedgePolicy(enabled=False),
+                          queue_wait_ms=lambda waited_ms: waited_ms)
+    for _ in range(5):
+        router.call(0.1)
+    router.shutdown()
+    assert router.providers[0].health.percentile_ms() < 50
+
+
+# --- Failover ---
+def test_failure_fails_over_without_waiting_for_the_hedge_delay():
+    router = HedgedRouter(_providers("primary", "secondary"),
+                          _backend({"primary": 0.01, "secondary": 0.01}, errors=("primary",)),
+                          policy=HedgePolicy(initial_ms=1000))
+    start = time.perf_counter()
+    provider, result = router.call(1)
+    router.shutdown()
+    assert result == "secondary"
+    assert time.perf_counter() - start < 0.5
+    assert router.stats.failovers == 1 and router.stats.hedges == 0
+    assert router.providers[0].health.failures == 1
+
+
+def test_last_error_is_raised_when_every_attempt_fails():
+    router = HedgedRouter(_providers("primary", "secondary"),
+                          _backend({"primary": 0.0, "secondary": 0.0}, errors=("primary", "secondary")))
+    with pytest.raises(ConnectionError, match="secondary"):
+        router.call(1)
+    router.shutdown()
+
+
+# --- Circuit breaker ---
+def test_breaker_opens_on_errors_and_probes_after_the_cooldown():
+    health = ProviderHealth(min_samples=5, error_threshold=0.5, cooldown=0.05)
+    for _ in range(2):
+        health.record_success(10)
+    for _ in range(3):
+        health.record_failure()
+    assert health.state == ProviderHealth.OPEN and health.trips == 1
+    assert not health.allow()
+    time.sleep(0.06)
+    assert health.allow() # The half-open probe
+    assert not health.allow() # ... one at a time
+    health.record_failure()
+    assert health.state == ProviderHealth.OPEN and health.trips == 2
+    time.sleep(0.06)
+    assert health.allow()
+    health.record_success(10)
+    assert health.state == ProviderHealth.CLOSED and health.allow()
+
+
+def test_breaker_opens_on_slow_p95():
+    health = ProviderHealth(min_samples=5, slow_ms=500)
+    for latency_ms in (100, 100, 100, 100, 900):
+        health.record_success(latency_ms)
+    assert health.state == ProviderHealth.OPEN
+
+
+def test_router_skips_an_open_provider():
+    providers = _providers("primary", "secondary", min_samples=1)
+    providers[0].health.record_failure()
+    assert providers[0].health.state == ProviderHealth.OPEN
+    router = HedgedRouter(providers, _backend({"primary": 0.0, "secondary": 0.0}))
+    provider, _ = router.call(1)
+    router.shutdown()
+    assert provider.name == "secondary" and router.stats.failovers == 0
+
+
+# --- Cleanup of the slower attempt ---
+def test_slower_result_is_discarded_when_it_arrives():
+    discarded = []
+    arrived = threading.Event()
+
+    def discard(result):
+        discarded.append(result)
+        arrived.set()
+
+    router = HedgedRouter(_providers("primary", "secondary"), _backend({"primary": 0.2, "secondary": 0.01}),
+                          policy=HedgePolicy(initial_ms=20, min_ms=10), discard=discard)
+    assert router.call(1)[1] == "secondary"
+    assert arrived.wait(1.0)
+    router.shutdown()
+    assert discarded == ["primary"] and router.stats.losers_discarded == 1
+
+
+def test_async_slower_attempt_is_cancelled():
+    cancelled = []
+
+    async def backend(provider, delay_s):
+        try:
+            await asyncio.sleep(delay_s if provider.name == "primary" else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(provider.name)
+            raise
+        return provider.name
+
+    async def run():
+        router = AsyncHedgedRouter(_providers("primary", "secondary"), backend,
+                                   policy=HedgePolicy(initial_ms=50, min_ms=10))
+        provider, result = await router.call(1.0)
+        await asyncio.sleep(0) # Let the cancelled attempt unwind
+        assert result == "secondary" and router.stats.hedge_wins == 1
+        assert cancelled == ["primary"] and router.stats.losers_discarded == 1
+        assert router.providers[0].health.failures == 0 # Losing the race is not a failure
+        assert (await router.call(0.0))[1] == "primary"
+
+    asyncio.run(run())
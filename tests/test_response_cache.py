@@ -0,0 +1,43 @@
+from response_cache import ResponseCache
+
+
+def test_standalone_question_is_served_from_cache():
+    cache = ResponseCache()
+    cache.put("What is the capital of France?", "Paris is the capital of France.", 400.0)
+    assert cache.get("um, what is the capital of france") == "Paris is the capital of France."
+    assert cache.hits == 1 and cache.saved_ms == 400.0
+
+
+def test_personal_questions_are_never_shared():
+    cache = ResponseCache()
+    cache.put("what is my name", "Your name is Alice.")
+    assert cache.get("What is my name?") is None
+    for question in ("what did I tell you", "can you remember our plan", "where do we meet"):
+        assert cache.key_for(question) is None
+    assert cache.bypassed == 1 and not cache.peek("what is my name")
+
+
+def test_standalone_questions_are_cached_later_in_the_call():
+    cache = ResponseCache()
+    history = "Hi there.\nCan you recommend a good book about Rome?"
+    cache.put("what is the capital of france", "Paris is the capital of France.", 400.0, history)
+    assert cache.get("what is the capital of france") == "Paris is the capital of France."
+
+
+def test_answers_drawing_on_the_callers_history_are_not_stored():
+    cache = ResponseCache()
+    history = "Hello, this is Alice.\nI'm flying out on flight 4172 tomorrow."
+    cache.put("when does the flight leave", "Flight 4172 leaves at noon, Alice.", 400.0, history)
+    assert cache.get("when does the flight leave") is None
+    assert cache.personal == 1
+    # Names and numbers that are in the question itself are fine
+    cache.put("how far is Paris from Lyon", "Paris is about 390 km from Lyon.", 400.0,
+              history + "\nI love Paris.")
+    assert cache.get("how far is Paris from Lyon") == "Paris is about 390 km from Lyon."
+
+
+def test_context_dependent_questions_bypass_the_cache():
+    cache = ResponseCache()
+    assert cache.key_for("tell me more about that") is None
+    assert cache.key_for("what about the other one") is None
+    assert cache.key_for("hi") is None # Too short
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+
+from stt_connection import SentAudioRing, SupervisedLiveConnection
+
+
+class _FlakyConnection:
+    """Accepts `accept` frames, then refuses every send (a dropped socket)."""
+    def __init__(self, accept: int):
+        self.accept = accept
+        self.received = []
+
+    async def send(self, data):
+        if len(self.received) >= self.accept:
+            return False
+        self.received.append(bytes(data))
+
+    async def finish(self):
+        pass
+
+
+def test_sent_audio_ring_finds_audio_by_stream_offset():
+    ring = SentAudioRing(8)
+    ring.write(b"abcdef")
+    ring.write(b"ghij")
+    assert ring.written == 10 and ring.oldest == 2
+    assert b"".join(ring.views_from(5)) == b"fghij"
+    assert b"".join(ring.views_from(0)) == b"cdefghij" # Clamped to what is still held
+
+
+def test_drop_noticed_on_another_loop_reconnects_on_the_owning_loop():
+    connections = []
+    opened_on = []
+
+    async def open_fn(on_message, on_closed):
+        opened_on.append(asyncio.get_running_loop())
+        connections.append(_FlakyConnection(accept=2 if not connections else 100))
+        return connections[-1]
+
+    async def on_message(connection, result, **kwargs):
+        pass
+
+    owner = asyncio.new_event_loop()
+    thread = threading.Thread(target=owner.run_forever, daemon=True)
+    thread.start()
+    try:
+        supervised = SupervisedLiveConnection(open_fn, on_message, backoff=(0.01, 0.05))
+        assert asyncio.run_coroutine_threadsafe(supervised.start(), owner).result(5)
+
+        async def microphone():
+            # A separate loop, as the microphone runs its own
+            for index in range(5):
+                await supervised.send(bytes([index]) * 640)
+                await asyncio.sleep(0.02)
+            for _ in range(100):
+                if supervised.reconnects:
+                    break
+                await asyncio.sleep(0.01)
+
+        asyncio.run(microphone())
+        assert supervised.reconnects == 1 and supervised.drops == {"send refused": 1}
+        assert opened_on == [owner, owner]
+        # The new connection heard everything the old one had not finalized
+        assert b"".join(connections[1].received) == b"".join(bytes([i]) * 640 for i in range(5))
+        asyncio.run_coroutine_threadsafe(supervised.finish(), owner).result(5)
+    finally:
+        owner.call_soon_threadsafe(owner.stop)
+        thread.join(5)
+        owner.close()
+
+
+def test_frames_sent_during_catch_up_are_never_lost():
+    connections = []
+
+    class _SlowConnection(_FlakyConnection):
+        async def send(self, data):
+            await asyncio.sleep(0.001) # Let the microphone thread write while the replay is awaited
+            return await super().send(data)
+
+    async def open_fn(on_message, on_closed):
+        connections.append(_SlowConnection(accept=3 if not connections else 10 ** 6))
+        return connections[-1]
+
+    async def on_message(connection, result, **kwargs):
+        pass
+
+    owner = asyncio.new_event_loop()
+    thread = threading.Thread(target=owner.run_forever, daemon=True)
+    thread.start()
+    frames = [index.to_bytes(4, "little") * 80 for index in range(300)]
+    try:
+        supervised = SupervisedLiveConnection(open_fn, on_message, backoff=(0.01, 0.05))
+        assert asyncio.run_coroutine_threadsafe(supervised.start(), owner).result(5)
+
+        async def microphone():
+            for frame in frames:
+                await supervised.send(frame)
+                await asyncio.sleep(0.0005)
+
+        asyncio.run(microphone())
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.2), owner).result(5)
+        assert supervised.reconnects >= 1
+        # Nothing was finalized, so the last connection heard the whole stream, in order, once
+        assert b"".join(connections[-1].received) == b"".join(frames)
+        asyncio.run_coroutine_threadsafe(supervised.finish(), owner).result(5)
+    finally:
+        owner.call_soon_threadsafe(owner.stop)
+        thread.join(5)
+        owner.close()
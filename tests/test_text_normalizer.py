@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from text_normalizer import StreamingNormalizer, normalize_text
+
+GOLDEN = (
+    ("**Sure!** Here's the plan 😊", "Sure! Here's the plan"),
+    ("It costs $5.50 today.", "It costs five dollars and fifty cents today."),
+    ("Revenue hit $3.2 billion in 2023.", "Revenue hit three point two billion dollars in twenty twenty-three."),
+    ("That's £1 or €20.", "That's one pound or twenty euros."),
+    ("Only $0.99!", "Only ninety-nine cents!"),
+    ("About 45% of people agree.", "About forty-five percent of people agree."),
+    ("We met on March 3rd, 2021 at 5:30 PM.", "We met on March third, twenty twenty-one at five thirty P M."),
+    ("The deadline is 2024-07-04.", "The deadline is July fourth, twenty twenty-four."),
+    ("Call me at 9am. Thanks!", "Call me at nine A M. Thanks!"),
+    ("Dinner is at 7 p.m. tonight.", "Dinner is at seven P M tonight."),
+    ("Dr. Smith arrived at 10:05.", "Doctor Smith arrived at ten oh five."),
+    ("It was the 21st of June.", "It was the twenty-first of June."),
+    ("Born 4 Jul 1990, she loved the 1980s.", "Born fourth of July, nineteen ninety, she loved the nineteen eighties."),
+    ("The FBI and NASA use HTML and APIs.", "The F B I and NASA use H T M L and A P Is."),
+    ("World War II ended in 1945; plug in the USB.", "World War II ended in nineteen forty-five; plug in the U S B."),
+    ("It weighs 3.5 kg and runs at 60 mph.", "It weighs three point five kilograms and runs at sixty miles per hour."),
+    ("Temperatures of -5°C are common.", "Temperatures of minus five degrees Celsius are common."),
+    ("There are 1,234,567 stars.", "There are one million two hundred thirty-four thousand five hundred sixty-seven stars."),
+    ("Pi is about 3.14159.", "Pi is about three point one four one five nine."),
+    ("Ages 5-10 welcome, open 9-5.", "Ages five to ten welcome, open nine to five."),
+    ("Call 555-1234 now.", "Call five five five, one two three four now."),
+    ("Dial 1-800-555-1234 today.", "Dial one, eight zero zero, five five five, one two three four today."),
+    ("Order 12-34-56 shipped.", "Order one two, three four, five six shipped."),
+    ("Add 1/2 cup, then 3/4 cup.", "Add one half cup, then three quarters cup."),
+    ("About 2/3 agree, 1/5 don't.", "About two thirds agree, one fifth don't."),
+    ("We are open 24/7.", "We are open twenty-four seven."),
+    ("Read [the docs](https://example.com/docs) first.", "Read the docs first."),
+    ("Use Python 3.11.7 for COVID-19 data.", "Use Python 3.11.7 for COVID-nineteen data."),
+    ("Apples, pears, etc. All fruit.", "Apples, pears, et cetera. All fruit."),
+    ("Apples, pears, etc. are fruit.", "Apples, pears, et cetera are fruit."),
+    ("Pens etc. 7 etc. 8 etc. are here.", "Pens et cetera seven et cetera eight et cetera are here."),
+    ("Salt & pepper, e.g. on eggs.", "Salt and pepper, for example on eggs."),
+    ("## Options\n- First one\n- Second one\n1. Third", "Options\nFirst one\nSecond one\nThird"),
+    ("Great job 👍🏽 🎉 see you soon!", "Great job see you soon!"),
+    ("Room #4 is free.", "Room number four is free."),
+    ("Just plain words, nothing to change.", "Just plain words, nothing to change."),
+)
+
+# Words the fuzz strings together: plain ones, and ones whose reading depends on their neighbours
+_FUZZ_WORDS = ("the", "and", "All", "are", "more", "Smith", "fruit.", "done!", "etc.", "e.g.", "Dr.", "vs.",
+               "7", "45", "2021", "555-1234", "1-800-555-1234", "1/2", "3/4", "24/7", "3.5", "1,250", "$5", "$", "million", "km", "%", "March", "Jul", "3rd,",
+               "5:30", "PM.", "p.m.", "9am", "5-10", "9-5", "-", "#4", "FBI", "USB.", "**bold**",
+               "[the docs](https://example.com)", "😊", "\n-", "\n##")
+
+
+def _stream_normalize(text: str, rng: random.Random) -> str:
+    normalizer = StreamingNormalizer()
+    out, pos = [], 0
+    while pos < len(text):
+        size = rng.randint(1, 12)
+        out.append(normalizer.feed(text[pos:pos + size]))
+        pos += size
+    out.append(normalizer.flush())
+    return "".join(out)
+
+
+@pytest.mark.parametrize("text, expected", GOLDEN)
+def test_golden_outputs(text, expected):
+    assert normalize_text(text).rstrip() == expected
+
+
+@pytest.mark.parametrize("text, expected", GOLDEN)
+def test_golden_outputs_streamed_in_random_chunks(text, expected):
+    rng = random.Random(3)
+    for _ in range(20):
+        # Trailing whitespace may be released before the stream knows nothing follows it
+        assert _stream_normalize(text, rng).rstrip() == expected
+
+
+def test_streamed_output_matches_whole_text():
+    rng = random.Random(23)
+    for _ in range(2000):
+        text = " ".join(rng.choice(_FUZZ_WORDS) for _ in range(rng.randint(1, 14)))
+        assert _stream_normalize(text, rng).rstrip() == normalize_text(text).rstrip(), text
+
+
+def test_long_runs_of_held_words_are_released_in_bounded_chunks():
+    normalizer = StreamingNormalizer()
+    released = normalizer.feed("7 " * 100)
+    assert released # Past MAX_HOLD_CHARS the stream stops waiting
+    assert len(normalizer._buf) <= StreamingNormalizer.MAX_HOLD_CHARS
@@ -0,0 +1,85 @@
+import random
+
+from text_segmenter import StreamingSegmenter, _synthetic_gemini_stream
+
+
+def _segment(chunks, **options) -> list:
+    segmenter = StreamingSegmenter(**options)
+    segments = []
+    for chunk in chunks:
+        segments.extend(segmenter.feed(chunk))
+    remainder = segmenter.flush()
+    if remainder is not None:
+        segments.append(remainder)
+    return segments
+
+
+def _rechunk(text: str, rng: random.Random) -> list:
+    chunks, pos = [], 0
+    while pos < len(text):
+        size = rng.randint(1, 25)
+        chunks.append(text[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def test_first_segment_is_cut_at_the_first_clause_after_min_words():
+    segmenter = StreamingSegmenter(first_min_words=3)
+    assert segmenter.feed("Well, ") == [] # A clause break before three words does not cut
+    assert segmenter.feed("sure thing, I can ") == ["Well, sure thing,"]
+    assert segmenter.feed("help you with that today, ") == [] # Later segments wait for sentences
+
+
+def test_first_segment_is_cut_at_max_words_without_any_break():
+    segmenter = StreamingSegmenter(first_min_words=3, first_max_words=5)
+    assert segmenter.feed("one two three four five six ") == ["one two three four five"]
+    assert segmenter.flush() == "six"
+
+
+def test_abbreviations_and_decimals_do_not_split():
+    text = ("Dr. Smith measured 3.5 liters, e.g. in the lab. "
+            "Mr. Jones added 2.75 more etc. before leaving the room. ")
+    segments = _segment([text], first_min_words=4, first_max_words=40, min_words=4)
+    assert segments == ["Dr. Smith measured 3.5 liters,", "e.g. in the lab.",
+                        "Mr. Jones added 2.75 more etc. before leaving the room."]
+
+
+def test_no_is_an_abbreviation_only_before_a_number():
+    text = "The answer is no. Then we tried item No. 5 on the list instead. "
+    expected = ["The answer is no.", "Then we tried item No. 5 on the list instead."]
+    options = dict(first_min_words=3, first_max_words=40, min_words=4)
+    assert _segment([text], **options) == expected
+    # Whether "No." ends the sentence is only known once the next word arrives
+    cut = text.index("No. ") + len("No. ")
+    assert _segment([text[:cut], text[cut:]], **options) == expected
+    assert _segment(list(text), **options) == expected
+    segmenter = StreamingSegmenter(first_min_words=3)
+    assert segmenter.feed("I have to say no. ") == []
+    assert segmenter.flush() == "I have to say no."
+
+
+def test_short_sentences_are_merged_until_min_words():
+    segments = _segment(["Hello there, friend. ", "Yes. No. Maybe so. It depends on the day. "],
+                        min_words=6)
+    assert segments == ["Hello there, friend.", "Yes. No. Maybe so. It depends on the day."]
+
+
+def test_output_does_not_depend_on_chunking():
+    chunks = _synthetic_gemini_stream(5_000, endings=".?!,")
+    text = "".join(chunks)
+    expected = _segment([text])
+    assert len(expected) > 10
+    rng = random.Random(11)
+    for _ in range(20):
+        assert _segment(_rechunk(text, rng)) == expected
+    assert _segment(list(text)) == expected # One character at a time
+    assert " ".join(expected).split() == text.split() # Nothing lost or duplicated
+
+
+def test_flush_returns_the_trailing_text_and_resets():
+    segmenter = StreamingSegmenter(first_min_words=3)
+    assert segmenter.feed("Here is the first part, and then") == ["Here is the first part,"]
+    assert segmenter.flush() == "and then"
+    assert segmenter.flush() is None
+    # After the reset the next segment is a first segment again (cut at its first clause)
+    assert segmenter.feed("Sure, of course, let me check. ") == ["Sure, of course,"]
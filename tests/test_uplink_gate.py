@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+import uplink_gate
+from uplink_gate import PrerollRing, UplinkGate
+
+FRAME_MS = 20
+FRAME_BYTES = 640 # 20 ms of 16 kHz linear16
+
+
+def _frame(index: int) -> bytes:
+    """A frame whose every byte identifies it (index modulo 256)."""
+    return bytes([index % 256]) * FRAME_BYTES
+
+
+class _Clock:
+    """time.monotonic() stand-in advanced in whole milliseconds, so intervals add up exactly."""
+    def __init__(self):
+        self.ms = 0
+
+    @property
+    def now(self) -> float:
+        return 1000.0 + self.ms / 1000
+
+    def __call__(self):
+        return self.now
+
+
+class _Uplink:
+    """Collects what the gate sends, one entry per frame (or pre-roll view)."""
+    def __init__(self, monkeypatch, **kwargs):
+        self.clock = _Clock()
+        monkeypatch.setattr(uplink_gate.time, "monotonic", self.clock)
+        self.sent = []
+        self.keepalive_times = []
+        self.gate = UplinkGate(self._send, self._keepalive, **kwargs)
+
+    async def _send(self, data):
+        self.sent.append(bytes(data))
+
+    def _keepalive(self):
+        self.keepalive_times.append(self.clock.now)
+
+    def feed(self, speech_flags, start_index: int = 0):
+        async def run():
+            for offset, speech in enumerate(speech_flags):
+                self.clock.ms += FRAME_MS
+                await self.gate.push(_frame(start_index + offset), speech)
+        asyncio.run(run())
+
+    def sent_frames(self) -> list:
+        """Indices of the frames sent, in order (pre-roll views split back into frames)."""
+        data = b"".join(self.sent)
+        return [data[i] for i in range(0, len(data), FRAME_BYTES)]
+
+
+# --- PrerollRing ---
+def test_preroll_ring_keeps_the_most_recent_bytes_oldest_first():
+    ring = PrerollRing(10)
+    assert ring.views() == []
+    ring.write(b"abcdef")
+    assert b"".join(ring.views()) == b"abcdef"
+    ring.write(b"ghijkl") # Wraps around
+    assert len(ring) == 10
+    assert len(ring.views()) == 2
+    assert b"".join(ring.views()) == b"cdefghijkl"
+    ring.write(b"0123456789ABC") # Larger than the ring
+    assert b"".join(ring.views()) == b"3456789ABC"
+    ring.clear()
+    assert len(ring) == 0 and ring.views() == []
+
+
+# --- UplinkGate ---
+def test_silence_is_held_back(monkeypatch):
+    uplink = _Uplink(monkeypatch, keepalive_interval=60.0)
+    uplink.feed([False] * 100)
+    assert uplink.sent == []
+    assert uplink.gate.bytes_captured == 100 * FRAME_BYTES and uplink.gate.bytes_sent == 0
+    assert len(uplink.gate.preroll) == uplink.gate.preroll.capacity
+
+
+def test_onset_sends_the_preroll_then_live_frames(monkeypatch):
+    uplink = _Uplink(monkeypatch, preroll_ms=300, hangover_ms=600, keepalive_interval=60.0)
+    uplink.feed([False] * 40 + [True] * 10)
+    # 300 ms of pre-roll = the 14 frames before the onset plus the onset frame itself
+    assert uplink.sent_frames() == list(range(26, 50))
+    assert len(uplink.gate.preroll) == 0
+
+
+def test_hangover_length(monkeypatch):
+    uplink = _Uplink(monkeypatch, preroll_ms=100, hangover_ms=600, keepalive_interval=60.0)
+    uplink.feed([False] * 10 + [True] * 10 + [False] * 60)
+    sent = uplink.sent_frames()
+    assert sent[:5] == list(range(6, 11)) # 100 ms of pre-roll up to the onset frame
+    hangover = [index for index in sent if index >= 20]
+    assert hangover == list(range(20, 20 + 600 // FRAME_MS)) # Exactly 600 ms after the last speech frame
+    # Once it is over, silence goes back into the pre-roll only
+    assert len(uplink.gate.preroll) == uplink.gate.preroll.capacity
+
+
+def test_speech_resuming_in_the_hangover_keeps_the_stream_continuous(monkeypatch):
+    uplink = _Uplink(monkeypatch, preroll_ms=100, hangover_ms=600, keepalive_interval=60.0)
+    uplink.feed([True] * 5 + [False] * 10 + [True] * 5)
+    assert uplink.sent_frames() == list(range(20)) # Nothing dropped, no pre-roll replayed twice
+
+
+@pytest.mark.parametrize("interval_s", [1.0, 2.5])
+def test_keepalive_cadence_while_silent(monkeypatch, interval_s):
+    uplink = _Uplink(monkeypatch, keepalive_interval=interval_s)
+    start = uplink.clock.now
+    uplink.feed([False] * 500) # 10 s of silence
+    assert len(uplink.keepalive_times) == int(10 / interval_s)
+    gaps = [b - a for a, b in zip([start] + uplink.keepalive_times, uplink.keepalive_times)]
+    assert all(interval_s <= gap < interval_s + FRAME_MS / 1000 + 1e-9 for gap in gaps)
+    assert uplink.gate.keepalives_sent == len(uplink.keepalive_times)
+
+
+def test_no_keepalive_while_audio_flows(monkeypatch):
+    uplink = _Uplink(monkeypatch, hangover_ms=600, keepalive_interval=1.0)
+    uplink.feed([True] * 150) # 3 s of speech
+    assert uplink.keepalive_times == []
+    # The cadence restarts from the last audio sent (the end of the hangover)
+    last_audio = uplink.clock.now + 600 / 1000
+    uplink.feed([False] * 100, start_index=150)
+    assert len(uplink.keepalive_times) == 1
+    assert uplink.keepalive_times[0] >= last_audio + 1.0 - 1e-9
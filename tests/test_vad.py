@@ -0,0 +1,81 @@
+import os
+import wave
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from vad import VoiceActivityDetector
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+# Where speech starts and stops in vad_two_utterances.wav (see fixtures/make_fixtures.py)
+UTTERANCES_MS = ((1000, 3180), (4680, 5680))
+# "go forward ten meters" in recorded_speech.wav, read off the waveform (speech band 12 dB above the room)
+RECORDED_SPEECH_MS = (510, 2140)
+
+
+def _read_wav(name: str):
+    with wave.open(os.path.join(FIXTURES_DIR, name), "rb") as wav:
+        return wav.readframes(wav.getnframes()), wav.getframerate()
+
+
+def _events(pcm: bytes, sample_rate: int, chunk_bytes: int, strict: bool = False) -> list:
+    detector = VoiceActivityDetector(sample_rate)
+    events = []
+    for start in range(0, len(pcm), chunk_bytes):
+        events.extend(detector.process(pcm[start:start + chunk_bytes], strict=strict))
+    return events, detector
+
+
+def test_onsets_and_endpoints_fall_in_the_expected_frames():
+    pcm, sample_rate = _read_wav("vad_two_utterances.wav")
+    events, detector = _events(pcm, sample_rate, chunk_bytes=640) # 20 ms chunks
+    assert [name for name, _ in events] == ["speech_start", "speech_end"] * 2
+    endpoint_ms = detector.endpointer.base_ms
+    for (start_ms, end_ms), (_, onset), (_, endpoint) in zip(UTTERANCES_MS, events[::2], events[1::2]):
+        assert start_ms <= onset <= start_ms + 100 # Within the onset time plus a few frames
+        assert end_ms + endpoint_ms <= endpoint <= end_ms + endpoint_ms + 100
+
+
+def test_events_do_not_depend_on_chunk_size():
+    pcm, sample_rate = _read_wav("vad_two_utterances.wav")
+    expected, _ = _events(pcm, sample_rate, chunk_bytes=640)
+    for chunk_bytes in (2, 318, 4096, len(pcm)):
+        assert _events(pcm, sample_rate, chunk_bytes)[0] == expected
+
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_no_triggers_on_noise(strict):
+    pcm, sample_rate = _read_wav("vad_noise.wav")
+    events, detector = _events(pcm, sample_rate, chunk_bytes=640, strict=strict)
+    assert events == []
+    assert not detector.speaking
+
+
+def test_strict_mode_still_detects_speech():
+    pcm, sample_rate = _read_wav("vad_two_utterances.wav")
+    events, _ = _events(pcm, sample_rate, chunk_bytes=640, strict=True)
+    onsets = [ms for name, ms in events if name == "speech_start"]
+    assert len(onsets) == 2
+    assert all(start_ms <= onset <= start_ms + 160 for (start_ms, _), onset in zip(UTTERANCES_MS, onsets))
+
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_recorded_speech_onset_and_endpoint(strict):
+    pcm, sample_rate = _read_wav("recorded_speech.wav")
+    events, detector = _events(pcm, sample_rate, chunk_bytes=640, strict=strict)
+    assert [name for name, _ in events] == ["speech_start", "speech_end"]
+    (_, onset), (_, endpoint) = events
+    start_ms, end_ms = RECORDED_SPEECH_MS
+    assert start_ms <= onset <= start_ms + (160 if strict else 100)
+    # The microphone's DC offset and rumble after the last word must not hold the turn open
+    endpoint_ms = detector.endpointer.base_ms
+    assert end_ms + endpoint_ms <= endpoint <= end_ms + endpoint_ms + 100
+
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_no_triggers_on_recorded_room_noise(strict):
+    pcm, sample_rate = _read_wav("recorded_room.wav")
+    events, detector = _events(pcm, sample_rate, chunk_bytes=640, strict=strict)
+    assert events == []
+    assert not detector.speaking
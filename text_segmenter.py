@@ -0,0 +1,207 @@
+import random
+import re
+import time
+
+# --- Incremental splitting of streamed LLM text into speakable segments ---
+class StreamingSegmenter:
+    """
+    Splits streamed text into segments for TTS, looking at each new character once.
+
+    A sentence boundary is sentence-ending punctuation (or a newline) followed by
+    whitespace, so decimals like "3.5" and abbreviations like "Dr. Smith" do not split.
+    The first segment of a turn is emitted early to cut time-to-first-audio: at the
+    first clause boundary after `first_min_words` words, or as soon as it reaches
+    `first_max_words` words. Later segments are played while the next ones are being
+    fetched, so they are allowed to be longer: short sentences are merged until
+    `min_words`, and a runaway sentence is cut at a clause (or word) boundary
+    after `max_words`.
+    """
+    SENTENCE_ENDINGS = frozenset(".?!;:")
+    CLAUSE_BREAKS = frozenset(",-–—)")
+    CLOSING_MARKS = "\"')”’"
+    ABBREVIATIONS = frozenset({"mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "vs.", "etc.",
+                               "e.g.", "i.e.", "approx."})
+    NUMBER_ABBREVIATIONS = frozenset({"no."}) # Abbreviations only before a number: "No. 5", but "is no. Then"
+    # A finished word (followed by whitespace), or a newline on its own (blank line)
+    _TOKEN_RE = re.compile(r"(\S+)(\s)|(\n)")
+    _NEXT_CHAR_RE = re.compile(r"\s*(\S)")
+
+    def __init__(self, first_min_words: int = 3, first_max_words: int = 10,
+                 min_words: int = 6, max_words: int = 40):
+        self.first_min_words = first_min_words
+        self.first_max_words = first_max_words
+        self.min_words = min_words
+        self.max_words = max_words
+        self.reset()
+
+    def reset(self):
+        """Starts a new turn: the next segment will be treated as the first one."""
+        self._buf = ""
+        self._scan = 0 # Index of the first character not yet tokenized
+        self._words = 0 # Completed words in the pending segment
+        self._last_clause = -1 # Index just after the latest clause break
+        self._last_clause_words = 0
+        self._last_sentence = -1 # Index just after the latest (too short) sentence
+        self._last_sentence_words = 0
+        self._segments_emitted = 0
+        self._word_limit = self.first_max_words
+
+    def feed(self, text: str) -> list:
+        """Adds a chunk of streamed text and returns any segments that are now complete."""
+        buf = self._buf + text
+        segments = []
+        start = 0 # Start of the pending segment in buf
+        resume = self._scan
+        # Only the new text (plus any word left unfinished by the last chunk) is tokenized
+        for match in self._TOKEN_RE.finditer(buf, self._scan):
+            word, whitespace = match.group(1, 2)
+            if word is not None:
+                if word[-1].isalnum() and whitespace != "\n" and self._words + 1 < self._word_limit:
+                    self._words += 1
+                    resume = match.end()
+                    continue # Fast path: a plain word in the middle of a segment
+                next_char = ""
+                if whitespace != "\n" and word.lower() in self.NUMBER_ABBREVIATIONS:
+                    following = self._NEXT_CHAR_RE.match(buf, match.end())
+                    if following is None:
+                        break # Decided once the next word shows whether a number follows
+                    next_char = following.group(1)
+                self._words += 1
+                boundary = self._boundary_after(word, whitespace, match.end(1), next_char)
+            elif self._words >= self._current_min_words():
+                boundary = (match.start(3), self._words) # Blank line ends the segment
+            else:
+                boundary = None
+
+            if boundary is not None:
+                cut, words = boundary
+                segments.append(buf[start:cut].strip())
+                self._after_cut(cut, words)
+                start = cut
+            resume = match.end()
+
+        # Keep only the pending text, with positions made relative to it again
+        self._buf = buf[start:]
+        self._scan = resume - start
+        if self._last_clause >= 0:
+            self._last_clause -= start
+        if self._last_sentence >= 0:
+            self._last_sentence -= start
+        return [segment for segment in segments if segment]
+
+    def flush(self) -> str:
+        """Returns whatever text is left at the end of a turn (or None) and resets."""
+        remainder = self._buf.strip()
+        self.reset()
+        return remainder or None
+
+    def _current_min_words(self) -> int:
+        return self.first_min_words if self._segments_emitted == 0 else self.min_words
+
+    def _boundary_after(self, word: str, whitespace: str, index: int, next_char: str = ""):
+        """
+        Decides whether the segment should end after `word`, which finishes at `index`
+        and is followed by `next_char` (only looked up for NUMBER_ABBREVIATIONS).
+        Returns (cut_index, words_before_cut) or None.
+        """
+        first = self._segments_emitted == 0
+        min_words = self._current_min_words()
+        stripped = word.rstrip(self.CLOSING_MARKS)
+        last_char = stripped[-1] if stripped else ""
+        lower = word.lower()
+        abbreviation = lower in self.ABBREVIATIONS or (lower in self.NUMBER_ABBREVIATIONS and next_char.isdigit())
+
+        if (last_char in self.SENTENCE_ENDINGS and not abbreviation) or whitespace == "\n":
+            if self._words >= min_words:
+                return index, self._words
+            self._last_sentence, self._last_sentence_words = index, self._words
+        elif last_char in self.CLAUSE_BREAKS:
+            if first and self._words >= self.first_min_words:
+                return index, self._words
+            self._last_clause, self._last_clause_words = index, self._words
+
+        if self._words >= self._word_limit:
+            # Prefer the latest natural break that still leaves a reasonable segment
+            for cut, words in ((self._last_sentence, self._last_sentence_words),
+                               (self._last_clause, self._last_clause_words)):
+                if cut >= 0 and words >= min_words:
+                    return cut, words
+            return index, self._words
+        return None
+
+    def _after_cut(self, cut: int, words: int):
+        """Updates the bookkeeping once the text up to `cut` (`words` words) was emitted."""
+        self._segments_emitted += 1
+        self._word_limit = self.max_words
+        self._words -= words
+        if self._last_clause > cut:
+            self._last_clause_words -= words
+        else:
+            self._last_clause, self._last_clause_words = -1, 0
+        self._last_sentence, self._last_sentence_words = -1, 0
+
+
+# --- Micro-benchmark: python text_segmenter.py ---
+def _synthetic_gemini_stream(n_chars: int, endings: str = ".?!", seed: int = 7):
+    """Sentences cut into chunks of the sizes Gemini tends to stream."""
+    rng = random.Random(seed)
+    vocabulary = ("the quick answer is that dinosaurs roamed earth for millions of years and "
+                  "their diverse sizes shapes and habits still fascinate scientists today").split()
+    text = []
+    length = 0
+    while length < n_chars:
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(4, 22))]
+        if len(words) > 8:
+            words[rng.randint(3, len(words) - 3)] += ","
+        sentence = " ".join(words).capitalize() + rng.choice(endings) + " "
+        text.append(sentence)
+        length += len(sentence)
+    text = "".join(text)
+    chunks, pos = [], 0
+    while pos < len(text):
+        size = rng.randint(5, 60)
+        chunks.append(text[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def _time_per_chunk(segment_fn, chunks):
+    """Runs segment_fn(chunk) over the stream; returns (total_ms, worst_chunk_us, segments)."""
+    segments = 0
+    worst = 0.0
+    start_time = time.perf_counter()
+    for chunk in chunks:
+        chunk_start = time.perf_counter()
+        segments += len(segment_fn(chunk))
+        worst = max(worst, time.perf_counter() - chunk_start)
+    return (time.perf_counter() - start_time) * 1000, worst * 1e6, segments
+
+
+def _legacy_segmenter():
+    """The previous play_tts logic: re-joins and re-scans the whole buffer on every chunk."""
+    pending = []
+
+    def feed(chunk):
+        nonlocal pending
+        pending.append(chunk)
+        words = "".join(pending).strip().split()
+        segment = []
+        for word in words:
+            segment.append(word)
+            if word[-1] in {'.', '?', '!', ':', ';'}:
+                pending = [" ".join(words[len(segment):])]
+                return [" ".join(segment)]
+        return []
+    return feed
+
+
+if __name__ == "__main__":
+    cases = (("sentences", ".?!"), ("run-on clauses", ","))
+    for label, endings in cases:
+        for n_chars in (2_000, 20_000, 100_000):
+            chunks = _synthetic_gemini_stream(n_chars, endings)
+            streaming = _time_per_chunk(StreamingSegmenter().feed, chunks)
+            legacy = _time_per_chunk(_legacy_segmenter(), chunks)
+            print(f"{label:>14} {n_chars:>7} chars / {len(chunks):>5} chunks | "
+                  f"streaming {streaming[0]:9.2f}ms total, worst chunk {streaming[1]:8.1f}us | "
+                  f"legacy {legacy[0]:9.2f}ms total, worst chunk {legacy[1]:8.1f}us")
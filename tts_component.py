@@ -1,30 +1,118 @@
-import queue
 import threading
 import time
 import os
 import requests
-import subprocess
 import json 
-import re # For sentence splitting
+
+from audio_cache import AudioCache
+from audio_sink import AudioSink, decode_mp3
+from backchannel import BackchannelBank, BackchannelScheduler
+from call_scheduler import BACKGROUND, INTERACTIVE, PREFETCH, CallScheduler, limit_from_env, retry_after_s
+from event_runtime import AwaitableEvent, HandoffQueue, QueueClosed
+from hedging import HedgedRouter, HedgePolicy, Provider, ProviderHealth
+from http_pool import PooledHTTPClient, TTFBStats
+from metrics import console
+from text_normalizer import StreamingNormalizer
+from text_segmenter import StreamingSegmenter
+from tts_pipeline import SynthesisJob, SynthesisPipeline
+from turn_control import TurnController, TurnToken
 
 class TTSPlayer:
-    def __init__(self, llm_to_tts_queue: queue.Queue,
+    def __init__(self, llm_to_tts_queue: HandoffQueue,
                  interrupt_bot_event: threading.Event,
                  bot_speaking_event: threading.Event,
-                 exit_event: threading.Event):
+                 exit_event: threading.Event,
+                 turn_controller: TurnController = None,
+                 audio_sink_factory=None,
+                 http_client: PooledHTTPClient = None,
+                 audio_cache: AudioCache = None,
+                 fetch_executor=None,
+                 playback_listener=None,
+                 tts_providers: list = None,
+                 recorder=None):
         
         self.llm_to_tts_queue = llm_to_tts_queue
         self.interrupt_bot_event = interrupt_bot_event
         self.bot_speaking_event = bot_speaking_event
         self.exit_event = exit_event
+        self.turn_controller = turn_controller if turn_controller is not None else TurnController()
+        self.current_turn = None # TurnToken of the response being spoken
+        self.current_turn_complete = False # True once its end_response has arrived
+        self.current_turn_segments = 0 # Segments of it handed to the pipeline so far
+
+        # Optional SessionRecorder: segments, their audio and when playback started, for replay
+        self.recorder = recorder
+
+        # Splits streamed LLM text into speakable segments, emitting the first one early
+        self.normalizer = StreamingNormalizer() # Markup, emojis, numbers and abbreviations as spoken
+        self.segmenter = StreamingSegmenter()
+
+        # One output stream for the whole session, fed through a bounded ring buffer
+        # (a session server passes a factory for a network sink with the same interface).
+        # playback_listener receives everything sent to the device, e.g. as an echo reference.
+        sink_factory = audio_sink_factory if audio_sink_factory is not None else AudioSink
+        self.audio_sink = sink_factory(audio_format=self.AUDIO_FORMAT,
+                                       sample_rate=self.PCM_SAMPLE_RATE,
+                                       should_abort=self.interrupt_bot_event.is_set,
+                                       on_drained=self._on_audio_drained,
+                                       on_played=playback_listener)
+
+        # Keep-alive connections to Unreal Speech, shared by all synthesis workers
+        # (and by all sessions when a shared client is passed in; its owner warms and closes it)
+        self.http_client = http_client if http_client is not None else PooledHTTPClient(
+            self.UNREAL_SPEECH_BASE_URL, pool_size=self.PREFETCH_DEPTH + 1)
+        self._owned_http_clients = [self.http_client] if http_client is None else []
+        self._prepared = False # Audio device and owned connections opened (see prepare())
+        self.ttfb_stats = TTFBStats()
+
+        # Unreal Speech backends in preference order (a second one if UNREAL_SPEECH_FALLBACK_URL
+        # is set). A request still waiting for its first byte after the backend's p95 is hedged;
+        # failures fail over, and latency/error rates drive each backend's circuit breaker.
+        # Each backend's CallScheduler keeps its requests within quota, first segments first.
+        if tts_providers is None:
+            tts_providers = self.create_tts_providers(self.http_client, self.turn_controller.metrics)
+            self._owned_http_clients.extend(provider.target for provider in tts_providers[1:])
+        self.tts_router = HedgedRouter(tts_providers, self._request_speech,
+                                       policy=HedgePolicy(enabled=self.HEDGING_ENABLED),
+                                       discard=self._discard_speech,
+                                       queue_wait_ms=lambda result: result[2].wait_ms)
+
+        # Repeated phrases (greetings, the error message, confirmations) are played from cache
+        self.audio_cache = audio_cache if audio_cache is not None else AudioCache(
+            max_bytes=self.AUDIO_CACHE_MAX_BYTES, disk_dir=self.AUDIO_CACHE_DIR,
+            max_disk_bytes=self.AUDIO_CACHE_DISK_MAX_BYTES)
 
-        self.current_llm_utterance_chunks = [] # To accumulate chunks for TTS
-        self.current_player_process = None # To store ffplay process for interruption
+        # Synthesis runs ahead of playback: segment N+1 is fetched while segment N plays
+        self.synthesis_pipeline = SynthesisPipeline(self._fetch_segment_audio,
+                                                    prefetch_depth=self.PREFETCH_DEPTH,
+                                                    executor=fetch_executor)
+        if isinstance(self.interrupt_bot_event, AwaitableEvent):
+            # Wake the idle playback loop as soon as an interruption is signalled
+            self.interrupt_bot_event.add_listener(self.synthesis_pipeline.wake)
+
+        # Short acknowledgement played while the LLM is still thinking (optional)
+        self.backchannel = BackchannelScheduler(BackchannelBank(), self.audio_sink.write_pcm,
+                                                delay_ms=self.BACKCHANNEL_DELAY_MS,
+                                                speaking_event=self.bot_speaking_event)
 
     DEFAULT_VOICE_ID = "Melody"  # Example VoiceId, change as needed (or "Will" as in the commented out code)
     DEFAULT_SPEED = 0.8  # Range: -1.0 to 1.0 (0 is normal)
     DEFAULT_PITCH = 0  # Range: -0.5 to 0.5 (0 is normal)
-    foundPunctuation = False # Flag to track if punctuation is found in the current segment
+    PREFETCH_DEPTH = 3 # Max segments fetching/buffered/playing at once
+    UNREAL_SPEECH_BASE_URL = os.getenv("UNREAL_SPEECH_BASE_URL", "https://api.v8.unrealspeech.com/") # Overridable for local stand-ins
+    UNREAL_SPEECH_FALLBACK_URL = os.getenv("UNREAL_SPEECH_FALLBACK_URL") # Optional second backend for failover
+    HEDGING_ENABLED = os.getenv("VOICE_HEDGING", "1") == "1" # Duplicate requests stuck past the backend's p95
+    TTS_TIMEOUT = (5, 10) # Connect / between-bytes seconds; slow first bytes are hedged well before this
+    TTS_SLOW_MS = 2500 # A backend whose p95 time to first byte exceeds this is skipped for a while
+    AUDIO_FORMAT = "mp3" # "pcm" requests raw 16-bit PCM from Unreal Speech and skips MP3 decoding
+    PCM_SAMPLE_RATE = 24000 # Output rate; must match the provider's PCM rate when AUDIO_FORMAT is "pcm"
+    AUDIO_CACHE_MAX_BYTES = 16 * 1024 * 1024 # In-memory budget for synthesized clips
+    AUDIO_CACHE_DIR = os.getenv("TTS_AUDIO_CACHE_DIR") # Optional on-disk tier (read via mmap)
+    AUDIO_CACHE_DISK_MAX_BYTES = int(os.getenv("TTS_AUDIO_CACHE_DISK_MB", "256")) * 1024 * 1024 # Its budget
+    BACKCHANNEL_ENABLED = os.getenv("TTS_BACKCHANNEL", "0") == "1" # Play "Okay."-style clips while the answer is generated
+    BACKCHANNEL_DELAY_MS = 700 # Only if no real audio for the turn is ready by then
+    UNREAL_SPEECH_RATE_PER_S = limit_from_env("UNREAL_SPEECH_RATE_PER_S", "10") # Quota per backend; 0 = unlimited
+    UNREAL_SPEECH_MAX_IN_FLIGHT = limit_from_env("UNREAL_SPEECH_MAX_IN_FLIGHT", "8") # Open streams per backend
 
     def simulate_speech(self, text: str):
         words = text.split()
@@ -33,78 +121,134 @@ class TTSPlayer:
             print(word, end=" ", flush=True)
             time.sleep(0.1)  # Simulate a short delay for each word
 
-    def _play_audio_stream(self, response_stream, text_for_logging: str):
+    def _play_audio_stream(self, job: SynthesisJob):
         """
-        Helper to play the audio stream from Unreal Speech, handling ffplay and interruptions.
-        This is extracted logic from synthesize_speech_v8 to be reusable.
+        Feeds the audio of one synthesized segment into the session's audio sink as it
+        arrives, handling interruptions. The audio itself is fetched by the synthesis pipeline.
         """
-        player_command = ["ffplay", "-autoexit", "-", "-nodisp", "-loglevel", "quiet"]
-        player_process = subprocess.Popen(
-            player_command,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-        self.current_player_process = player_process # Store reference to enable external interruption
+        text_for_logging = job.text
+        console.print(f"[TTS-Bot speaking:] {text_for_logging}")
+        first_chunk = True
+        for chunk in job.iter_audio():
+            # Check for interruption *while* streaming
+            if self.interrupt_bot_event.is_set():
+                console.print(f"\n[TTS] Playback interrupted for text: '{text_for_logging[:50]}...'")
+                if self.recorder is not None:
+                    self.recorder.event("playback_interrupted", segment=job.record_id)
+                self._discard_pending_speech()
+                return
+            if first_chunk:
+                self.backchannel.on_real_audio(job.turn) # Real audio follows (or replaces) the clip
+                if self.AUDIO_FORMAT == "pcm" and chunk[:4] == b"RIFF":
+                    chunk = chunk[44:] # Skip the WAV header, the sink expects bare samples
+            self.audio_sink.write(chunk)
+            if first_chunk:
+                self._mark(job.turn, "first_audio_out")
+                if self.recorder is not None:
+                    self.recorder.event("playback_start", segment=job.record_id)
+                first_chunk = False
+            if job.cancelled.is_set():
+                self.audio_sink.flush() # A cancel raced with this write; drop what slipped in
+                return
+        console.print(f"[TTS] Finished queuing speech for text: '{text_for_logging[:50]}...'")
 
-        start_time = time.time()
-        first_byte_time = None
-        
+    def _discard_pending_speech(self):
+        """Silences the speaker, drops every prefetched segment and resets the interruption."""
+        self.backchannel.cancel()
+        self.audio_sink.flush() # Instant cut: unplayed audio is simply dropped from the buffer
+        dropped = self.synthesis_pipeline.discard_all()
+        if dropped:
+            console.print(f"[TTS] Discarded {dropped} prefetched segment(s).")
+        self.interrupt_bot_event.clear() # Clear the event for the next turn
+        self.bot_speaking_event.clear()
+
+    def _on_turn_cancelled(self, turn: TurnToken):
+        """
+        Cancel callback for the turn being spoken (runs in the cancelling thread):
+        stops audio, aborts open Unreal Speech responses and drops queued LLM text.
+        """
+        self._discard_pending_speech()
+        self.turn_controller.report_silence(turn, self.audio_sink.output_latency())
+        stale_items = self.llm_to_tts_queue.drain()
+        if stale_items:
+            console.print(f"[TTS] Dropped {len(stale_items)} queued LLM item(s) of turn {turn.turn_id}.")
+
+    @staticmethod
+    def _mark(turn: TurnToken, name: str):
+        """Records a stage on the turn's latency timeline (see metrics.TurnTimeline)."""
+        if turn is not None:
+            turn.timeline.mark(name)
+
+    def _maybe_finish_turn(self):
+        """Marks the current turn finished once all of its audio has been played."""
+        turn = self.current_turn
+        if turn is not None and self.current_turn_complete and not self.synthesis_pipeline.has_pending():
+            self.turn_controller.finish(turn)
+
+    @classmethod
+    def create_tts_providers(cls, http_client: PooledHTTPClient, metrics=None) -> list:
+        """
+        The backend on `http_client`, plus one with its own pool for UNREAL_SPEECH_FALLBACK_URL.
+        Queue waits in their schedulers are exported to `metrics` (a MetricsRecorder), if given.
+        """
+        def scheduler(name: str) -> CallScheduler:
+            return CallScheduler(name, cls.UNREAL_SPEECH_RATE_PER_S, max_in_flight=cls.UNREAL_SPEECH_MAX_IN_FLIGHT,
+                                 metrics=metrics)
+
+        providers = [Provider("unreal-speech", http_client, ProviderHealth(slow_ms=cls.TTS_SLOW_MS),
+                              scheduler("unreal-speech"))]
+        if cls.UNREAL_SPEECH_FALLBACK_URL:
+            providers.append(Provider("unreal-speech-fallback",
+                                      PooledHTTPClient(cls.UNREAL_SPEECH_FALLBACK_URL, pool_size=2),
+                                      ProviderHealth(slow_ms=cls.TTS_SLOW_MS), scheduler("unreal-speech-fallback")))
+        return providers
+
+    def _request_speech(self, provider: Provider, text: str, job: SynthesisJob = None):
+        """
+        HedgedRouter call: one synthesis request to `provider`, once its scheduler admits it
+        at the job's priority. Returns (response, warm, grant); releasing the grant when the
+        response is closed frees the backend slot. A job that is cancelled, or answered by
+        the other attempt, while still queued raises CallCancelled without being sent.
+        """
+        priority = job.priority if job is not None else INTERACTIVE
+        grant = provider.scheduler.acquire(priority, cancelled=job.settled if job is not None else None)
+        if job is not None:
+            self._mark(job.turn, "tts_request_sent") # Admitted: the request goes out now
         try:
-            for chunk in response_stream.iter_content(chunk_size=1024):
-                # Check for interruption *while* streaming
-                if self.interrupt_bot_event.is_set():
-                    print(f"\n[TTS] Playback interrupted for text: '{text_for_logging[:50]}...'")
-                    player_process.kill() # Immediately stop ffplay
-                    self.interrupt_bot_event.clear() # Clear the event for the next turn
-                    break # Exit the chunk processing loop
-
-                if chunk:
-                    if first_byte_time is None:
-                        first_byte_time = time.time()
-                        ttfb = int((first_byte_time - start_time) * 1000)
-                        print(f"[TTS] Time to First Byte (TTFB): {ttfb}ms for text: '{text_for_logging[:50]}...'")
-                    player_process.stdin.write(chunk)
-                    player_process.stdin.flush()
-        except requests.exceptions.RequestException as e:
-            print(f"[TTS] Request failed during streaming: {e}")
-            if player_process.poll() is None: # If player is still running
-                player_process.kill()
+            r, warm = self.synthesize_speech_v8(text, provider=provider)
+        except BaseException:
+            grant.release()
             raise
-        finally:
-            if player_process.stdin:
-                try:
-                    player_process.stdin.close()
-                except BrokenPipeError:
-                    # This can happen if ffplay exits early (e.g., due to an error or user closing it)
-                    pass
-            player_process.wait() # Wait for ffplay to finish
-            self.current_player_process = None # Clear reference
-            print(f"[TTS] Finished playing speech for text: '{text_for_logging[:50]}...'")
+        return r, warm, grant
 
+    @staticmethod
+    def _discard_speech(result):
+        """Closes the response of the slower hedged attempt and frees its backend slot."""
+        r, _, grant = result
+        r.close()
+        grant.release()
 
-    def synthesize_speech_v8(self, text: str, voice_id: str = None, speed: float = None, pitch: float = None):
+    def synthesize_speech_v8(self, text: str, voice_id: str = None, speed: float = None, pitch: float = None,
+                             provider: Provider = None):
         """
-        Generates speech from text using Unreal Speech API and plays it.
+        Requests speech for text from the Unreal Speech API.
 
         Args:
             text (str): The text to synthesize.
             voice_id (str, optional): The VoiceId to use. Defaults to self.DEFAULT_VOICE_ID.
             speed (float, optional): Speech speed. Defaults to None (API default or class default if set).
             pitch (float, optional): Speech pitch. Defaults to None (API default or class default if set).
-        """
-        # Set bot speaking event before API call
-        self.bot_speaking_event.set()
+            provider (Provider, optional): Backend to send the request to. Defaults to the preferred one.
 
+        Returns:
+            tuple: (requests.Response, bool) - the open streaming response, which the caller
+            must close, and whether it was served over an already-warm pooled connection.
+        """
         UNREAL_SPEECH_API_KEY = os.getenv("UNREAL_SPEECH_API_KEY")
 
         if not UNREAL_SPEECH_API_KEY:
-            # Unset bot_speaking_event on error
-            self.bot_speaking_event.clear() 
             raise ValueError("UNREAL_SPEECH_API_KEY environment variable not set.")
 
-        UNREAL_SPEECH_STREAM_URL = "https://api.v8.unrealspeech.com/stream"
-
         headers = {
             "Authorization": f"Bearer {UNREAL_SPEECH_API_KEY}",
             "Content-Type": "application/json"
@@ -116,128 +260,216 @@ class TTSPlayer:
             "speed": speed if speed is not None else self.DEFAULT_SPEED,
             "pitch": pitch if pitch is not None else self.DEFAULT_PITCH,
         }
+        if self.AUDIO_FORMAT == "pcm":
+            payload["Codec"] = "pcm_s16le"
 
+        http_client = provider.target if provider is not None else self.tts_router.providers[0].target
+        stream_url = http_client.base_url.rstrip("/") + "/stream"
+        r, warm = http_client.post_stream(stream_url, headers=headers, json=payload, timeout=self.TTS_TIMEOUT)
+        if r.status_code == 429 and provider is not None:
+            provider.scheduler.throttled(retry_after_s(r.headers)) # Over quota: hold back its other requests
+        if r.status_code != 200:
+            error_message = f"Unreal Speech API Error: {r.status_code}"
+            try:
+                error_detail = r.json()
+                error_message += f" - {error_detail.get('message', r.text)}"
+            except json.JSONDecodeError:
+                error_message += f" - {r.text}"
+            r.close()
+            raise requests.exceptions.HTTPError(error_message, response=r)
+        return r, warm
+
+    def _fetch_segment_audio(self, job: SynthesisJob):
+        """
+        Runs in a synthesis pipeline worker: serves the segment from the audio cache,
+        or downloads its audio and hands it to playback chunk by chunk (then caches it).
+        """
+        cache_key = AudioCache.make_key(job.text, self.DEFAULT_VOICE_ID, self.DEFAULT_SPEED,
+                                        self.DEFAULT_PITCH, self.AUDIO_FORMAT)
+        cached_audio = self.audio_cache.get(cache_key)
+        if self.recorder is not None:
+            job.record_id = self.recorder.tts_segment(job.turn.turn_id if job.turn is not None else 0,
+                                                      job.text, cached=cached_audio is not None)
+        if cached_audio is not None:
+            console.print(f"[TTS] Audio cache hit for text: '{job.text[:50]}...'")
+            job.push(cached_audio)
+            if self.recorder is not None:
+                self.recorder.tts_audio(job.record_id, cached_audio)
+            return
+
+        start_time = time.time()
+        first_byte_time = None
+        audio_chunks = []
         try:
-            with requests.post(UNREAL_SPEECH_STREAM_URL, stream=True, headers=headers, json=payload, timeout=30) as r:
-                if r.status_code != 200:
-                    error_message = f"Unreal Speech API Error: {r.status_code}"
-                    try:
-                        error_detail = r.json()
-                        error_message += f" - {error_detail.get('message', r.text)}"
-                    except json.JSONDecodeError:
-                        error_message += f" - {r.text}"
-                    
-                    # Unset bot_speaking_event on error
-                    self.bot_speaking_event.clear()
-                    raise requests.exceptions.HTTPError(error_message, response=r)
+            provider, (r, warm, grant) = self.tts_router.call(job.text, job)
+            job.attach_response(r)
+            with r, grant:
+                for chunk in r.iter_content(chunk_size=4096):
+                    if job.cancelled.is_set():
+                        break
+                    if chunk:
+                        if first_byte_time is None:
+                            first_byte_time = time.time()
+                            self._mark(job.turn, "first_tts_byte")
+                            ttfb = int((first_byte_time - start_time) * 1000)
+                            self.ttfb_stats.record(ttfb, warm)
+                            connection_state = "warm" if warm else "cold"
+                            console.print(f"[TTS] Time to First Byte (TTFB): {ttfb}ms ({connection_state} connection, "
+                                          f"{provider.name}) for text: '{job.text[:50]}...'")
+                        job.push(chunk)
+                        audio_chunks.append(chunk)
+                        if self.recorder is not None:
+                            self.recorder.tts_audio(job.record_id, chunk)
+            if not job.cancelled.is_set(): # Only complete clips are cached
+                self.audio_cache.put(cache_key, b"".join(audio_chunks))
+        except Exception as e:
+            if not job.cancelled.is_set(): # Errors after cancel() closed the response are expected
+                job.error = e
+                console.print(f"[TTS] Request failed for text: '{job.text[:50]}...': {e}")
 
-                self.simulate_speech(text)  # Simulate speech output in console for debugging
-                print()  # For clarity in console output
-                # Now use the helper function to play the stream
-                self._play_audio_stream(r, text) # Pass the response object and original text for logging  <----- Uncomment to play TTS audio
+    def _render_backchannel_clip(self, text: str) -> bytes:
+        """Synthesizes one acknowledgement (through the audio cache) and decodes it to PCM."""
+        job = SynthesisJob(text, priority=BACKGROUND) # Rendered ahead of time; nobody is waiting
+        self._fetch_segment_audio(job)
+        job.finish()
+        if job.error is not None:
+            raise job.error
+        audio = b"".join(bytes(chunk) for chunk in job.iter_audio())
+        if self.AUDIO_FORMAT == "pcm":
+            return audio[44:] if audio[:4] == b"RIFF" else audio
+        return decode_mp3(audio, self.PCM_SAMPLE_RATE)
 
-        except requests.exceptions.RequestException as e:
-            print(f"[TTS] Request failed for text: '{text[:50]}...': {e}")
-            # Unset bot_speaking_event on error
+    def _enqueue_segment(self, text: str, turn: TurnToken = None):
+        """Hands a segment to the synthesis pipeline; blocks while the prefetch window is full."""
+        if turn is not None and turn.cancelled:
+            return
+        self._mark(turn, "first_segment_ready")
+        # The turn's first segment is what the caller is waiting for; later ones are prefetches
+        priority = INTERACTIVE if self.current_turn_segments == 0 else PREFETCH
+        self.current_turn_segments += 1
+        job = self.synthesis_pipeline.submit(text, turn, priority)
+        if job is not None:
+            self.bot_speaking_event.set() # The bot is committed to speaking from here on
+
+    def _on_audio_drained(self):
+        """Called by the audio sink when it runs out of audio to play."""
+        if not self.synthesis_pipeline.has_pending():
             self.bot_speaking_event.clear()
-            raise
-        finally:
-            # Ensure bot_speaking_event is cleared *after* playback or interruption
-            if self.bot_speaking_event.is_set():
-                self.bot_speaking_event.clear()
+            self._maybe_finish_turn()
 
+    def _playback_loop(self):
+        """
+        Plays synthesized segments in order as soon as their audio is available.
+        Runs in its own thread next to play_tts, which keeps feeding the pipeline.
+        """
+        while True:
+            try:
+                job = self.synthesis_pipeline.next_job() # Wakes on a new segment or an interruption
+            except QueueClosed:
+                break
+
+            if job is None:
+                # Interruption while nothing is being fed to the sink (e.g. between segments)
+                if self.interrupt_bot_event.is_set():
+                    self._discard_pending_speech()
+                continue
+
+            try:
+                if self.interrupt_bot_event.is_set():
+                    self._discard_pending_speech()
+                elif not job.cancelled.is_set():
+                    self._play_audio_stream(job)
+            except Exception as e:
+                console.print(f"[TTS] Unexpected error in playback loop: {e}")
+            finally:
+                self.synthesis_pipeline.release(job)
+                if not self.synthesis_pipeline.has_pending() and self.audio_sink.is_idle(grace=0):
+                    self.bot_speaking_event.clear()
+                    self._maybe_finish_turn()
+
+    def prepare(self):
+        """
+        Opens the audio device and the TTS connections (idempotent). Blocking; run at startup
+        alongside the other components' warm-up so the first sentence pays for neither.
+        """
+        if self._prepared:
+            return
+        self._prepared = True
+        self.audio_sink.open()
+        for http_client in self._owned_http_clients:
+            # Open the connection pool before the first sentence needs it, and keep it open between turns
+            http_client.warm()
+            http_client.start_keepalive()
+        if self.BACKCHANNEL_ENABLED:
+            self.backchannel.bank.prepare(self._render_backchannel_clip)
 
     def play_tts(self):
         """
-        Continuously pulls text chunks from queue, accumulates them,
-        and triggers audio playback for meaningful segments.
+        Continuously pulls text chunks from queue, splits them into segments as they stream in,
+        and hands each segment to the synthesis pipeline for playback.
         Includes interruption logic. This function is designed to be run in a separate thread.
         """
+        self.prepare()
+        playback_thread = threading.Thread(target=self._playback_loop, name="TTS_Playback_Thread")
+        playback_thread.start()
+
         print("[TTS] Player ready.")
-        while not self.exit_event.is_set() and not self.interrupt_bot_event.is_set():
+        while not self.exit_event.is_set():
             try:
-                # Use get() with a timeout to allow loop to check exit_event periodically
-                item = self.llm_to_tts_queue.get(timeout=0.1) 
+                # Blocks until the LLM hands over the next item; close() on shutdown ends the loop
+                item = self.llm_to_tts_queue.get()
+                turn = item.get("turn")
                 
-                if item["type"] == "start_response":
-                    self.current_llm_utterance_chunks = []
-                    print("[TTS] Starting new LLM utterance...")
+                if turn is not None and turn.cancelled:
+                    pass # Leftover of a turn the user barged in on
+
+                elif item["type"] == "start_response":
+                    self.normalizer.reset()
+                    self.segmenter.reset()
+                    self.current_turn, self.current_turn_complete = turn, False
+                    self.current_turn_segments = 0
+                    if turn is not None:
+                        turn.add_cancel_callback(self._on_turn_cancelled)
+                    if self.BACKCHANNEL_ENABLED:
+                        self.backchannel.arm(turn)
+                    console.print("[TTS] Starting new LLM utterance...")
 
                 elif item["type"] == "chunk":
-                    chunk_text = item["text"]
-                    self.current_llm_utterance_chunks.append(chunk_text)
-
-                    # Accumulate text and check for natural breakpoints or length
-                    combined_text = "".join(self.current_llm_utterance_chunks).strip()
-                    # print("[TTS] Accumulated text chunk:", combined_text, "...\n") # Print first 50 chars for debugging
-
-                    segment_to_synthesize = ""
-                    remaining_text = ""
-                    
-                    "Dinosaurs are fascinating creatures that roamed the Earth millions of years ago. Their diverse sizes and shapes"
-
-                    words_in_combined_text = combined_text.split()
-                    for word in words_in_combined_text:
-                        last_character = word[-1]
-                        segment_to_synthesize += word + " "
-                        if last_character in {'.', '?', '!', ':', ';'}:  # Check for sentence-ending punctuation
-                            self.foundPunctuation = True
-                            break
-                    
-                    if not self.foundPunctuation:
-                        segment_to_synthesize = ""
-                        remaining_text = combined_text  # If no punctuation found, keep accumulating
-                    else:
-                        for word in words_in_combined_text[len(segment_to_synthesize.split()):]:
-                            remaining_text += word + " "
-                            self.foundPunctuation = False  # Reset for next segment
-
-                    # print(f"[TTS] Synthesize segment: '{segment_to_synthesize}...'")
-                    # print(f"[TTS] Remaining text for next segment: '{remaining_text}...'")
-
-                    if segment_to_synthesize:
-                        try:
-                            self.synthesize_speech_v8(segment_to_synthesize)
-                        except Exception as e:
-                            print(f"[TTS] Error during speech synthesis for segment: '{segment_to_synthesize}...': {e}")
-                            # The synthesize_speech_v8 should clear bot_speaking_event on error,
-                            # but ensuring it here too for robustness.
-                            self.bot_speaking_event.clear()
-
-                        # Reset current chunks to remaining text for next iteration
-                    self.current_llm_utterance_chunks = [remaining_text] if remaining_text else []
+                    # Only the new text is scanned; complete segments start fetching immediately
+                    for segment in self.segmenter.feed(self.normalizer.feed(item["text"])):
+                        self._enqueue_segment(segment, turn)
 
                 elif item["type"] == "end_response":
-                    # If there are any remaining chunks after the LLM stream ends, synthesize them
-                    if self.current_llm_utterance_chunks:
-                        final_segment = "".join(self.current_llm_utterance_chunks).strip()
-                        if final_segment:
-                            print(f"[TTS] Synthesizing final segment: '{final_segment}'")
-                            try:
-                                self.synthesize_speech_v8(final_segment)
-                            except Exception as e:
-                                print(f"[TTS] Error during final speech synthesis for segment: '{final_segment[:50]}...': {e}")
-                                self.bot_speaking_event.clear()
-                        self.current_llm_utterance_chunks = [] # Clear for next LLM turn
-                    print("[TTS] Finished LLM utterance.")
-                    self.bot_speaking_event.clear() # Ensure bot_speaking_event is cleared after entire utterance
+                    # Whatever is left after the LLM stream ends is the final segment
+                    for segment in self.segmenter.feed(self.normalizer.flush()):
+                        self._enqueue_segment(segment, turn)
+                    final_segment = self.segmenter.flush()
+                    if final_segment:
+                        console.print(f"[TTS] Synthesizing final segment: '{final_segment}'")
+                        self._enqueue_segment(final_segment, turn)
+                    self.current_turn_complete = True
+                    # bot_speaking_event is cleared by the playback loop once the last segment has played
+                    console.print("[TTS] Finished LLM utterance.")
                 
                 self.llm_to_tts_queue.task_done() # Mark task as done for the queue
 
-            except queue.Empty:
-                # If queue is empty, check for interruption here too, in case a speech segment is very short
-                # or there's a long pause before the next LLM response.
-                if self.interrupt_bot_event.is_set():
-                    if self.current_player_process and self.current_player_process.poll() is None:
-                        # Only kill if a process is actually running (not already dead)
-                        print("\n[TTS] Interruption detected while idle, killing active player process if any.")
-                        self.current_player_process.kill()
-                    self.interrupt_bot_event.clear()
-                    self.bot_speaking_event.clear() # Ensure event is cleared if it was somehow left set
-                
-                time.sleep(0.05) # Short sleep if queue is empty to prevent tight looping
+            except QueueClosed:
+                break
             except Exception as e:
-                print(f"[TTS] Unexpected error in TTS playback loop: {e}")
+                console.print(f"[TTS] Unexpected error in TTS playback loop: {e}")
                 self.bot_speaking_event.clear() # Ensure event is cleared on error
                 time.sleep(0.1) # Prevent tight looping on continuous errors
+
+        self.backchannel.cancel()
+        self.synthesis_pipeline.shutdown()
+        playback_thread.join()
+        self.audio_sink.close()
+        self.tts_router.shutdown()
+        for http_client in self._owned_http_clients:
+            http_client.close()
+        print(f"[TTS] TTFB summary - {self.ttfb_stats.summary()}")
+        print(f"[TTS] Hedging: {self.tts_router.summary()}")
+        print(f"[TTS] Audio cache - {self.audio_cache.summary()}")
+        if self.BACKCHANNEL_ENABLED:
+            print(f"[TTS] Backchannel - {self.backchannel.summary()}")
         print("[TTS] Player finished.")
\ No newline at end of file
@@ -0,0 +1,152 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from call_scheduler import INTERACTIVE
+from event_runtime import AwaitableEvent, HandoffQueue, QueueClosed
+
+# --- A single text segment moving through the synthesis pipeline ---
+class SynthesisJob:
+    """
+    Holds one text segment and the audio fetched for it.
+    The fetch worker pushes audio chunks into `chunks` in arrival order and
+    terminates the stream with None, so playback can start on the first byte
+    while the rest of the segment is still downloading.
+    """
+    def __init__(self, text: str, turn=None, priority: int = INTERACTIVE):
+        self.text = text
+        self.turn = turn # TurnToken the segment belongs to, if any
+        self.priority = priority # Of its TTS request in the provider's CallScheduler
+        self.chunks = queue.Queue()
+        self.cancelled = threading.Event()
+        self.response = None # Open HTTP response, kept so cancel() can close it
+        self.settled = AwaitableEvent() # Set once no more requests are needed: answered or cancelled
+        self.error = None
+        self.record_id = None # Segment id in the session recording, when one is being made
+
+    def attach_response(self, response):
+        """Keeps the winning attempt's response; a hedged attempt still queued gives up."""
+        self.response = response
+        self.settled.set()
+
+    def push(self, chunk: bytes):
+        if not self.cancelled.is_set():
+            self.chunks.put(chunk)
+
+    def finish(self):
+        self.chunks.put(None) # End-of-audio marker for the reader
+
+    def cancel(self):
+        """Stops the fetch for this segment and unblocks anyone reading its audio."""
+        if self.cancelled.is_set():
+            return
+        self.cancelled.set()
+        self.settled.set() # Takes its queued requests out of the provider's CallScheduler
+        response = self.response
+        if response is not None:
+            try:
+                response.close() # Aborts the download in the fetch worker
+            except Exception:
+                pass
+        self.finish()
+
+    def iter_audio(self):
+        """Yields audio chunks in order until the segment is complete or cancelled."""
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None or self.cancelled.is_set():
+                return
+            yield chunk
+
+
+# --- Bounded, ordered prefetching of TTS audio ---
+class SynthesisPipeline:
+    """
+    Issues TTS requests for upcoming segments while earlier ones are playing.
+
+    At most `prefetch_depth` segments are in flight (fetching, buffered or playing)
+    at any time; `submit` blocks once that limit is reached. Segments are handed to
+    playback strictly in submission order, whatever order their audio arrives in.
+    """
+    def __init__(self, fetch_fn, prefetch_depth: int = 3, executor: ThreadPoolExecutor = None):
+        self._fetch_fn = fetch_fn # Called in a worker thread as fetch_fn(job)
+        self.prefetch_depth = prefetch_depth
+        # Several pipelines (one per session) may share one executor; only an owned one is shut down
+        self._owns_executor = executor is None
+        self._executor = executor if executor is not None else ThreadPoolExecutor(
+            max_workers=prefetch_depth, thread_name_prefix="TTS_Fetch")
+        self._ready_jobs = HandoffQueue() # Jobs in playback order
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._active_jobs = [] # Submitted and not yet released
+        self._closed = False
+
+    def submit(self, text: str, turn=None, priority: int = INTERACTIVE) -> SynthesisJob:
+        """
+        Queues `text` for synthesis and starts fetching it right away.
+        Blocks while the prefetch window is full; returns None if the pipeline
+        is shut down, or `turn` is cancelled, while waiting.
+        """
+        job = SynthesisJob(text, turn, priority)
+        with self._lock:
+            while len(self._active_jobs) >= self.prefetch_depth and not self._closed:
+                self._slot_freed.wait() # Woken by release(), discard_all() or shutdown()
+            if self._closed or (turn is not None and turn.cancelled):
+                return None
+            self._active_jobs.append(job)
+        self._ready_jobs.put_nowait(job)
+        self._executor.submit(self._run_fetch, job)
+        return job
+
+    def _run_fetch(self, job: SynthesisJob):
+        try:
+            if not job.cancelled.is_set():
+                self._fetch_fn(job)
+        finally:
+            job.finish()
+
+    def next_job(self) -> SynthesisJob:
+        """
+        Blocks until the next segment to play is queued. Returns None when woken
+        by wake() instead; raises QueueClosed after shutdown().
+        """
+        return self._ready_jobs.get()
+
+    def wake(self):
+        """Makes a pending next_job() return None so the caller can react to an event."""
+        try:
+            self._ready_jobs.put_nowait(None)
+        except QueueClosed:
+            pass
+
+    def release(self, job: SynthesisJob):
+        """Frees the prefetch slot held by `job` once it has been played or dropped."""
+        with self._lock:
+            if job in self._active_jobs:
+                self._active_jobs.remove(job)
+                self._slot_freed.notify()
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return bool(self._active_jobs)
+
+    def discard_all(self) -> int:
+        """Cancels every queued or in-flight segment. Returns how many were dropped."""
+        with self._lock:
+            jobs = list(self._active_jobs)
+        for job in jobs:
+            job.cancel()
+        # Drain the ordering queue so playback does not pick up stale segments
+        self._ready_jobs.drain()
+        for job in jobs:
+            self.release(job)
+        return len(jobs)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            self._slot_freed.notify_all()
+        self.discard_all()
+        self._ready_jobs.close()
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
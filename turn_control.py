@@ -0,0 +1,131 @@
+import collections
+import itertools
+import threading
+import time
+
+from metrics import MetricsRecorder, TurnTimeline
+
+# --- Cancellation token for one bot turn ---
+class TurnToken:
+    """
+    Represents one bot turn (from the user's final sentence to the end of playback).
+    Every stage working on the turn registers a cancel callback; cancel() runs them all
+    once, in the cancelling thread, so the whole turn stops together.
+    """
+    def __init__(self, turn_id: int):
+        self.turn_id = turn_id
+        self.cancel_time = None # perf_counter() when cancelled
+        self.finished = False
+        self.timeline = TurnTimeline(turn_id) # When each stage of the turn first happened
+        self._cancelled = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @property
+    def active(self) -> bool:
+        return not (self._cancelled or self.finished)
+
+    def add_cancel_callback(self, callback):
+        """Registers callback(token). Runs immediately if the turn is already cancelled."""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def cancel(self) -> bool:
+        """Cancels the turn. Returns False if it was already cancelled or finished."""
+        with self._lock:
+            if not self.active:
+                return False
+            self._cancelled = True
+            self.cancel_time = time.perf_counter()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"[Turn] Cancel callback failed for turn {self.turn_id}: {e}")
+        return True
+
+
+# --- Tracks the current turn and how fast cancellations take effect ---
+class TurnController:
+    """
+    Hands out a TurnToken per bot turn and cancels the current one on barge-in.
+    If `interrupt_event` is an AwaitableEvent, setting it cancels the current turn,
+    so STT keeps signalling interruptions exactly as before.
+    With `metrics`, every turn's timeline is recorded when it finishes or is cancelled.
+    """
+    def __init__(self, interrupt_event=None, max_samples: int = 1000,
+                 metrics: MetricsRecorder = None):
+        self._lock = threading.Lock()
+        self._turn_ids = itertools.count(1)
+        self.current = None
+        self.cancel_to_silence_ms = collections.deque(maxlen=max_samples)
+        self.metrics = metrics
+        self._upcoming_marks = {} # Marks made by STT before the turn they belong to exists
+        if interrupt_event is not None and hasattr(interrupt_event, "add_listener"):
+            interrupt_event.add_listener(self.cancel_current)
+
+    def begin_turn(self) -> TurnToken:
+        """Starts a new turn, cancelling the previous one if it is still running."""
+        token = TurnToken(next(self._turn_ids))
+        with self._lock:
+            previous, self.current = self.current, token
+            token.timeline.adopt(self._upcoming_marks)
+            self._upcoming_marks = {}
+        if self.metrics is not None:
+            token.add_cancel_callback(self._record_interrupted)
+        if previous is not None and previous.cancel():
+            print(f"[Turn] Turn {previous.turn_id} superseded by turn {token.turn_id}.")
+        return token
+
+    def mark_upcoming(self, name: str):
+        """Marks a stage (e.g. "speech_final") of the turn that begin_turn() will start next."""
+        if name not in self._upcoming_marks:
+            self._upcoming_marks.setdefault(name, time.perf_counter())
+
+    def discard_upcoming(self):
+        self._upcoming_marks = {}
+
+    def _record_interrupted(self, token: TurnToken):
+        self.metrics.complete(token.timeline, "interrupted")
+
+    def cancel_current(self) -> TurnToken:
+        """Cancels the running turn, if any. Returns the cancelled token or None."""
+        with self._lock:
+            token = self.current
+        if token is not None and token.cancel():
+            print(f"[Turn] Turn {token.turn_id} cancelled.")
+            return token
+        return None
+
+    def finish(self, token: TurnToken):
+        """Marks a turn as fully played; a later barge-in will not cancel it."""
+        with token._lock:
+            if token.finished or token.cancelled:
+                return
+            token.finished = True
+        if self.metrics is not None:
+            self.metrics.complete(token.timeline, "completed")
+
+    def report_silence(self, token: TurnToken, extra_latency_s: float = 0.0):
+        """Records how long it took from cancelling `token` until its audio went silent."""
+        if token.cancel_time is None:
+            return
+        latency_ms = (time.perf_counter() - token.cancel_time + extra_latency_s) * 1000
+        self.cancel_to_silence_ms.append(latency_ms)
+        print(f"[Turn] Turn {token.turn_id} silent {latency_ms:.1f}ms after cancel.")
+
+    def summary(self) -> str:
+        samples = sorted(self.cancel_to_silence_ms)
+        if not samples:
+            return "no cancelled turns"
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return (f"{len(samples)} cancelled turn(s): cancel-to-silence p50={samples[len(samples) // 2]:.1f}ms "
+                f"p95={p95:.1f}ms max={samples[-1]:.1f}ms")
@@ -0,0 +1,116 @@
+import inspect
+import time
+
+# --- Last few hundred ms of mic audio, kept without per-frame allocations ---
+class PrerollRing:
+    """
+    Fixed bytearray holding the most recent `capacity` bytes. write() copies a frame in
+    (the only copy on the path); views() returns memoryviews into the buffer, oldest
+    first, so replaying the pre-roll allocates nothing.
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._end = 0 # Next write position
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def write(self, data):
+        data = memoryview(data)
+        if len(data) >= self.capacity:
+            data = data[len(data) - self.capacity:]
+        first = min(len(data), self.capacity - self._end)
+        self._view[self._end:self._end + first] = data[:first]
+        if first < len(data):
+            self._view[:len(data) - first] = data[first:]
+        self._end = (self._end + len(data)) % self.capacity
+        self._size = min(self.capacity, self._size + len(data))
+
+    def views(self) -> list:
+        start = (self._end - self._size) % self.capacity
+        if start + self._size <= self.capacity:
+            return [self._view[start:start + self._size]] if self._size else []
+        return [self._view[start:], self._view[:self._end]]
+
+    def clear(self):
+        self._size = 0
+
+
+# --- Sends mic audio upstream only while someone may be speaking ---
+class UplinkGate:
+    """
+    Sits between the audio source and the STT connection. While the local VAD hears
+    speech (and for `hangover_ms` after, so the server's own endpointing still sees
+    the trailing silence) frames are sent as captured. Otherwise they only go into a
+    pre-roll ring, and a keep-alive is sent every `keepalive_interval` seconds so the
+    connection stays open. When speech starts, the pre-roll is sent first, so the word
+    onsets that preceded VAD's decision are not lost.
+
+    Args:
+        send_fn: Coroutine function sending one chunk of audio.
+        keepalive_fn: Coroutine function (or None) keeping the connection alive without audio.
+        sample_rate (int): Rate of the 16-bit mono audio.
+        preroll_ms (int): Audio replayed ahead of each detected speech onset.
+        hangover_ms (int): Audio still sent after speech ends; must exceed the server's endpointing.
+    """
+    def __init__(self, send_fn, keepalive_fn=None, sample_rate: int = 16000,
+                 preroll_ms: int = 300, hangover_ms: int = 600, keepalive_interval: float = 5.0):
+        self.send_fn = send_fn
+        self.keepalive_fn = keepalive_fn
+        self.bytes_per_ms = sample_rate * 2 / 1000
+        self.hangover_bytes = int(hangover_ms * self.bytes_per_ms)
+        self.keepalive_interval = keepalive_interval
+        self.preroll = PrerollRing(int(preroll_ms * self.bytes_per_ms))
+        self._open = False
+        self._hangover_left = 0
+        self._last_sent = time.monotonic()
+        self.bytes_captured = 0
+        self.bytes_sent = 0
+        self.keepalives_sent = 0
+
+    async def _send(self, data):
+        await self.send_fn(data)
+        self.bytes_sent += len(data)
+        self._last_sent = time.monotonic()
+
+    async def push(self, frame, speech_active: bool):
+        """Handles one captured frame; `speech_active` is the VAD state after this frame."""
+        self.bytes_captured += len(frame)
+        if speech_active:
+            if not self._open:
+                self._open = True
+                self.preroll.write(frame) # Onset frames are already part of the pre-roll
+                for view in self.preroll.views():
+                    await self._send(view)
+                self.preroll.clear()
+            else:
+                await self._send(frame)
+            self._hangover_left = self.hangover_bytes
+            return
+
+        if self._open and self._hangover_left > 0:
+            self._hangover_left -= len(frame)
+            await self._send(frame)
+            return
+
+        self._open = False
+        self.preroll.write(frame)
+        if time.monotonic() - self._last_sent >= self.keepalive_interval:
+            await self._keepalive()
+
+    async def _keepalive(self):
+        self._last_sent = time.monotonic()
+        if self.keepalive_fn is None:
+            return
+        result = self.keepalive_fn()
+        if inspect.isawaitable(result):
+            await result
+        self.keepalives_sent += 1
+
+    def summary(self) -> str:
+        saved = 100 - self.bytes_sent / self.bytes_captured * 100 if self.bytes_captured else 0.0
+        return (f"captured {self.bytes_captured}B, sent {self.bytes_sent}B ({saved:.0f}% held back), "
+                f"{self.keepalives_sent} keep-alive(s)")
@@ -0,0 +1,217 @@
+import collections
+import sys
+import wave
+
+try:
+    import numpy as np
+except ImportError: # The agent runs without local VAD if NumPy is missing
+    np = None
+
+# --- End-of-turn silence that follows the caller's own pausing habits ---
+class AdaptiveEndpointer:
+    """
+    Decides how much trailing silence ends a turn. Starts at `base_ms`; once a few
+    mid-utterance pauses have been seen, uses their 90th percentile plus `margin_ms`,
+    so quick talkers get fast turn-taking and hesitant ones are not cut off.
+    """
+    def __init__(self, base_ms: float = 300, min_ms: float = 200, max_ms: float = 800,
+                 margin_ms: float = 80, min_pause_ms: float = 100, history: int = 50):
+        self.base_ms = base_ms
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.margin_ms = margin_ms
+        self.min_pause_ms = min_pause_ms
+        self.pauses_ms = collections.deque(maxlen=history)
+
+    def observe_pause(self, pause_ms: float):
+        """A silence inside an utterance (speech resumed before the endpoint)."""
+        if pause_ms >= self.min_pause_ms:
+            self.pauses_ms.append(pause_ms)
+
+    @property
+    def current_ms(self) -> float:
+        if len(self.pauses_ms) < 5:
+            return self.base_ms
+        ordered = sorted(self.pauses_ms)
+        p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+        return min(self.max_ms, max(self.min_ms, p90 + self.margin_ms))
+
+
+# --- Frame-level speech detection on 16-bit mono PCM ---
+class VoiceActivityDetector:
+    """
+    Energy and spectral voice activity detection on 16 kHz linear16 audio, computed for
+    all frames of a chunk at once with NumPy. A frame is speech when its energy in the
+    speech band (250-4000 Hz) is `snr_db` above the tracked noise floor and at least
+    `min_speech_db`, and its spectrum looks voiced (low spectral flatness within the band,
+    or most energy in the band). DC offset and low-frequency rumble, common in real
+    microphones, are therefore neither loud nor voiced. `onset_ms` of consecutive speech
+    frames raise "speech_start"; trailing silence of the endpointer's length raises
+    "speech_end".
+
+    process(chunk, strict=True) demands `strict_extra_db` more energy and
+    `strict_onset_ms` of speech, for use while the bot's own voice may reach the mic.
+    """
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 20, snr_db: float = 9.0,
+                 onset_ms: int = 40, strict_onset_ms: int = 80, strict_extra_db: float = 6.0,
+                 max_flatness: float = 0.4, min_band_ratio: float = 0.75, min_speech_db: float = -55.0,
+                 endpointer: AdaptiveEndpointer = None):
+        if np is None:
+            raise RuntimeError("NumPy is required for local voice activity detection")
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.snr_db = snr_db
+        self.onset_ms = onset_ms
+        self.strict_onset_ms = strict_onset_ms
+        self.strict_extra_db = strict_extra_db
+        self.max_flatness = max_flatness
+        self.min_band_ratio = min_band_ratio
+        self.min_speech_db = min_speech_db # Quieter than this is the room, however still it is
+        self.endpointer = endpointer if endpointer is not None else AdaptiveEndpointer()
+
+        self._window = np.hanning(self.frame_len).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.frame_len, 1.0 / sample_rate)
+        self._speech_band = (freqs >= 250) & (freqs <= 4000)
+        self._pending = b"" # Samples left over from a chunk that was not a whole number of frames
+        self.noise_db = None
+        self.speaking = False
+        self._speech_run_ms = 0
+        self._silence_run_ms = 0
+        self.stream_ms = 0 # Audio processed so far
+
+    def reset(self):
+        self._pending = b""
+        self.speaking = False
+        self._speech_run_ms = 0
+        self._silence_run_ms = 0
+
+    def _features(self, frames):
+        """Per-frame (speech band energy dBFS, spectral flatness in the band, speech band energy ratio)."""
+        samples = frames.astype(np.float32) / 32768.0
+        samples -= samples.mean(axis=1, keepdims=True) # DC offset
+        power = np.abs(np.fft.rfft(samples * self._window, axis=1)) ** 2 + 1e-12
+        band = power[:, self._speech_band]
+        band_ratio = band.sum(axis=1) / power.sum(axis=1)
+        energy_db = 10.0 * np.log10(np.mean(samples * samples, axis=1) * band_ratio + 1e-10)
+        flatness = np.exp(np.mean(np.log(band), axis=1)) / np.mean(band, axis=1)
+        return energy_db, flatness, band_ratio
+
+    def _update_noise_floor(self, energy_db: float):
+        if self.noise_db is None:
+            self.noise_db = energy_db
+        else:
+            # Falls quickly (quieter room), rises slowly (so speech does not become "noise")
+            rate = 0.3 if energy_db < self.noise_db else 0.02
+            self.noise_db += rate * (energy_db - self.noise_db)
+        self.noise_db = max(self.noise_db, -90.0)
+
+    def process(self, data: bytes, strict: bool = False) -> list:
+        """
+        Feeds a chunk of PCM. Returns the events it completed, as
+        [("speech_start" | "speech_end", stream_ms), ...].
+        """
+        data = self._pending + bytes(data)
+        frame_bytes = self.frame_len * 2
+        usable = len(data) - len(data) % frame_bytes
+        self._pending = data[usable:]
+        if not usable:
+            return []
+
+        frames = np.frombuffer(data[:usable], dtype="<i2").reshape(-1, self.frame_len)
+        energy_db, flatness, band_ratio = self._features(frames)
+        threshold_extra = self.strict_extra_db if strict else 0.0
+        onset_ms = self.strict_onset_ms if strict else self.onset_ms
+
+        events = []
+        for energy, flat, ratio in zip(energy_db.tolist(), flatness.tolist(), band_ratio.tolist()):
+            self.stream_ms += self.frame_ms
+            if self.noise_db is None:
+                self._update_noise_floor(energy)
+            voiced = flat < self.max_flatness or ratio > self.min_band_ratio
+            is_speech = voiced and energy > max(self.noise_db + self.snr_db + threshold_extra,
+                                                 self.min_speech_db)
+
+            if is_speech:
+                if self.speaking and self._silence_run_ms:
+                    self.endpointer.observe_pause(self._silence_run_ms)
+                self._silence_run_ms = 0
+                self._speech_run_ms += self.frame_ms
+                if not self.speaking and self._speech_run_ms >= onset_ms:
+                    self.speaking = True
+                    events.append(("speech_start", self.stream_ms))
+            else:
+                self._update_noise_floor(energy)
+                self._speech_run_ms = 0
+                if self.speaking:
+                    self._silence_run_ms += self.frame_ms
+                    if self._silence_run_ms >= self.endpointer.current_ms:
+                        self.speaking = False
+                        self._silence_run_ms = 0
+                        events.append(("speech_end", self.stream_ms))
+        return events
+
+
+# --- Self-check on synthetic audio, and a report for recorded WAV files ---
+def _synthetic_speech(duration_s: float, sample_rate: int, rng) -> "np.ndarray":
+    """A voiced, syllable-modulated harmonic signal standing in for speech."""
+    t = np.arange(int(duration_s * sample_rate)) / sample_rate
+    f0 = 140 + 20 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    syllables = 0.55 + 0.45 * np.sin(2 * np.pi * 4 * t) # ~4 syllables per second
+    return 0.25 * voiced * syllables + 0.002 * rng.standard_normal(len(t))
+
+
+def _run_self_check(sample_rate: int = 16000, chunk_ms: int = 20):
+    rng = np.random.default_rng(7)
+    noise = lambda seconds: 0.003 * rng.standard_normal(int(seconds * sample_rate))
+    # noise, speech (onset at 1.0s), 180ms pause, speech, trailing noise
+    timeline = [(noise(1.0), False), (_synthetic_speech(1.2, sample_rate, rng), True),
+                (noise(0.18), False), (_synthetic_speech(0.8, sample_rate, rng), True), (noise(1.5), False)]
+    signal = np.concatenate([part for part, _ in timeline])
+    pcm = (np.clip(signal, -1, 1) * 32767).astype("<i2").tobytes()
+
+    detector = VoiceActivityDetector(sample_rate)
+    chunk_bytes = sample_rate * chunk_ms // 1000 * 2
+    events = []
+    for start in range(0, len(pcm), chunk_bytes):
+        events.extend(detector.process(pcm[start:start + chunk_bytes]))
+    print(f"[VAD self-check] events: {events}")
+    starts = [ms for name, ms in events if name == "speech_start"]
+    ends = [ms for name, ms in events if name == "speech_end"]
+    assert len(starts) == 1 and len(ends) == 1, "the short pause must not end the utterance"
+    onset_latency = starts[0] - 1000
+    assert 0 <= onset_latency <= 100, f"onset detected {onset_latency}ms after speech began"
+    end_of_speech = 1000 + 1200 + 180 + 800
+    print(f"[VAD self-check] onset latency {onset_latency}ms, endpoint "
+          f"{ends[0] - end_of_speech}ms after speech ended")
+
+    quiet = VoiceActivityDetector(sample_rate)
+    noise_pcm = (np.clip(noise(5.0), -1, 1) * 32767).astype("<i2").tobytes()
+    assert not quiet.process(noise_pcm), "false alarm on background noise"
+    print("[VAD self-check] no events on 5s of background noise. OK")
+
+
+def _report_wav(path: str):
+    with wave.open(path, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16-bit mono PCM")
+        sample_rate = wav.getframerate()
+        pcm = wav.readframes(wav.getnframes())
+    detector = VoiceActivityDetector(sample_rate)
+    events = detector.process(pcm)
+    print(f"{path}: {len(pcm) // 2 * 1000 // sample_rate}ms, final endpoint "
+          f"{detector.endpointer.current_ms:.0f}ms")
+    for name, ms in events:
+        print(f"  {ms / 1000:7.2f}s  {name}")
+
+
+if __name__ == "__main__":
+    # python vad.py              -> synthetic self-check
+    # python vad.py a.wav b.wav  -> speech segments found in recorded 16-bit mono WAVs
+    if sys.argv[1:]:
+        for wav_path in sys.argv[1:]:
+            _report_wav(wav_path)
+    else:
+        _run_self_check()